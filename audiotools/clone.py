@@ -7,6 +7,8 @@ from langchain import PromptTemplate
 from langchain_openai import ChatOpenAI
 import pkg_resources
 
+from chat.rate_limiter import default_rate_limits
+
 class CloneAudioTools:
     """
     Initializes a tool for audio cloning and text-to-speech using OpenAI and ElevenLabs APIs.
@@ -17,6 +19,7 @@ class CloneAudioTools:
     Processing Logic:
         - Sets up clients for interacting with ChatOpenAI and ElevenLabs using the provided API keys.
         - Loads prompts from a YAML file, with a fallback to a package-default 'prompts.yaml' if not specified.
+        - OpenAI and ElevenLabs calls wait for the "openai" and "elevenlabs" rate limits when they are configured.
     """
     def __init__(self, openai_api_key: str, elevenlabs_api_key: str, prompts_file: str = None):
         """
@@ -27,6 +30,8 @@ class CloneAudioTools:
             elevenlabs_api_key (str): API key for ElevenLabs.
             prompts_file (str, optional): Path to the prompts YAML file. Defaults to 'prompts.yaml' in the package.
         """
+        self.openai_api_key = openai_api_key
+        self.elevenlabs_api_key = elevenlabs_api_key
         self.llm = ChatOpenAI(api_key=openai_api_key, model="gpt-3.5-turbo")
         self.client = ElevenLabs(api_key=elevenlabs_api_key)
         if prompts_file is None:
@@ -49,6 +54,7 @@ class CloneAudioTools:
             template = self.prompts['modify_text_with_emotion']
             prompt = PromptTemplate(template=template, input_variables=["text", "emotion"])
             result = prompt | self.llm
+            default_rate_limits.acquire("openai", self.openai_api_key, template + text, "gpt-3.5-turbo")
             return result.invoke({"text": text, "emotion": emotion}).content.strip()
         return text
 
@@ -74,6 +80,7 @@ class CloneAudioTools:
             style=style, 
             use_speaker_boost=use_speaker_boost
         )
+        default_rate_limits.acquire("elevenlabs", self.elevenlabs_api_key, text)
         audio_generator = self.client.generate(text=text, voice=voice)
         audio = b''.join(audio_generator)
         return audio
@@ -90,6 +97,7 @@ class CloneAudioTools:
         Returns:
             Voice: The cloned voice object.
         """
+        default_rate_limits.acquire("elevenlabs", self.elevenlabs_api_key)
         if isinstance(file_path_or_bytes, bytes):
             # Save bytes to a temporary file
             with tempfile.NamedTemporaryFile(delete=False) as temp_file:
@@ -9,6 +9,8 @@ from elevenlabs.client import ElevenLabs
 from elevenlabs import Voice, VoiceSettings
 import pkg_resources
 
+from chat.rate_limiter import default_rate_limits
+
 class AudioTools:
     """
     Initializes a utility class for handling audio-related tasks using OpenAI and ElevenLabs APIs.
@@ -21,6 +23,7 @@ class AudioTools:
         - Loads the prompts configuration from the specified YAML file.
         - Initializes ChatOpenAI with the specified OpenAI API key and a pre-defined model.
         - Creates a mapping for voices using the loaded prompts options.
+        - OpenAI and ElevenLabs calls wait for the "openai" and "elevenlabs" rate limits when they are configured.
     """
     def __init__(self, openai_api_key: str, elevenlabs_api_key: str, prompts_file: str = None):
         """
@@ -31,6 +34,8 @@ class AudioTools:
             elevenlabs_api_key (str): API key for ElevenLabs.
             prompts_file (str, optional): Path to the prompts YAML file. Defaults to 'prompts.yaml' in the package.
         """
+        self.openai_api_key = openai_api_key
+        self.elevenlabs_api_key = elevenlabs_api_key
         self.llm = ChatOpenAI(openai_api_key=openai_api_key, model="gpt-4o-mini")
         self.client = ElevenLabs(api_key=elevenlabs_api_key)
         if prompts_file is None:
@@ -54,6 +59,7 @@ class AudioTools:
             template = self.prompts['modify_text_with_emotion']
             prompt = PromptTemplate(template=template, input_variables=["text", "emotion"])
             result = prompt | self.llm
+            default_rate_limits.acquire("openai", self.openai_api_key, template + text, "gpt-4o-mini")
             return result.invoke({"text": text, "emotion": emotion}).content.strip()
         return text
 
@@ -81,6 +87,7 @@ class AudioTools:
             use_speaker_boost=use_speaker_boost
         )
         voice = Voice(voice_id=voice_id, settings=settings)
+        default_rate_limits.acquire("elevenlabs", self.elevenlabs_api_key, text)
         audio_generator = self.client.generate(text=text, voice=voice)
         audio = b''.join(audio_generator)
         return audio
@@ -0,0 +1,83 @@
+"""
+Measures per-call overhead of the chat wrappers with and without the pooled client registry.
+
+Runs against a local mock OpenAI endpoint, so no API key or network access is needed:
+
+    python benchmarks/bench_client_pool.py --calls 200 --threads 8
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_servers import MockOpenAIHandler, MockServer
+
+
+def _unpooled_call(prompt: str, api_key: str) -> str:
+    # Mirrors the previous gpt4omini implementation: a new template and client on every call
+    from langchain.prompts import PromptTemplate
+    from langchain_openai import ChatOpenAI
+
+    prompt_template = PromptTemplate(
+        template="Please respond entirely in {language}. Here is the prompt: {prompt}",
+        input_variables=["prompt", "language"]
+    )
+    llm = ChatOpenAI(openai_api_key=api_key, model="gpt-4o-mini", streaming=False)
+    return (prompt_template | llm).invoke({"prompt": prompt, "language": "English"}).content.strip()
+
+
+def _pooled_call(prompt: str, api_key: str) -> str:
+    from chat.gpt4omini import gpt4omini
+    return gpt4omini(prompt, api_key=api_key)
+
+
+def _run(call, calls: int, threads: int) -> dict:
+    def timed(i: int) -> float:
+        start = time.perf_counter()
+        call(f"benchmark prompt {i}", "sk-mock")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = sorted(executor.map(timed, range(calls)))
+    elapsed = time.perf_counter() - start
+    return {
+        "throughput": calls / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock server latency in seconds.")
+    args = parser.parse_args()
+
+    with MockServer(MockOpenAIHandler, latency=args.latency) as server:
+        os.environ["OPENAI_API_BASE"] = f"{server.url}/v1"
+        os.environ["OPENAI_BASE_URL"] = f"{server.url}/v1"
+
+        # Warm imports so neither side pays module loading
+        _unpooled_call("warmup", "sk-mock")
+        _pooled_call("warmup", "sk-mock")
+
+        for name, call in (("unpooled", _unpooled_call), ("pooled", _pooled_call)):
+            result = _run(call, args.calls, args.threads)
+            print(
+                f"{name:>9}: {result['throughput']:8.1f} calls/s  "
+                f"mean {result['mean_ms']:7.2f} ms  p50 {result['p50_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms"
+            )
+
+        from chat.client_pool import default_registry
+        print(f"registry: {default_registry.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Compares the FAISS index kinds of chat.vector_index on recall@k, search latency, build time, file size and memory.
+
+Vectors are drawn from Gaussian clusters in a low-dimensional space projected to the embedding dimension, which,
+like text embeddings, is far easier to index than uniform noise. Each index is loaded in a fresh process, with and
+without memory mapping, so memory is measured without allocations left over from building. Private memory is
+reported after loading and after searching; it excludes memory-mapped pages, which live in the shared page cache
+and can be evicted. RSS includes them:
+
+    python benchmarks/bench_index.py --vectors 200000 --dim 768 --kinds flat,ivf,ivf_fp16,ivf_pq,hnsw
+    python benchmarks/bench_index.py --vectors 50000 --dim 1536 --k 5 --json index.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat.vector_index import INDEX_KINDS, IndexConfig, convert_index, tune_index
+
+_LATENT_DIM = 32
+
+
+def _vectors(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    # Clustered points in a low-dimensional space projected up, since embeddings have a low intrinsic dimension
+    rng = np.random.default_rng(seed)
+    structure = np.random.default_rng(0)
+    centers = structure.standard_normal((clusters, _LATENT_DIM)).astype("float32")
+    projection = structure.standard_normal((_LATENT_DIM, dim)).astype("float32")
+    latent = centers[rng.integers(0, clusters, count)] + rng.standard_normal((count, _LATENT_DIM)).astype("float32")
+    vectors = latent @ projection + 0.5 * rng.standard_normal((count, dim)).astype("float32")
+    # Unit length, like OpenAI embeddings
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _memory_mib() -> tuple:
+    # Resident pages, and how many of them are private rather than file-backed pages shared through the page cache
+    with open("/proc/self/statm") as f:
+        resident, shared = (int(value) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20 for value in f.read().split()[1:3])
+    return resident, resident - shared
+
+
+def _search(conn, path: str, config: IndexConfig, mmap: bool, queries: np.ndarray, k: int) -> None:
+    _, private_before = _memory_mib()
+    flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    index = tune_index(faiss.read_index(path, flags), config)
+    _, private_loaded = _memory_mib()
+    latencies, ids = [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, found = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        ids.append(found[0])
+    latencies.sort()
+    resident, private = _memory_mib()
+    conn.send({
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000,
+        "load_private_mib": private_loaded - private_before,
+        "private_mib": private - private_before,
+        "rss_mib": resident,
+        "ids": np.stack(ids),
+    })
+
+
+def _measure(path: str, config: IndexConfig, mmap: bool, queries: np.ndarray, k: int) -> dict:
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.get_context("spawn").Process(target=_search, args=(child, path, config, mmap, queries, k))
+    process.start()
+    result = parent.recv()
+    process.join()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=100, help="Gaussian clusters the vectors are drawn from.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--kinds", default=",".join(INDEX_KINDS), help="Comma-separated index kinds to compare.")
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    vectors = _vectors(args.vectors, args.dim, args.clusters, seed=0)
+    queries = _vectors(args.queries, args.dim, args.clusters, seed=1)
+    flat = faiss.IndexFlatL2(args.dim)
+    flat.add(vectors)
+    _, truth = flat.search(queries, args.k)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for kind in [name for name in args.kinds.split(",") if name]:
+            config = IndexConfig(kind, min_vectors=0, nprobe=args.nprobe, ef_search=args.ef_search)
+            start = time.perf_counter()
+            index = convert_index(flat, config)
+            build = time.perf_counter() - start
+            path = os.path.join(workdir, f"{kind}.faiss")
+            faiss.write_index(index, path)
+            if index is not flat:
+                del index
+            for mmap in (False, True):
+                measured = _measure(path, config, mmap, queries, args.k)
+                found = measured.pop("ids")
+                recall = np.mean([len(set(row) & set(expected)) / args.k for row, expected in zip(found, truth)])
+                name = f"{kind}{' mmap' if mmap else ''}"
+                result = results[name] = {"recall": float(recall), "build_s": build,
+                                          "file_mib": os.path.getsize(path) / 2 ** 20, **measured}
+                print(
+                    f"{name:>14}: recall@{args.k} {result['recall']:.3f}  p50 {result['p50_ms']:7.3f} ms  "
+                    f"p99 {result['p99_ms']:7.3f} ms  file {result['file_mib']:6.1f} MiB  "
+                    f"private {result['load_private_mib']:6.1f}/{result['private_mib']:6.1f} MiB  "
+                    f"rss {result['rss_mib']:6.1f} MiB  build {build:6.1f} s"
+                )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"options": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Measures throughput, latency and client-side CPU and memory of the library's public entry points.
+
+Every provider is replaced by a local stand-in (OpenAI, Together, Stability, fal, ElevenLabs, FakeYou, S3 and
+Google search), so no API keys or network access are needed. The stand-ins run in a separate process, so the
+CPU and memory figures cover only the client side:
+
+    python benchmarks/bench_suite.py --calls 200 --threads 8 --latency 0.05 --error-rate 0.01
+    python benchmarks/bench_suite.py --scenarios gpt4omini,stability --json results.json
+"""
+import argparse
+import functools
+import itertools
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_servers import (MockElevenLabsHandler, MockFakeYouHandler, MockFalHandler, MockOpenAIHandler,
+                          MockS3Handler, MockServer, MockStabilityHandler, MockWebHandler, redirect_hosts)
+
+KEY = "sk-mock"
+
+_HANDLERS = {
+    "openai": MockOpenAIHandler,
+    "together": MockOpenAIHandler,
+    "stability": MockStabilityHandler,
+    "fal": MockFalHandler,
+    "elevenlabs": MockElevenLabsHandler,
+    "fakeyou": MockFakeYouHandler,
+    "s3": MockS3Handler,
+    "web": MockWebHandler,
+}
+
+# Providers whose clients hard-code their URLs are reached by rewriting the hostname
+_HOSTS = {
+    "api.stability.ai": "stability",
+    "queue.fal.run": "fal",
+    "api.elevenlabs.io": "elevenlabs",
+    "api.fakeyou.com": "fakeyou",
+    "www.google.com": "web",
+}
+
+
+def _serve(conn, options: dict) -> None:
+    servers = [MockServer(handler, **options) for handler in _HANDLERS.values()]
+    for server in servers:
+        server.__enter__()
+    conn.send({name: server.url for name, server in zip(_HANDLERS, servers)})
+    conn.recv()
+    conn.send({name: server.request_count for name, server in zip(_HANDLERS, servers)})
+    for server in servers:
+        server.__exit__()
+
+
+class Scenario:
+    """
+    One entry point under test.
+    Parameters:
+        - call (Callable[[int], object]): Makes one call; receives the call index.
+        - setup (Optional[Callable[[], None]]): Runs once before the first call. Defaults to None.
+    """
+    def __init__(self, call: Callable[[int], object], setup: Optional[Callable[[], None]] = None):
+        self.call = call
+        self.setup = setup
+
+
+def _scenarios(workdir: str, threads: int) -> Dict[str, Scenario]:
+    from langchain_openai import OpenAIEmbeddings
+    from chat.chatwithdoc import chatwithdoc, loaddoc
+    from chat.gpt4omini import gpt4omini
+    from chat.llama3 import llama3
+    from chat.text_to_text import text_to_text
+    from audiotools import celeb, generate_audio, stt
+    from imagetools import stability
+    from liveweb import web_summary
+
+    # Checking chunk lengths needs tiktoken's vocabulary, which is downloaded on first use; the mock endpoint
+    # accepts plain text, so the check is skipped and chatwithdoc runs offline
+    sys.modules["chat.chatwithdoc"].OpenAIEmbeddings = functools.partial(OpenAIEmbeddings,
+                                                                         check_embedding_ctx_length=False)
+
+    # chatwithdoc keeps an index and a memory file per user, so each worker thread gets its own user
+    users = [f"bench-{i}" for i in range(threads)]
+    local = threading.local()
+    next_user = itertools.count()
+
+    def user() -> str:
+        if not hasattr(local, "user"):
+            local.user = users[next(next_user) % len(users)]
+        return local.user
+
+    def build_indexes() -> None:
+        document = "\n".join(f"row {i},value {i * 7},note about item {i}" for i in range(200))
+        for name in users:
+            loaddoc(("id,value,note\n" + document).encode(), ".csv", KEY, name)
+
+    def meme_call(i: int) -> str:
+        # meme reads its keys from the host application's src.config; the benchmark plays that role here
+        if "src.config" not in sys.modules:
+            config = types.ModuleType("src.config")
+            config.Config = types.SimpleNamespace(OPENAI_API_KEY=KEY, FAL_KEY_SECRET=KEY)
+            sys.modules.setdefault("src", types.ModuleType("src")).config = config
+            sys.modules["src.config"] = config
+        from memelora import meme
+        return meme("ginnan", f"a cat holding sign {i}", "Describe a meme image for: {user_prompt}")
+
+    processor = text_to_text("gpt-4o-mini", KEY)
+    os.chdir(workdir)
+    return {
+        "gpt4omini": Scenario(lambda i: gpt4omini(f"benchmark prompt {i}", api_key=KEY)),
+        "llama3": Scenario(lambda i: llama3(f"benchmark prompt {i}", api_key=KEY)),
+        "text_to_text": Scenario(lambda i: processor.process(f"benchmark prompt {i}")),
+        "web_summary": Scenario(lambda i: web_summary(KEY, f"benchmark query {i}", 3, coalesce=False)),
+        "stability": Scenario(lambda i: stability(KEY, "AKIAMOCK", "mock-secret", "bench-bucket", f"a red fox {i}")),
+        "generate_audio": Scenario(lambda i: generate_audio(KEY, KEY, f"Hello number {i}", emotion="cheerful")),
+        "celeb": Scenario(lambda i: celeb("bench@example.com", "password", f"Hello number {i}", "TM:mock")),
+        "stt": Scenario(lambda i: stt(KEY, f"https://example.com/audio-{i}.mp3", "English")),
+        "meme": Scenario(meme_call),
+        "chatwithdoc": Scenario(lambda i: chatwithdoc(f"What is the value of row {i % 200}?", KEY, user()),
+                                setup=build_indexes),
+    }
+
+
+def _measure(call: Callable[[int], object], calls: int, threads: int, memory_calls: int) -> dict:
+    errors = []
+
+    def timed(i: int) -> float:
+        start = time.perf_counter()
+        try:
+            call(i)
+        except Exception as e:
+            errors.append(e)
+        return time.perf_counter() - start
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = sorted(executor.map(timed, range(calls)))
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    # Memory is traced in a separate sequential pass because tracemalloc slows every allocation
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for i in range(calls, calls + memory_calls):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            try:
+                call(i)
+            except Exception:
+                pass
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "calls": calls,
+        "errors": len(errors),
+        "first_error": repr(errors[0]) if errors else None,
+        "throughput": calls / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000,
+        "cpu_ms_per_call": cpu / calls * 1000,
+        "peak_kib_per_call": statistics.fmean(peaks) / 1024 if peaks else None,
+        "retained_kib_per_call": statistics.fmean(retained) / 1024 if retained else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=3, help="Unmeasured calls per scenario before timing.")
+    parser.add_argument("--memory-calls", type=int, default=10, help="Sequential calls traced for memory.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock server latency in seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock requests that fail.")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected failures.")
+    parser.add_argument("--blob-size", type=int, default=64 * 1024, help="Bytes per mock image or audio body.")
+    parser.add_argument("--scenarios", default="", help="Comma-separated scenarios to run. Defaults to all.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    options = {"latency": args.latency, "error_rate": args.error_rate, "error_status": args.error_status,
+               "blob_size": args.blob_size}
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.get_context("spawn").Process(target=_serve, args=(child, options), daemon=True)
+    process.start()
+    urls = parent.recv()
+
+    os.environ.update({
+        "OPENAI_API_KEY": KEY,
+        "OPENAI_BASE_URL": f"{urls['openai']}/v1",
+        "OPENAI_API_BASE": f"{urls['openai']}/v1",
+        "TOGETHER_API_KEY": KEY,
+        "TOGETHER_BASE_URL": f"{urls['together']}/v1",
+        "AWS_ENDPOINT_URL_S3": urls["s3"],
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "FAL_KEY": KEY,
+    })
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir, \
+            redirect_hosts({host: urls[name] for host, name in _HOSTS.items()}):
+        cwd = os.getcwd()
+        try:
+            scenarios = _scenarios(workdir, args.threads)
+            selected = [name for name in args.scenarios.split(",") if name] or list(scenarios)
+            for name in selected:
+                if name not in scenarios:
+                    parser.error(f"Unknown scenario {name}; choose from {', '.join(scenarios)}")
+                scenario = scenarios[name]
+                if scenario.setup is not None:
+                    try:
+                        scenario.setup()
+                    except Exception as e:
+                        results[name] = {"errors": 1, "first_error": repr(e)}
+                        print(f"{name:>14}: setup failed: {e!r}")
+                        continue
+                for i in range(args.warmup):
+                    try:
+                        scenario.call(-1 - i)
+                    except Exception:
+                        pass
+                result = results[name] = _measure(scenario.call, args.calls, args.threads, args.memory_calls)
+                print(
+                    f"{name:>14}: {result['throughput']:8.1f} calls/s  p50 {result['p50_ms']:8.2f} ms  "
+                    f"p99 {result['p99_ms']:8.2f} ms  cpu {result['cpu_ms_per_call']:7.2f} ms/call  "
+                    f"peak {result['peak_kib_per_call'] or 0:8.1f} KiB/call  errors {result['errors']}"
+                )
+                if result["first_error"]:
+                    print(f"{'':>14}  first error: {result['first_error'][:200]}")
+        finally:
+            os.chdir(cwd)
+
+    parent.send("stop")
+    print(f"mock requests: {parent.recv()}")
+    process.join(timeout=5)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"options": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
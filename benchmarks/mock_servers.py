@@ -0,0 +1,397 @@
+import base64
+import contextlib
+import hashlib
+import json
+import random
+import re
+import struct
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """
+    Shared plumbing for the provider stand-ins.
+    Processing Logic:
+        - Speaks HTTP/1.1 so clients can keep connections alive between requests.
+        - Every request is counted, waits for the server's configured latency and then fails with the server's
+          error status at the configured error rate before the provider-specific handler runs.
+        - Subclasses implement route(method, body) and answer with _send_json, _send_bytes or _write_chunk.
+    """
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, delayed ACKs add ~40 ms to every response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _read_json(self) -> dict:
+        body = self._read_body()
+        return json.loads(body or b"{}")
+
+    def _send_json(self, payload: dict, status: int = 200, headers: Optional[Dict[str, str]] = None) -> None:
+        self._send_bytes(json.dumps(payload).encode(), "application/json", status, headers)
+
+    def _send_bytes(self, body: bytes, content_type: str, status: int = 200,
+                    headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _not_found(self) -> None:
+        self._send_json({"error": {"message": f"Unknown path {self.command} {self.path}"}}, status=404)
+
+    def _dispatch(self) -> None:
+        body = self._read_body()
+        self.server.count_request()
+        time.sleep(self.server.latency)
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self._send_json({"error": {"message": "Injected failure", "type": "server_error"}},
+                            status=self.server.error_status)
+            return
+        self.route(self.command, body)
+
+    def route(self, method: str, body: bytes) -> None:
+        self._not_found()
+
+    do_GET = do_POST = do_PUT = do_HEAD = do_DELETE = _dispatch
+
+
+class MockOpenAIHandler(MockHandler):
+    """
+    Stand-in for the OpenAI chat completions and embeddings endpoints; also serves the Together API,
+    which speaks the same chat completions format.
+    Processing Logic:
+        - Answers streaming requests with server-sent events ending in a usage chunk and everything else with a
+          single JSON body.
+        - Embeddings are deterministic per input text and honour the base64 encoding the OpenAI SDK requests.
+    """
+    def route(self, method: str, body: bytes) -> None:
+        request = json.loads(body or b"{}")
+        if method == "POST" and self.path.endswith("/chat/completions"):
+            self._chat(request)
+        elif method == "POST" and self.path.endswith("/embeddings"):
+            self._embeddings(request)
+        else:
+            self._not_found()
+
+    def _chat(self, request: dict) -> None:
+        model = request.get("model", "gpt-4o-mini")
+        reply = self.server.reply
+        usage = {"prompt_tokens": 10, "completion_tokens": len(reply.split()), "total_tokens": 10 + len(reply.split())}
+        if request.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for token in reply.split(" "):
+                chunk = {
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token + " "}, "finish_reason": None}],
+                }
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            final = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [],
+                "usage": usage,
+            }
+            self._write_chunk(f"data: {json.dumps(final)}\n\n".encode())
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+            return
+
+        self._send_json({
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    def _embeddings(self, request: dict) -> None:
+        inputs = request.get("input", [])
+        if not isinstance(inputs, list) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        data = []
+        for index, item in enumerate(inputs):
+            vector = _embedding(json.dumps(item), self.server.embedding_dim)
+            if request.get("encoding_format") == "base64":
+                vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode()
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        self._send_json({
+            "object": "list",
+            "data": data,
+            "model": request.get("model", "text-embedding-ada-002"),
+            "usage": {"prompt_tokens": 8 * len(inputs), "total_tokens": 8 * len(inputs)},
+        })
+
+
+def _embedding(text: str, dim: int) -> list:
+    seed = hashlib.sha256(text.encode()).digest()
+    rng = random.Random(seed)
+    return [rng.uniform(-1.0, 1.0) for _ in range(dim)]
+
+
+class MockStabilityHandler(MockHandler):
+    """Stand-in for the Stability AI v2beta image endpoints; every generate or edit call returns an image body."""
+    def route(self, method: str, body: bytes) -> None:
+        if method == "POST" and self.path.startswith("/v2beta/stable-image/"):
+            self._send_bytes(self.server.blob(), "image/png")
+        else:
+            self._not_found()
+
+
+class MockFalHandler(MockHandler):
+    """
+    Stand-in for the fal queue API.
+    Processing Logic:
+        - Submitting to any application returns a request id whose status and result URLs point back at this server.
+        - Requests complete immediately; the result carries both the image and transcription fields the callers read.
+    """
+    def route(self, method: str, body: bytes) -> None:
+        path = urlsplit(self.path).path
+        match = re.match(r"^/(.+)/requests/([^/]+)(/status|/cancel)?$", path)
+        if method == "POST" and match is None:
+            request_id = uuid.uuid4().hex
+            base = f"{self.server.url}{path}/requests/{request_id}"
+            self._send_json({
+                "request_id": request_id,
+                "response_url": base,
+                "status_url": f"{base}/status",
+                "cancel_url": f"{base}/cancel",
+            })
+        elif method == "GET" and match is not None and match.group(3) == "/status":
+            self._send_json({"status": "COMPLETED", "logs": [], "metrics": {"inference_time": self.server.latency}})
+        elif method == "GET" and match is not None and match.group(3) is None:
+            url = f"{self.server.url}/files/{match.group(2)}.png"
+            self._send_json({
+                "images": [{"url": url, "content_type": "image/png"}],
+                "image": {"url": url, "content_type": "image/png"},
+                "text": self.server.reply,
+                "chunks": [{"timestamp": [0.0, 1.0], "text": self.server.reply}],
+            })
+        elif method == "PUT" and match is not None and match.group(3) == "/cancel":
+            self._send_json({"status": "ALREADY_COMPLETED"})
+        else:
+            self._not_found()
+
+
+class MockElevenLabsHandler(MockHandler):
+    """Stand-in for the ElevenLabs text-to-speech, voice listing and voice cloning endpoints."""
+    def route(self, method: str, body: bytes) -> None:
+        path = urlsplit(self.path).path
+        if method == "POST" and path.startswith("/v1/text-to-speech/"):
+            self._send_bytes(self.server.blob(), "audio/mpeg")
+        elif method == "POST" and path == "/v1/voices/add":
+            self._send_json({"voice_id": uuid.uuid4().hex[:20], "requires_verification": False})
+        elif method == "GET" and path == "/v1/voices":
+            self._send_json({"voices": []})
+        else:
+            self._not_found()
+
+
+class MockFakeYouHandler(MockHandler):
+    """
+    Stand-in for the FakeYou login, TTS inference, job status and logout endpoints.
+    Jobs are reported complete on the first poll, so callers never reach their polling sleep.
+    """
+    def route(self, method: str, body: bytes) -> None:
+        path = urlsplit(self.path).path
+        if method == "POST" and path == "/v1/login":
+            self._send_json({"success": True}, headers={"Set-Cookie": f"session={uuid.uuid4().hex}; Path=/; HttpOnly"})
+        elif method == "POST" and path == "/tts/inference":
+            self._send_json({"success": True, "inference_job_token": f"JTINF:{uuid.uuid4().hex}"})
+        elif method == "GET" and path.startswith("/tts/job/"):
+            self._send_json({
+                "success": True,
+                "state": {
+                    "job_token": path.rsplit("/", 1)[-1],
+                    "status": "complete_success",
+                    "maybe_public_bucket_wav_audio_path": f"/media/{uuid.uuid4().hex}.wav",
+                },
+            })
+        elif method == "POST" and path == "/v1/logout":
+            self._send_json({"success": True})
+        else:
+            self._not_found()
+
+
+class MockS3Handler(MockHandler):
+    """Path-style S3 stand-in that keeps uploaded objects in memory and serves them back."""
+    def route(self, method: str, body: bytes) -> None:
+        key = urlsplit(self.path).path
+        if method == "PUT":
+            self.server.objects[key] = body
+            self._send_bytes(b"", "application/xml", headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+        elif method in ("GET", "HEAD") and key in self.server.objects:
+            self._send_bytes(self.server.objects[key], "application/octet-stream")
+        elif method == "DELETE":
+            self.server.objects.pop(key, None)
+            self._send_bytes(b"", "application/xml", status=204)
+        else:
+            self._send_bytes(b"<Error><Code>NoSuchKey</Code></Error>", "application/xml", status=404)
+
+
+class MockWebHandler(MockHandler):
+    """
+    Stand-in for Google search and the pages it links to.
+    '/search' returns result blocks in Google's markup, each linking to a '/page/<n>' of paragraphs on this server.
+    """
+    def route(self, method: str, body: bytes) -> None:
+        parts = urlsplit(self.path)
+        if method == "GET" and parts.path == "/search":
+            count = int(dict(re.findall(r"(\w+)=([^&]*)", parts.query)).get("num", 10))
+            results = "".join(
+                f'<div class="tF2Cxc"><a href="{self.server.url}/page/{i}"><h3>Result {i}</h3></a>'
+                f'<span class="aCOpRe">Snippet {i}</span></div>'
+                for i in range(count)
+            )
+            self._send_bytes(f"<html><body>{results}</body></html>".encode(), "text/html")
+        elif method == "GET" and parts.path.startswith("/page/"):
+            paragraphs = "".join(f"<p>{self.server.reply}</p>" for _ in range(self.server.paragraphs))
+            self._send_bytes(f"<html><body>{paragraphs}</body></html>".encode(), "text/html")
+        else:
+            self._not_found()
+
+
+class MockServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server that runs a mock handler in the background.
+    Parameters:
+        - handler (type): The request handler class to serve.
+        - latency (float): Seconds each request waits before responding. Defaults to 0.
+        - reply (str): Text returned as the completion, transcription or page paragraph. Defaults to a short fixed sentence.
+        - error_rate (float): Fraction of requests answered with error_status instead. Defaults to 0.
+        - error_status (int): HTTP status used for injected failures. Defaults to 500.
+        - blob_size (int): Size in bytes of returned images and audio. Defaults to 64 KiB.
+        - embedding_dim (int): Length of returned embedding vectors. Defaults to 1536.
+        - paragraphs (int): Paragraphs per mock web page. Defaults to 20.
+    """
+    daemon_threads = True
+
+    def __init__(self, handler: type, latency: float = 0.0, reply: str = "This is a mock completion.",
+                 error_rate: float = 0.0, error_status: int = 500, blob_size: int = 64 * 1024,
+                 embedding_dim: int = 1536, paragraphs: int = 20):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.latency = latency
+        self.reply = reply
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.blob_size = blob_size
+        self.embedding_dim = embedding_dim
+        self.paragraphs = paragraphs
+        self.request_count = 0
+        self.objects: Dict[str, bytes] = {}
+        self._count_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_request(self) -> None:
+        with self._count_lock:
+            self.request_count += 1
+
+    def blob(self) -> bytes:
+        return b"\x89PNG\r\n\x1a\n" + b"\0" * max(0, self.blob_size - 8)
+
+    def __enter__(self) -> "MockServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def _rewrite(url: str, hosts: Dict[str, str]) -> str:
+    parts = urlsplit(url)
+    target = hosts.get(parts.hostname or "")
+    if target is None:
+        return url
+    base = urlsplit(target)
+    return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, parts.fragment))
+
+
+@contextlib.contextmanager
+def redirect_hosts(hosts: Dict[str, str]) -> Iterator[None]:
+    """
+    Send requests for the given hostnames to mock servers instead, for clients with hard-coded URLs.
+    Covers everything built on requests or httpx; the library code under test is left untouched.
+
+    Args:
+        hosts (Dict[str, str]): Hostname to mock base URL, e.g. {"api.stability.ai": server.url}.
+    """
+    import httpx
+    from requests.adapters import HTTPAdapter
+
+    send = HTTPAdapter.send
+    handle = httpx.HTTPTransport.handle_request
+    ahandle = httpx.AsyncHTTPTransport.handle_async_request
+
+    def patched_send(self, request, *args, **kwargs):
+        request.url = _rewrite(request.url, hosts)
+        return send(self, request, *args, **kwargs)
+
+    def redirect(request: "httpx.Request") -> None:
+        rewritten = _rewrite(str(request.url), hosts)
+        if rewritten != str(request.url):
+            request.url = httpx.URL(rewritten)
+
+    def patched_handle(self, request):
+        redirect(request)
+        return handle(self, request)
+
+    async def patched_ahandle(self, request):
+        redirect(request)
+        return await ahandle(self, request)
+
+    HTTPAdapter.send = patched_send
+    httpx.HTTPTransport.handle_request = patched_handle
+    httpx.AsyncHTTPTransport.handle_async_request = patched_ahandle
+    try:
+        yield
+    finally:
+        HTTPAdapter.send = send
+        httpx.HTTPTransport.handle_request = handle
+        httpx.AsyncHTTPTransport.handle_async_request = ahandle
@@ -1,6 +1,25 @@
 from .gpt3_5 import gpt3_5
 from .gpt4o import stream_gpt4omini, non_stream_gpt4omini
-from .llama3 import llama3
+from .llama3 import llama3, stream_llama3, non_stream_llama3
 from .text_to_text import text_to_text
 from .gpt4omini import gpt4omini
-from .chatwithdoc import loaddoc, chatwithdoc
+from .chatwithdoc import loaddoc, chatwithdoc, astream_chatwithdoc, AnswerEvent, SourceChunk
+from .client_pool import ClientRegistry, get_client
+from .completion_cache import CompletionCache
+from .semantic_cache import SemanticCache
+from .single_flight import SingleFlight, default_single_flight
+from .rate_limiter import RateLimiter, RateLimits, configure_rate_limit, default_rate_limits
+from .resilience import RetryPolicy, ResilienceMetrics, default_resilience_metrics
+from .model_router import ModelProfile, ModelRouter, default_router
+from .pipeline import Chain, Stage, chain
+from .index_cache import IndexCache, default_index_cache
+from .embedding_cache import CachedEmbeddings, EmbeddingCache, default_embedding_cache
+from .ingestion import EmbeddingPipeline, IngestionProgress
+from .document_loaders import iter_documents
+from .memory_store import ConversationStore, default_memory_store
+from .summary_memory import MemoryReport, RollingSummaryMemory, openai_summarizer
+from .vector_index import IndexConfig, default_index_config
+from .hybrid_retrieval import HybridRetriever, KeywordIndex, TermOverlapReranker
+from .fast_qa import SingleCallRetrievalChain, rewrite_question
+from .answer_cache import AnswerCache, default_answer_cache
+from .instrumentation import CallEvent, InMemoryMetrics, add_hook, remove_hook, enable_instrumentation, disable_instrumentation
@@ -0,0 +1,279 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from .completion_cache import normalize_prompt
+from .embedding_cache import embedding_model_name
+from .hybrid_retrieval import HybridRetriever
+
+ScoredDocuments = List[Tuple[Document, float]]
+
+
+class CachedAnswer(NamedTuple):
+    """A stored answer and the chunks, with scores, it was based on."""
+    answer: str
+    sources: ScoredDocuments
+
+
+def query_digest(vector: List[float]) -> str:
+    """
+    Return a key for a query embedding: the L2-normalized vector rounded to float16, hashed, so the same query
+    embedded twice always maps to the same key.
+
+    Args:
+        vector (List[float]): The query embedding.
+
+    Returns:
+        str: A hex digest.
+    """
+    array = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array))
+    if norm:
+        array = array / norm
+    return hashlib.sha256(array.astype(np.float16).tobytes()).hexdigest()
+
+
+def history_digest(chat_history: str) -> str:
+    """Return a key for a conversation as formatted for the prompt."""
+    return hashlib.sha256(chat_history.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Process-wide cache of retrieval results and final answers for questions about user documents.
+    Parameters:
+        - max_retrievals (int): Retrieval results kept, least recently used evicted first. Defaults to 4096.
+        - max_answers (int): Answers kept; 0 disables the answer tier. Defaults to 1024.
+        - max_queries (int): Query embeddings remembered by query text. Defaults to 4096.
+    Processing Logic:
+        - Retrieval results are keyed by (user_id, index version, normalized query embedding); the embedding of
+          a repeated query text is remembered, so a repeat skips the embedding call as well as the search.
+        - Answers are keyed by (user_id, index version, normalized question, digest of the chat history), so a
+          question is only answered from the cache in the same conversational context.
+        - The index version is part of every key, so results for an older index are never served. Entries of a
+          user are dropped as soon as a newer version is seen, or when invalidate() is called after an update.
+        - Hits, misses, evictions and invalidations are exposed through stats().
+    """
+    def __init__(self, max_retrievals: int = 4096, max_answers: int = 1024, max_queries: int = 4096):
+        self.max_retrievals = max_retrievals
+        self.max_answers = max_answers
+        self.max_queries = max_queries
+        self._retrievals: "OrderedDict[Tuple[str, str, str], ScoredDocuments]" = OrderedDict()
+        self._answers: "OrderedDict[Tuple[str, str, str, str], CachedAnswer]" = OrderedDict()
+        self._queries: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._versions: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.retrieval_hits = 0
+        self.retrieval_misses = 0
+        self.answer_hits = 0
+        self.answer_misses = 0
+        self.embeddings_saved = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def embed_query(self, embeddings: Embeddings, query: str) -> List[float]:
+        """
+        Embed a query, reusing the vector of an earlier identical (whitespace-normalized) query.
+
+        Args:
+            embeddings (Embeddings): The embeddings the index is searched with.
+            query (str): The query text.
+
+        Returns:
+            List[float]: The query embedding.
+        """
+        key = (embedding_model_name(embeddings), normalize_prompt(query))
+        with self._lock:
+            vector = self._queries.get(key)
+            if vector is not None:
+                self._queries.move_to_end(key)
+                self.embeddings_saved += 1
+                return vector
+        vector = embeddings.embed_query(key[1])
+        with self._lock:
+            self._store_locked(self._queries, key, vector, self.max_queries)
+        return vector
+
+    def get_retrieval(self, user_id: str, version: str, vector: List[float]) -> Optional[ScoredDocuments]:
+        """
+        Look up the chunks retrieved for a query embedding from a version of a user's index.
+
+        Args:
+            user_id (str): The index owner.
+            version (str): The index version, usually from index_version.
+            vector (List[float]): The query embedding.
+
+        Returns:
+            Optional[ScoredDocuments]: The chunks with their scores, best first, or None on a miss.
+        """
+        key = (user_id, version, query_digest(vector))
+        with self._lock:
+            results = self._retrievals.get(key)
+            if results is None:
+                self.retrieval_misses += 1
+                return None
+            self._retrievals.move_to_end(key)
+            self.retrieval_hits += 1
+            return list(results)
+
+    def put_retrieval(self, user_id: str, version: str, vector: List[float], results: ScoredDocuments) -> None:
+        """Store the chunks retrieved for a query embedding from a version of a user's index."""
+        with self._lock:
+            self._observe_version_locked(user_id, version)
+            self._store_locked(self._retrievals, (user_id, version, query_digest(vector)), list(results),
+                               self.max_retrievals)
+
+    def get_answer(self, user_id: str, version: str, question: str, chat_history: str) -> Optional[CachedAnswer]:
+        """
+        Look up the answer given to a question in a conversational context.
+
+        Args:
+            user_id (str): The index owner.
+            version (str): The index version the answer was based on.
+            question (str): The question as asked.
+            chat_history (str): The conversation before the question, as formatted for the prompt.
+
+        Returns:
+            Optional[CachedAnswer]: The answer and its sources, or None on a miss.
+        """
+        key = (user_id, version, normalize_prompt(question), history_digest(chat_history))
+        with self._lock:
+            answer = self._answers.get(key)
+            if answer is None:
+                self.answer_misses += 1
+                return None
+            self._answers.move_to_end(key)
+            self.answer_hits += 1
+            return answer
+
+    def put_answer(self, user_id: str, version: str, question: str, chat_history: str, answer: str,
+                   sources: Optional[ScoredDocuments] = None) -> None:
+        """Store the answer given to a question in a conversational context, with the chunks it was based on."""
+        if self.max_answers < 1:
+            return
+        key = (user_id, version, normalize_prompt(question), history_digest(chat_history))
+        with self._lock:
+            self._observe_version_locked(user_id, version)
+            self._store_locked(self._answers, key, CachedAnswer(answer, list(sources or [])), self.max_answers)
+
+    def invalidate(self, user_id: str, version: Optional[str] = None) -> int:
+        """
+        Drop a user's cached retrievals and answers.
+
+        Args:
+            user_id (str): The index owner.
+            version (Optional[str]): The user's new index version; entries for it are kept. Defaults to None.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        with self._lock:
+            if version is None:
+                self._versions.pop(user_id, None)
+            else:
+                self._versions[user_id] = version
+            return self._drop_user_locked(user_id, version)
+
+    def _observe_version_locked(self, user_id: str, version: str) -> None:
+        # A new version means the index was rewritten, possibly by another process
+        if self._versions.get(user_id) != version:
+            self._versions[user_id] = version
+            self._drop_user_locked(user_id, version)
+
+    def _drop_user_locked(self, user_id: str, keep_version: Optional[str]) -> int:
+        removed = 0
+        for entries in (self._retrievals, self._answers):
+            stale = [key for key in entries if key[0] == user_id and key[1] != keep_version]
+            for key in stale:
+                del entries[key]
+            removed += len(stale)
+        self.invalidations += removed
+        return removed
+
+    def _store_locked(self, entries: OrderedDict, key: Tuple, value: Any, limit: int) -> None:
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > limit:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove every cached retrieval, answer and query embedding."""
+        with self._lock:
+            self._retrievals.clear()
+            self._answers.clear()
+            self._queries.clear()
+            self._versions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return counters describing cache usage.
+
+        Returns:
+            Dict[str, Any]: Entry counts, hits, misses and hit rates of both tiers, embedding calls saved,
+                evictions and invalidations.
+        """
+        with self._lock:
+            retrievals = self.retrieval_hits + self.retrieval_misses
+            answers = self.answer_hits + self.answer_misses
+            return {
+                "retrieval_entries": len(self._retrievals),
+                "retrieval_hits": self.retrieval_hits,
+                "retrieval_misses": self.retrieval_misses,
+                "retrieval_hit_rate": self.retrieval_hits / retrievals if retrievals else 0.0,
+                "answer_entries": len(self._answers),
+                "answer_hits": self.answer_hits,
+                "answer_misses": self.answer_misses,
+                "answer_hit_rate": self.answer_hits / answers if answers else 0.0,
+                "embeddings_saved": self.embeddings_saved,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class CachedRetriever(BaseRetriever):
+    """
+    Retriever that serves repeated queries against one version of a user's index from an AnswerCache.
+    Parameters:
+        - retriever (BaseRetriever): A HybridRetriever or a FAISS vectorstore retriever.
+        - cache (AnswerCache): Where query embeddings and results are kept.
+        - user_id (str): The index owner.
+        - version (str): The index version being searched.
+    Processing Logic:
+        - The query is embedded once through the cache and the embedding is passed to the wrapped search, so
+          neither a repeated query nor a miss embeds twice.
+    """
+    retriever: BaseRetriever
+    cache: AnswerCache
+    user_id: str
+    version: str
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def search(self, query: str) -> ScoredDocuments:
+        """Return the chunks for a query with their scores, best first, from the cache when possible."""
+        vectorstore = self.retriever.vectorstore
+        vector = self.cache.embed_query(vectorstore.embedding_function, query)
+        results = self.cache.get_retrieval(self.user_id, self.version, vector)
+        if results is None:
+            if isinstance(self.retriever, HybridRetriever):
+                results = self.retriever.search(query, vector)
+            else:
+                results = vectorstore.similarity_search_with_score_by_vector(vector, **self.retriever.search_kwargs)
+            self.cache.put_retrieval(self.user_id, self.version, vector, results)
+        return results
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: Optional[CallbackManagerForRetrieverRun] = None) -> List[Document]:
+        return [document for document, _ in self.search(query)]
+
+
+default_answer_cache = AnswerCache()
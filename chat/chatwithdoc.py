@@ -1,15 +1,70 @@
+import asyncio
+import logging
 import os
-import pickle
-import tempfile
-from io import BytesIO
-import pandas as pd
-from langchain.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain.vectorstores import FAISS
 from langchain.chains import ConversationalRetrievalChain
+from langchain.chains.conversational_retrieval.base import _get_chat_history
 from langchain.memory import ConversationBufferMemory
-from langchain.schema import Document
+from langchain_core.documents import Document
+from langchain_core.prompts import format_document
+from langchain_core.runnables import Runnable
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+
+from .answer_cache import AnswerCache, CachedRetriever, default_answer_cache
+from .client_pool import get_client
+from .completion_cache import CompletionCache, LangChainCompletionCache
+from .document_loaders import DocumentSource, estimate_size, iter_chunks, iter_documents
+from .embedding_cache import CachedEmbeddings, EmbeddingCache, content_hash, default_embedding_cache
+from .fast_qa import FAST_QA_PROMPT, SingleCallRetrievalChain, rewrite_question
+from .hybrid_retrieval import HybridRetriever, Reranker, update_keyword_index
+from .index_cache import IndexCache, default_index_cache, index_version
+from .ingestion import EmbeddingPipeline
+from .instrumentation import ainstrument_stream
+from .memory_store import ConversationStore, default_memory_store
+from .rate_limiter import default_rate_limits, estimate_tokens
+from .summary_memory import RollingSummaryMemory, openai_summarizer
+from .vector_index import IndexConfig, default_index_config, load_vectorstore, save_vectorstore, tune_index
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionReport(NamedTuple):
+    """
+    What one update_faiss_index call did. 'skipped' chunks were already in the index or repeated within the
+    upload, 'cached' chunks reused a stored vector, and only 'embedded' chunks were sent to the embedding model.
+    """
+    chunks: int
+    skipped: int
+    cached: int
+    embedded: int
+    embedding_calls_saved: int
+    tokens_saved: int
+
+
+class SourceChunk(NamedTuple):
+    """
+    A retrieved chunk as streamed to the caller. 'score' is the fused (or reranked) score with hybrid search, higher
+    is better, or the L2 distance of a plain vector search, lower is better. 'page' is the zero-based PDF page, or
+    None for spreadsheets, whose row range is in 'metadata'.
+    """
+    content: str
+    score: float
+    page: Optional[int]
+    source: Optional[str]
+    metadata: Dict
+
+
+class AnswerEvent(NamedTuple):
+    """
+    One item of ChatWithDoc.astream_answer: kind "sources" carries the retrieved chunks, sent once before the
+    answer, and kind "token" carries the next piece of the answer.
+    """
+    kind: str
+    token: str = ""
+    sources: Tuple[SourceChunk, ...] = ()
+
 
 class ChatWithDoc:
     """
@@ -17,129 +72,240 @@ class ChatWithDoc:
     Parameters:
         - api_key (str): The API key to interact with the OpenAI services.
         - user_id (str): Identifier for the user to create personalized indexes and memory.
+        - cache (Optional[CompletionCache]): Opt-in cache for the QA chain's temperature-0 LLM calls. Defaults to None.
+        - index_cache (Optional[IndexCache]): Cache of loaded FAISS indexes. Defaults to the process-wide instance.
+        - embedding_cache (Optional[EmbeddingCache]): Store of chunk embeddings. Defaults to the shared one under faiss/.
+        - pipeline (Optional[EmbeddingPipeline]): Batching, concurrency and progress settings for ingestion. Defaults to EmbeddingPipeline().
+        - memory_store (Optional[ConversationStore]): Where conversation turns are kept. Defaults to the shared SQLite store.
+        - memory_tokens (Optional[int]): Token budget of the chat history sent with each question; older turns are
+          summarized in the background. Defaults to None, which sends the store's recent window verbatim.
+        - index_config (Optional[IndexConfig]): Index type, search parameters and memory mapping. Defaults to exact flat indexes.
+        - hybrid_search (bool): Fuse BM25 keyword search with the vector search. Defaults to True.
+        - reranker (Optional[Reranker]): Local reranker for the fused candidates, e.g. TermOverlapReranker(). Defaults to None.
+        - single_call (bool): Answer follow-up questions with one LLM call instead of condensing them first. Defaults to False.
+        - answer_cache (Optional[AnswerCache]): Cache of retrieval results and answers. Defaults to the process-wide instance.
     Processing Logic:
-        - On initialization, load existing conversation memory or create a new one.
+        - On initialization, attach the user's conversation from the memory store; only its recent window is read,
+          and only when the chain asks for it.
+        - Each turn is appended to the store as the chain records it, so saving does not rewrite the history.
+        - With memory_tokens, each question's history is a rolling summary plus the last turns within the
+          budget, and memory.last_report holds the prompt tokens saved against the full history.
         - Provides methods to update the FAISS index with new documents and load an existing index.
         - Supports conversation retrieval from indexed documents and saves conversations to user memory.
+        - Loaded indexes are shared through the index cache keyed by user and index version, so repeated
+          questions skip deserialization and a rewritten index is picked up on the next question.
+        - Ingestion embeds only chunks that are neither in the user's index nor in the embedding cache, and
+          records what it saved in last_ingestion.
+        - New chunks are embedded in concurrent batches and added to the index as each batch finishes.
+        - Indexes past index_config.min_vectors are rebuilt as IVF, HNSW or compressed indexes on save, and indexes
+          loaded for questions are memory-mapped, so many large tenants can share a process.
+        - A BM25 keyword index is kept next to each FAISS index and fused with it by reciprocal rank, so exact
+          SKUs, names and numbers are retrieved without extra LLM calls.
+        - With single_call, follow-ups are retrieved with a local rewrite of the question and answered with the
+          conversation in the prompt, saving the sequential question-condensing LLM call on every turn.
+        - astream_answer yields the retrieved chunks as soon as retrieval completes and then the answer tokens as
+          the model produces them; the turn is recorded in memory once the answer is complete.
+        - Retrieval results and answers are cached per index version; a repeated question in the same context is
+          answered from the cache without embedding, searching or calling the LLM, and updating the index drops
+          the user's cached entries.
         - Handles different document types with specific loaders and processes them accordingly.
     """
-    def __init__(self, api_key: str, user_id: str):
+    def __init__(self, api_key: str, user_id: str, cache: Optional[CompletionCache] = None,
+                 index_cache: Optional[IndexCache] = None, embedding_cache: Optional[EmbeddingCache] = None,
+                 pipeline: Optional[EmbeddingPipeline] = None, memory_store: Optional[ConversationStore] = None,
+                 memory_tokens: Optional[int] = None, index_config: Optional[IndexConfig] = None,
+                 hybrid_search: bool = True, reranker: Optional[Reranker] = None, single_call: bool = False,
+                 answer_cache: Optional[AnswerCache] = None):
         self.api_key = api_key
         self.user_id = user_id
+        self.cache = cache
+        self.index_cache = index_cache or default_index_cache
+        self.embedding_cache = embedding_cache or default_embedding_cache
+        self.pipeline = pipeline or EmbeddingPipeline()
+        self.memory_store = memory_store or default_memory_store
+        self.memory_tokens = memory_tokens
+        self.index_config = index_config or default_index_config
+        self.hybrid_search = hybrid_search
+        self.reranker = reranker
+        self.single_call = single_call
+        self.answer_cache = answer_cache or default_answer_cache
+        self.index_version: Optional[str] = None
+        self.last_ingestion: Optional[IngestionReport] = None
         self.memory = self.load_memory()
         self.qa_chain = None  # Store QA chain after creation
 
+    def _build_llm(self) -> ChatOpenAI:
+        llm_cache = LangChainCompletionCache(self.cache) if self.cache is not None else None
+        return ChatOpenAI(model="gpt-3.5-turbo", temperature=0, openai_api_key=self.api_key, cache=llm_cache)
+
+    def _load_for_search(self, user_folder: str, embeddings) -> FAISS:
+        vectorstore = load_vectorstore(user_folder, embeddings, self.index_config)
+        if self.hybrid_search:
+            update_keyword_index(vectorstore, user_folder)
+        return vectorstore
+
+    def _build_retriever(self, vectorstore: FAISS, user_folder: str) -> CachedRetriever:
+        return CachedRetriever(
+            retriever=self._build_search_retriever(vectorstore, user_folder),
+            cache=self.answer_cache,
+            user_id=self.user_id,
+            version=self.index_version
+        )
+
+    def _build_search_retriever(self, vectorstore: FAISS, user_folder: str):
+        if not self.hybrid_search:
+            return vectorstore.as_retriever(search_kwargs={"k": 3})
+        keyword_index = update_keyword_index(vectorstore, user_folder)
+        return HybridRetriever(vectorstore=vectorstore, keyword_index=keyword_index, k=3, reranker=self.reranker)
+
+    def _build_chain(self, retriever) -> ConversationalRetrievalChain:
+        if self.single_call:
+            return SingleCallRetrievalChain.from_llm(
+                llm=self._build_llm(),
+                retriever=retriever,
+                memory=self.memory,
+                combine_docs_chain_kwargs={"prompt": FAST_QA_PROMPT}
+            )
+        return ConversationalRetrievalChain.from_llm(
+            llm=self._build_llm(),
+            retriever=retriever,
+            memory=self.memory
+        )
+
     def save_memory(self):
-        memory_path = f"{self.user_id}_memory.pkl"
-        with open(memory_path, "wb") as f:
-            pickle.dump(self.memory, f)
+        """Kept for compatibility: turns are appended to the memory store as they happen, so nothing is pending."""
 
     def load_memory(self):
-        """Loads and returns the user's conversation memory from a file, if available; otherwise, initializes a new conversation memory.
+        """Returns the user's conversation memory backed by the memory store.
         Parameters:
             - None
         Returns:
-            - ConversationBufferMemory: An instance of the conversation memory, either loaded from a file or newly created.
+            - BaseChatMemory: A conversation memory whose history lives in the memory store.
         Processing Logic:
-            - Checks if the user's memory file exists based on their user_id.
-            - If the file exists, the user's memory is loaded using pickle.
-            - If the file does not exist, a new ConversationBufferMemory object is instantiated with default parameters."""
-        memory_path = f"{self.user_id}_memory.pkl"
-        if os.path.exists(memory_path):
-            with open(memory_path, "rb") as f:
-                memory = pickle.load(f)
-        else:
-            memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
-        return memory
+            - A legacy <user_id>_memory.pkl file is imported into the store on first use and renamed.
+            - No messages are read here; the chain reads the recent window when it needs the history.
+            - With memory_tokens set, a RollingSummaryMemory bounds the history to that many tokens."""
+        if self.memory_tokens is not None:
+            return RollingSummaryMemory(
+                chat_memory=self.memory_store.history(self.user_id),
+                store=self.memory_store,
+                user_id=self.user_id,
+                summarize=openai_summarizer(self.api_key),
+                max_tokens=self.memory_tokens
+            )
+        return ConversationBufferMemory(
+            chat_memory=self.memory_store.history(self.user_id),
+            memory_key="chat_history",
+            return_messages=True
+        )
 
     def load_documents(self, file_path, file_extension):
         """Load documents from a file with the specified file extension.
         Parameters:
-            - file_path (str): The path to the input file.
+            - file_path (DocumentSource): The path to the input file, its bytes, or an open binary file object.
             - file_extension (str): The extension of the file used to determine the loading procedure.
         Returns:
             - list: A list of Document objects containing the loaded data.
         Processing Logic:
-            - .pdf files are loaded using a PyPDFLoader.
+            - .pdf files are loaded page by page, one Document per page.
             - .docx files are not supported and raise a ValueError.
-            - .xlsx files are converted to strings and saved as Document objects, one per sheet.
-            - .csv files are converted to a single string and saved as one Document object."""
-        ext = file_extension.lower()
-        documents = []
-
-        if ext == ".pdf":
-            loader = PyPDFLoader(file_path)
-            documents = loader.load()
-        elif ext == ".docx":
-            # Assuming you have a custom way to process .docx without unstructured
-            raise ValueError("Support for .docx not implemented without unstructured.")
-        elif ext == ".xlsx":
-            xlsx_file = pd.ExcelFile(file_path)
-            for sheet in xlsx_file.sheet_names:
-                df = pd.read_excel(xlsx_file, sheet_name=sheet)
-                text = df.to_string()
-                documents.append(Document(page_content=text))
-        elif ext == ".csv":
-            csv_data = pd.read_csv(file_path)
-            text = csv_data.to_string()
-            documents.append(Document(page_content=text))
-        else:
-            raise ValueError(f"Unsupported file type: {ext}")
-
-        return documents
+            - .xlsx and .csv files become groups of whole rows, each headed by the table name, row range and column names.
+            - update_faiss_index consumes the same documents lazily instead of building this list."""
+        return list(iter_documents(file_path, file_extension))
 
     def update_faiss_index(self, file_path, file_extension):
         # Set the base folder for storing FAISS indexes
         """Updates the FAISS index with new documents and creates a conversational retrieval chain.
         Parameters:
-            - file_path (str): Path to the file containing documents to be indexed.
+            - file_path (DocumentSource): Path to the file containing documents to be indexed, or its bytes or an open binary file object.
             - file_extension (str): The file extension, used for parsing the document format.
         Returns:
             - ConversationalRetrievalChain: An instance of a conversational retrieval system.
         Processing Logic:
             - The embeddings are generated for the new documents and the FAISS index is updated or created.
+            - Pages and row blocks are parsed, split and embedded as a stream, so memory use does not grow with
+              the size of the upload and nothing is written to temporary files.
             - A text splitter is used to divide the documents into manageable chunks for processing.
+            - Chunks already in the index are skipped and cached vectors are reused; when nothing is new the saved
+              index is left untouched.
             - All folders necessary for storing the FAISS index are ensured to exist.
             - The QA chain is formed using the updated FAISS index and a ConversationalRetrievalChain."""
         base_folder = "faiss"
         user_folder = os.path.join(base_folder, self.user_id)
 
-        embeddings = OpenAIEmbeddings(api_key=self.api_key)
+        embeddings = CachedEmbeddings(OpenAIEmbeddings(api_key=self.api_key), self.embedding_cache)
 
         # Check if the user-specific folder exists and load the vectorstore
         if os.path.exists(user_folder):
-            vectorstore = FAISS.load_local(
-                user_folder,
-                embeddings,
-                allow_dangerous_deserialization=True
-            )
+            vectorstore = load_vectorstore(user_folder, embeddings, self.index_config, mmap=False)
         else:
             vectorstore = None
 
-        # Load documents and split them into chunks
-        docs = self.load_documents(file_path, file_extension)
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        splits = text_splitter.split_documents(docs)
+        # Drop chunks the index already holds and repeats within this upload
+        known = set()
+        if vectorstore is not None:
+            for doc in getattr(vectorstore.docstore, "_dict", {}).values():
+                known.add(doc.metadata.get("content_hash") or content_hash(doc.page_content))
+        counts = {"chunks": 0, "skipped": 0, "skipped_tokens": 0, "pages": 0}
+        size = estimate_size(file_path, file_extension)
+
+        def new_splits():
+            # Load documents and split them into chunks as the pipeline asks for more
+            text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+            for split in iter_chunks(iter_documents(file_path, file_extension), text_splitter):
+                counts["chunks"] += 1
+                counts["pages"] = split.metadata.get("page", -1) + 1
+                key = content_hash(split.page_content)
+                if key in known:
+                    counts["skipped"] += 1
+                    counts["skipped_tokens"] += estimate_tokens(split.page_content)
+                    continue
+                known.add(key)
+                split.metadata["content_hash"] = key
+                yield split
 
-        # Update the vectorstore
+        # Update the vectorstore batch by batch
+        previous_total = vectorstore.index.ntotal if vectorstore is not None else 0
+        def expected_chunks():
+            # New chunks so far scaled by the share of PDF pages read, or CSV bytes at about one chunk per 1000
+            if not size:
+                return None
+            if file_extension.lower() != ".pdf":
+                return max(1, size // 1000)
+            if not counts["pages"]:
+                return None
+            return round((counts["chunks"] - counts["skipped"]) * size / counts["pages"])
+
+        vectorstore = self.pipeline.run(embeddings, new_splits(), vectorstore, self.api_key, total=expected_chunks)
         if vectorstore is None:
-            vectorstore = FAISS.from_documents(splits, embeddings)
-        else:
-            vectorstore.add_documents(splits)
+            raise ValueError("No text could be extracted from the document.")
+        if vectorstore.index.ntotal > previous_total:
+            # Ensure the base folder and user folder exist
+            os.makedirs(user_folder, exist_ok=True)
 
-        # Ensure the base folder and user folder exist
-        os.makedirs(user_folder, exist_ok=True)
+            # Save the updated FAISS index, converting it once it is large enough, and make it the cached version
+            save_vectorstore(vectorstore, user_folder, self.index_config)
+            if self.hybrid_search:
+                update_keyword_index(vectorstore, user_folder)
+            version = index_version(user_folder)
+            self.index_cache.put(self.user_id, version, vectorstore)
+            self.answer_cache.invalidate(self.user_id, version)
 
-        # Save the updated FAISS index
-        vectorstore.save_local(user_folder)
+        self.last_ingestion = IngestionReport(
+            chunks=counts["chunks"],
+            skipped=counts["skipped"],
+            cached=embeddings.cached,
+            embedded=embeddings.embedded,
+            embedding_calls_saved=counts["skipped"] + embeddings.cached,
+            tokens_saved=counts["skipped_tokens"] + embeddings.tokens_saved,
+        )
+        logger.info("Ingested document for %s: %s", self.user_id, self.last_ingestion)
 
         # Create the QA chain
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-        self.qa_chain = ConversationalRetrievalChain.from_llm(
-            llm=ChatOpenAI(model="gpt-3.5-turbo", temperature=0, openai_api_key=self.api_key),
-            retriever=retriever,
-            memory=self.memory
-        )
+        self.index_version = index_version(user_folder)
+        tune_index(vectorstore.index, self.index_config)
+        retriever = self._build_retriever(vectorstore, user_folder)
+        self.qa_chain = self._build_chain(retriever)
 
         return self.qa_chain
 
@@ -151,49 +317,171 @@ class ChatWithDoc:
         user_folder = os.path.join(base_folder, self.user_id)
         embeddings = OpenAIEmbeddings(api_key=self.api_key)
 
-        if os.path.exists(user_folder):
-            vectorstore = FAISS.load_local(
-                user_folder,
-                embeddings,
-                allow_dangerous_deserialization=True
-            )
-            retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-            self.qa_chain = ConversationalRetrievalChain.from_llm(
-                llm=ChatOpenAI(model="gpt-3.5-turbo", temperature=0, openai_api_key=self.api_key),
-                retriever=retriever,
-                memory=self.memory
+        version = index_version(user_folder)
+        if version is not None:
+            self.index_version = version
+            vectorstore = self.index_cache.get(
+                self.user_id,
+                version,
+                lambda: self._load_for_search(user_folder, embeddings),
+                embeddings
             )
+            retriever = self._build_retriever(vectorstore, user_folder)
+            self.qa_chain = self._build_chain(retriever)
         else:
             raise ValueError("FAISS index does not exist. Load documents first.")
 
         return self.qa_chain
 
+    def _chat_history(self) -> Tuple[List, str]:
+        # The conversation before the question, as messages and as formatted for the prompts
+        history = self.memory.load_memory_variables({})[self.memory.memory_key]
+        return history, (self.qa_chain.get_chat_history or _get_chat_history)(history)
+
+    def ask(self, query: str) -> str:
+        """
+        Answer a question, from the answer cache when it was already answered in the same context.
+
+        Args:
+            query (str): The question to ask.
+
+        Returns:
+            str: The answer.
+        """
+        if self.qa_chain is None:
+            self.load_existing_faiss_index()
+        chain = self.qa_chain
+        history, chat_history = self._chat_history()
+        cached = self.answer_cache.get_answer(self.user_id, self.index_version, query, chat_history)
+        if cached is not None:
+            self.memory.save_context({"question": query}, {"answer": cached.answer})
+            return cached.answer
+
+        # The chain's steps run here, so the chunks cached with the answer are the ones this call retrieved
+        if not history or isinstance(chain, SingleCallRetrievalChain):
+            search_query = self._local_search_query(query, history)
+        else:
+            default_rate_limits.acquire("openai", self.api_key, chat_history + query, "gpt-3.5-turbo")
+            search_query = chain.question_generator.run(question=query, chat_history=chat_history)
+        scored = _search_with_scores(chain.retriever, search_query)
+        # The single-call prompt sees the history itself; the default one only gets the standalone question
+        question = query if isinstance(chain, SingleCallRetrievalChain) else search_query
+        default_rate_limits.acquire("openai", self.api_key, question, "gpt-3.5-turbo")
+        answer = chain.combine_docs_chain.run(
+            input_documents=[document for document, _ in scored], question=question, chat_history=chat_history
+        )
+        self.memory.save_context({"question": query}, {"answer": answer})
+        self.answer_cache.put_answer(self.user_id, self.index_version, query, chat_history, answer, scored)
+        return answer
+
+    def _local_search_query(self, query: str, history: List) -> str:
+        # The search query when no condensing call is needed
+        return rewrite_question(query, history) if history else query
+
+    async def astream_answer(self, query: str) -> AsyncIterator[AnswerEvent]:
+        """
+        Answer a question, yielding the retrieved chunks and then the answer tokens as they arrive.
+
+        Args:
+            query (str): The question to ask.
+
+        Returns:
+            AsyncIterator[AnswerEvent]: One "sources" event with the chunks, scores and pages the answer is based
+                on, followed by "token" events. Nothing is recorded in memory if the caller stops reading early.
+        """
+        if self.qa_chain is None:
+            await asyncio.to_thread(self.load_existing_faiss_index)
+        chain = self.qa_chain
+        # Memory and cache calls read SQLite and count tokens; keep them off the event loop like retrieval
+        history, chat_history = await asyncio.to_thread(self._chat_history)
+        cached = await asyncio.to_thread(self.answer_cache.get_answer, self.user_id, self.index_version, query,
+                                         chat_history)
+        if cached is not None:
+            yield AnswerEvent("sources", sources=_source_chunks(cached.sources))
+            yield AnswerEvent("token", token=cached.answer)
+            await asyncio.to_thread(self.memory.save_context, {"question": query}, {"answer": cached.answer})
+            return
+
+        # Same search query the blocking chain would use
+        if not history or isinstance(chain, SingleCallRetrievalChain):
+            search_query = self._local_search_query(query, history)
+        else:
+            await default_rate_limits.aacquire("openai", self.api_key, chat_history + query, "gpt-3.5-turbo")
+            search_query = await chain.question_generator.arun(question=query, chat_history=chat_history)
+
+        # Retrieval embeds the query and searches locally; keep both off the event loop
+        scored = await asyncio.to_thread(_search_with_scores, chain.retriever, search_query)
+        yield AnswerEvent("sources", sources=_source_chunks(scored))
 
-def loaddoc(file_bytes: bytes, file_extension: str, api_key: str, user_id: str) -> ConversationalRetrievalChain:
+        combine = chain.combine_docs_chain
+        context = combine.document_separator.join(
+            format_document(document, combine.document_prompt) for document, _ in scored
+        )
+        # Same question the blocking chain answers: the condensed one unless the prompt sees the history itself
+        question = query if isinstance(chain, SingleCallRetrievalChain) else search_query
+        inputs = {combine.document_variable_name: context, "question": question, "chat_history": chat_history}
+        prompt = combine.llm_chain.prompt
+        await default_rate_limits.aacquire("openai", self.api_key, context + question, "gpt-3.5-turbo")
+        # Pooled streaming client, at the chain's temperature
+        llm = get_client("openai", "gpt-3.5-turbo", self.api_key, streaming=True,
+                         loop=asyncio.get_running_loop()).bind(temperature=0)
+        tokens = ainstrument_stream("openai", "gpt-3.5-turbo", "astream_answer", context + question,
+                                    _stream_tokens(prompt, llm, inputs))
+        answer = []
+        async for token in tokens:
+            answer.append(token)
+            yield AnswerEvent("token", token=token)
+        answer = "".join(answer)
+        await asyncio.to_thread(self.memory.save_context, {"question": query}, {"answer": answer})
+        await asyncio.to_thread(self.answer_cache.put_answer, self.user_id, self.index_version, query, chat_history,
+                                answer, scored)
+
+
+def _search_with_scores(retriever, query: str) -> List[Tuple[Document, float]]:
+    if isinstance(retriever, (CachedRetriever, HybridRetriever)):
+        return retriever.search(query)
+    return retriever.vectorstore.similarity_search_with_score(query, **retriever.search_kwargs)
+
+
+def _source_chunks(scored: List[Tuple[Document, float]]) -> Tuple[SourceChunk, ...]:
+    return tuple(
+        SourceChunk(document.page_content, float(score), document.metadata.get("page"),
+                    document.metadata.get("source"), document.metadata)
+        for document, score in scored
+    )
+
+
+async def _stream_tokens(prompt, llm: Runnable, inputs: Dict) -> AsyncIterator[str]:
+    # Only the variables the prompt declares; chat_history is unused by the default answering prompt
+    async for chunk in (prompt | llm).astream({name: inputs[name] for name in prompt.input_variables}):
+        if chunk.content:
+            yield chunk.content
+
+
+def loaddoc(file_bytes: DocumentSource, file_extension: str, api_key: str, user_id: str,
+            pipeline: Optional[EmbeddingPipeline] = None) -> ConversationalRetrievalChain:
     """
     Load documents and update the FAISS index.
     
     Args:
-        file_bytes (bytes): The bytes of the document file.
+        file_bytes (DocumentSource): The bytes of the document file, or an open binary file object.
         file_extension (str): The extension of the document file.
         api_key (str): API key for the OpenAI model.
         user_id (str): Unique user identifier.
+        pipeline (Optional[EmbeddingPipeline]): Embedding batch, concurrency and progress settings. Defaults to None.
         
     Returns:
         ConversationalRetrievalChain: The QA chain for the loaded documents.
     """
-    # Create a temporary file to store the document content
-    with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-        temp_file.write(file_bytes)
-        temp_file_path = temp_file.name  # Get the path to the temporary file
-
-    chat_doc = ChatWithDoc(api_key, user_id)
-    qa_chain = chat_doc.update_faiss_index(temp_file_path, file_extension)
+    # The upload is parsed straight from memory or the caller's stream; nothing is written to disk but the index
+    chat_doc = ChatWithDoc(api_key, user_id, pipeline=pipeline)
+    qa_chain = chat_doc.update_faiss_index(file_bytes, file_extension)
 
     return qa_chain
 
 
-def chatwithdoc(query: str, api_key: str, user_id: str) -> str:
+def chatwithdoc(query: str, api_key: str, user_id: str, cache: Optional[CompletionCache] = None,
+                memory_tokens: Optional[int] = None, single_call: bool = False) -> str:
     """
     Query the loaded documents using the QA chain.
     
@@ -201,19 +489,39 @@ def chatwithdoc(query: str, api_key: str, user_id: str) -> str:
         query (str): The question to ask.
         api_key (str): API key for the OpenAI model.
         user_id (str): Unique user identifier.
+        cache (Optional[CompletionCache]): Opt-in cache for the QA chain's LLM calls. Defaults to None.
+        memory_tokens (Optional[int]): Token budget of the chat history, with older turns summarized. Defaults to None.
+        single_call (bool): Answer with one LLM call, without condensing the question first. Defaults to False.
         
     Returns:
         str: The answer to the query.
     """
-    chat_doc = ChatWithDoc(api_key, user_id)
+    chat_doc = ChatWithDoc(api_key, user_id, cache, memory_tokens=memory_tokens, single_call=single_call)
 
-    # Try to load the existing FAISS index and QA chain
+    # Load the existing FAISS index and QA chain, then answer from the cache or the chain
     try:
-        if chat_doc.qa_chain is None:
-            chat_doc.load_existing_faiss_index()
-        result = chat_doc.qa_chain({"question": query})
+        return chat_doc.ask(query)
     except ValueError as e:
         return str(e)
 
-    chat_doc.save_memory()
-    return result['answer']
+
+async def astream_chatwithdoc(query: str, api_key: str, user_id: str, cache: Optional[CompletionCache] = None,
+                              memory_tokens: Optional[int] = None,
+                              single_call: bool = False) -> AsyncIterator[AnswerEvent]:
+    """
+    Query the loaded documents, streaming the retrieved chunks and then the answer tokens.
+
+    Args:
+        query (str): The question to ask.
+        api_key (str): API key for the OpenAI model.
+        user_id (str): Unique user identifier.
+        cache (Optional[CompletionCache]): Opt-in cache for the question-condensing LLM call. Defaults to None.
+        memory_tokens (Optional[int]): Token budget of the chat history, with older turns summarized. Defaults to None.
+        single_call (bool): Answer with one LLM call, without condensing the question first. Defaults to False.
+
+    Returns:
+        AsyncIterator[AnswerEvent]: A "sources" event as soon as retrieval completes, then "token" events.
+    """
+    chat_doc = ChatWithDoc(api_key, user_id, cache, memory_tokens=memory_tokens, single_call=single_call)
+    async for event in chat_doc.astream_answer(query):
+        yield event
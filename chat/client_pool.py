@@ -0,0 +1,186 @@
+import asyncio
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from langchain_openai import ChatOpenAI
+from together import AsyncTogether, Together
+
+ClientKey = Tuple[str, str, Optional[str], bool, Optional[int]]
+
+
+def _openai_factory(model: str, api_key: Optional[str], streaming: bool) -> ChatOpenAI:
+    return ChatOpenAI(openai_api_key=api_key, model=model, streaming=streaming)
+
+
+def _together_factory(model: str, api_key: Optional[str], streaming: bool) -> Together:
+    return Together(api_key=api_key)
+
+
+def _together_async_factory(model: str, api_key: Optional[str], streaming: bool) -> AsyncTogether:
+    return AsyncTogether(api_key=api_key)
+
+
+class ClientRegistry:
+    """
+    Process-wide registry of long-lived LLM clients shared across calls and threads.
+    Parameters:
+        - max_clients (int): Upper bound on the number of pooled clients kept alive. Defaults to 64.
+        - idle_ttl (float): Seconds after which an unused client is evicted. Defaults to 900.
+    Processing Logic:
+        - Clients are keyed by (provider, model, api_key, streaming) and built once through a per-provider factory.
+        - Reusing a client keeps its underlying HTTP connection pool (and keep-alive sockets) warm.
+        - Entries idle for longer than idle_ttl are dropped on access, and the least recently used entry
+          is dropped whenever the registry grows past max_clients, so keys of inactive tenants do not pile up.
+        - Evicted clients are only dereferenced, never closed, so calls still in flight on them finish normally.
+        - Async connection pools cannot be shared between event loops, so callers on an event loop pass it in
+          and get a client scoped to that loop; entries whose loop has been closed are dropped on the next async lookup.
+    """
+    def __init__(self, max_clients: int = 64, idle_ttl: float = 900.0):
+        if max_clients < 1:
+            raise ValueError("max_clients must be at least 1.")
+        self.max_clients = max_clients
+        self.idle_ttl = idle_ttl
+        self._clients: "OrderedDict[ClientKey, Tuple[Any, float]]" = OrderedDict()
+        self._loops: Dict[ClientKey, "weakref.ReferenceType[asyncio.AbstractEventLoop]"] = {}
+        self._factories: Dict[str, Callable[[str, Optional[str], bool], Any]] = {
+            "openai": _openai_factory,
+            "together": _together_factory,
+            "together-async": _together_async_factory,
+        }
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def register_factory(self, provider: str, factory: Callable[[str, Optional[str], bool], Any]) -> None:
+        """
+        Register or replace the factory used to build clients for a provider.
+
+        Args:
+            provider (str): Provider name used as the first element of the registry key.
+            factory (Callable[[str, Optional[str], bool], Any]): Called as factory(model, api_key, streaming).
+        """
+        with self._lock:
+            self._factories[provider] = factory
+
+    def get(self, provider: str, model: str, api_key: Optional[str] = None, streaming: bool = False,
+            loop: Optional[asyncio.AbstractEventLoop] = None) -> Any:
+        """
+        Return the pooled client for the given key, building it on first use.
+
+        Args:
+            provider (str): The provider name, e.g. "openai" or "together".
+            model (str): The model name the client is bound to.
+            api_key (Optional[str]): The API key for the provider. Defaults to None.
+            streaming (bool): Whether the client is configured for streaming. Defaults to False.
+            loop (Optional[asyncio.AbstractEventLoop]): The event loop the client will be awaited on, if any. Defaults to None.
+
+        Returns:
+            Any: The shared client instance.
+
+        Raises:
+            ValueError: If no factory is registered for the provider.
+        """
+        key: ClientKey = (provider, model, api_key, streaming, id(loop) if loop is not None else None)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle_locked(now)
+            if loop is not None:
+                self._evict_closed_loops_locked()
+            entry = self._clients.get(key)
+            if entry is not None:
+                self._clients[key] = (entry[0], now)
+                self._clients.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            factory = self._factories.get(provider)
+            if factory is None:
+                raise ValueError(f"Unsupported provider: {provider}")
+            self.misses += 1
+            # Building under the lock keeps concurrent first calls from creating duplicate pools
+            client = factory(model, api_key, streaming)
+            self._clients[key] = (client, now)
+            if loop is not None:
+                self._loops[key] = weakref.ref(loop)
+            while len(self._clients) > self.max_clients:
+                evicted_key, _ = self._clients.popitem(last=False)
+                self._loops.pop(evicted_key, None)
+                self.evictions += 1
+            return client
+
+    def evict_idle(self) -> int:
+        """
+        Drop every client that has been idle for longer than idle_ttl.
+
+        Returns:
+            int: The number of clients evicted.
+        """
+        with self._lock:
+            return self._evict_idle_locked(time.monotonic()) + self._evict_closed_loops_locked()
+
+    def _evict_idle_locked(self, now: float) -> int:
+        evicted = 0
+        # Entries are kept in last-used order, so stale ones are always at the front
+        while self._clients:
+            key, (_, last_used) = next(iter(self._clients.items()))
+            if now - last_used <= self.idle_ttl:
+                break
+            del self._clients[key]
+            self._loops.pop(key, None)
+            evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def _evict_closed_loops_locked(self) -> int:
+        closed = [key for key, ref in self._loops.items() if ref() is None or ref().is_closed()]
+        for key in closed:
+            del self._loops[key]
+            self._clients.pop(key, None)
+        self.evictions += len(closed)
+        return len(closed)
+
+    def clear(self) -> None:
+        """Remove every pooled client."""
+        with self._lock:
+            self._clients.clear()
+            self._loops.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return counters describing registry usage.
+
+        Returns:
+            Dict[str, int]: The number of pooled clients, hits, misses and evictions.
+        """
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+default_registry = ClientRegistry()
+
+
+def get_client(provider: str, model: str, api_key: Optional[str] = None, streaming: bool = False,
+               loop: Optional[asyncio.AbstractEventLoop] = None) -> Any:
+    """
+    Convenience function to fetch a pooled client from the process-wide registry.
+
+    Args:
+        provider (str): The provider name, e.g. "openai" or "together".
+        model (str): The model name the client is bound to.
+        api_key (Optional[str]): The API key for the provider. Defaults to None.
+        streaming (bool): Whether the client is configured for streaming. Defaults to False.
+        loop (Optional[asyncio.AbstractEventLoop]): The event loop the client will be awaited on, if any. Defaults to None.
+
+    Returns:
+        Any: The shared client instance.
+    """
+    return default_registry.get(provider, model, api_key, streaming, loop)
@@ -0,0 +1,260 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse runs of whitespace and trim the ends so formatting-only differences share a cache entry."""
+    return " ".join(prompt.split())
+
+
+class CompletionCache:
+    """
+    Opt-in two-tier cache for chat completions.
+    Parameters:
+        - max_entries (int): Maximum number of entries kept in the in-memory tier. Defaults to 1024.
+        - ttl (Optional[float]): Seconds an entry stays valid in either tier; None keeps entries forever. Defaults to 3600.
+        - path (Optional[str]): Path of the SQLite file backing the on-disk tier; None disables it. Defaults to None.
+    Processing Logic:
+        - Keys are a hash of the model, language, normalized prompt and sampling parameters.
+        - Lookups hit the in-memory LRU first, then the SQLite tier, promoting disk hits back into memory.
+        - Writes go to both tiers, so entries survive process restarts when a path is configured.
+        - The async variants check memory on the event loop and run SQLite reads and writes in a worker thread;
+          the disk tier has its own lock, so a slow write never blocks a memory lookup.
+        - Hit, miss, eviction and expiration counters are exposed through stats().
+    """
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 3600.0, path: Optional[str] = None):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1.")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._memory: "OrderedDict[str, Tuple[str, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+            self._db.commit()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(model: str, prompt: str, language: Optional[str] = None, **params: Any) -> str:
+        """
+        Build the cache key for a completion request.
+
+        Args:
+            model (str): The model name.
+            prompt (str): The prompt text; whitespace is normalized before hashing.
+            language (Optional[str]): The response language. Defaults to None.
+            **params (Any): Sampling parameters such as temperature that affect the output.
+
+        Returns:
+            str: A hex digest identifying the request.
+        """
+        payload = json.dumps(
+            [model, language, normalize_prompt(prompt), sorted(params.items())],
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, model: str, prompt: str, language: Optional[str] = None, **params: Any) -> Optional[str]:
+        """
+        Look up a cached completion.
+
+        Args:
+            model (str): The model name.
+            prompt (str): The prompt text.
+            language (Optional[str]): The response language. Defaults to None.
+            **params (Any): Sampling parameters that were part of the request.
+
+        Returns:
+            Optional[str]: The cached completion, or None on a miss.
+        """
+        return self.get_by_key(self.make_key(model, prompt, language, **params))
+
+    def set(self, model: str, prompt: str, value: str, language: Optional[str] = None, **params: Any) -> None:
+        """
+        Store a completion in both tiers.
+
+        Args:
+            model (str): The model name.
+            prompt (str): The prompt text.
+            value (str): The completion to store.
+            language (Optional[str]): The response language. Defaults to None.
+            **params (Any): Sampling parameters that were part of the request.
+        """
+        self.set_by_key(self.make_key(model, prompt, language, **params), value)
+
+    async def aget(self, model: str, prompt: str, language: Optional[str] = None, **params: Any) -> Optional[str]:
+        """Asynchronous variant of get; only the in-memory tier is checked on the event loop."""
+        key = self.make_key(model, prompt, language, **params)
+        value = self._get_memory(key, time.time())
+        if value is None and self._db is not None:
+            value = await asyncio.to_thread(self._get_disk, key, time.time())
+        if value is None:
+            self._count_miss()
+        return value
+
+    async def aset(self, model: str, prompt: str, value: str, language: Optional[str] = None, **params: Any) -> None:
+        """Asynchronous variant of set; the SQLite write runs in a worker thread."""
+        key = self.make_key(model, prompt, language, **params)
+        expires_at = self._expires_at()
+        with self._lock:
+            self._store_memory_locked(key, value, expires_at)
+        if self._db is not None:
+            await asyncio.to_thread(self._set_disk, key, value, expires_at)
+
+    def get_by_key(self, key: str) -> Optional[str]:
+        """Look up a cached completion by a key built with make_key."""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is None and self._db is not None:
+            value = self._get_disk(key, now)
+        if value is None:
+            self._count_miss()
+        return value
+
+    def set_by_key(self, key: str, value: str) -> None:
+        """Store a completion under a key built with make_key."""
+        expires_at = self._expires_at()
+        with self._lock:
+            self._store_memory_locked(key, value, expires_at)
+        self._set_disk(key, value, expires_at)
+
+    def _expires_at(self) -> Optional[float]:
+        return time.time() + self.ttl if self.ttl is not None else None
+
+    def _count_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def _get_memory(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is None or expires_at > now:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return value
+            del self._memory[key]
+            self.expirations += 1
+            return None
+
+    def _get_disk(self, key: str, now: float) -> Optional[str]:
+        # SQLite has its own lock, so memory lookups never wait on disk I/O
+        with self._db_lock:
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT value, expires_at FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._db.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._db.commit()
+                value = None
+        with self._lock:
+            if value is None:
+                self.expirations += 1
+                return None
+            self._store_memory_locked(key, value, expires_at)
+            self.disk_hits += 1
+            return value
+
+    def _set_disk(self, key: str, value: str, expires_at: Optional[float]) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO completions (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at),
+                )
+                self._db.commit()
+
+    def _store_memory_locked(self, key: str, value: str, expires_at: Optional[float]) -> None:
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+        with self._db_lock:
+            if self._db is not None:
+                self._db.execute("DELETE FROM completions")
+                self._db.commit()
+
+    def close(self) -> None:
+        """Close the on-disk tier, if one is open."""
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return counters describing cache usage.
+
+        Returns:
+            Dict[str, int]: Memory and disk hits, misses, evictions, expirations and the in-memory size.
+        """
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "hits": self.memory_hits + self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "memory_entries": len(self._memory),
+            }
+
+
+class LangChainCompletionCache(BaseCache):
+    """
+    Adapter exposing a CompletionCache through LangChain's cache interface.
+    Parameters:
+        - cache (CompletionCache): The cache that stores the serialized generations.
+    Processing Logic:
+        - Passed as the 'cache' argument of a chat model so chains such as ConversationalRetrievalChain can opt in.
+        - LangChain's llm_string already encodes the model and its sampling parameters, so it is used as the model part of the key.
+    """
+    def __init__(self, cache: CompletionCache):
+        self.cache = cache
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        value = self.cache.get(llm_string, prompt)
+        return loads(value) if value is not None else None
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        self.cache.set(llm_string, prompt, dumps(list(return_val)))
+
+    def clear(self, **kwargs: Any) -> None:
+        self.cache.clear()
@@ -0,0 +1,112 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterator, List, Optional, Tuple
+
+from .completion_cache import CompletionCache
+from .rate_limiter import default_rate_limits
+from .single_flight import default_single_flight, request_key
+
+# Upstream calls made in the current context as (seconds, completion), when a caller is collecting them
+_upstream: ContextVar[Optional[List[Tuple[float, Optional[str]]]]] = ContextVar("chat_upstream_calls", default=None)
+
+
+@contextmanager
+def collect_upstream_calls() -> Iterator[List[Tuple[float, Optional[str]]]]:
+    """
+    Collect the upstream requests made by completions run in this context, for latency tracking.
+
+    Yields:
+        List[Tuple[float, Optional[str]]]: Filled with (seconds, completion) for every request sent, timed after
+            any rate-limit wait. Cache hits and calls that joined another caller's request add nothing.
+    """
+    calls: List[Tuple[float, Optional[str]]] = []
+    token = _upstream.set(calls)
+    try:
+        yield calls
+    finally:
+        _upstream.reset(token)
+
+
+def _note_upstream(started: float, content: Optional[str]) -> None:
+    calls = _upstream.get()
+    if calls is not None:
+        calls.append((time.perf_counter() - started, content))
+
+
+def run_completion(model: str, prompt: str, language: Optional[str], api_key: Optional[str],
+                   invoke: Callable[[], Optional[str]], cache: Optional[CompletionCache] = None,
+                   coalesce: bool = True, provider: str = "openai", **params: Any) -> Optional[str]:
+    """
+    Run a non-streaming completion through the shared cache and request-coalescing steps.
+
+    Args:
+        model (str): The model name, used for cache and coalescing keys.
+        prompt (str): The caller's prompt before templating.
+        language (Optional[str]): The response language.
+        api_key (Optional[str]): The caller's API key; concurrent calls are only coalesced within one key.
+        invoke (Callable[[], Optional[str]]): Performs the upstream call and returns the completion text.
+        cache (Optional[CompletionCache]): Cache consulted before and filled after the call. Defaults to None.
+        coalesce (bool): Whether concurrent identical calls share one upstream request. Defaults to True.
+        provider (str): The provider whose rate limit the upstream call counts against. Defaults to "openai".
+        **params (Any): Sampling parameters that affect the output, such as temperature.
+
+    Returns:
+        Optional[str]: The completion text.
+    """
+    if cache is not None:
+        cached = cache.get(model, prompt, language, **params)
+        if cached is not None:
+            return cached
+
+    def call() -> Optional[str]:
+        default_rate_limits.acquire(provider, api_key, prompt, model)
+        started = time.perf_counter()
+        content = invoke()
+        _note_upstream(started, content)
+        if cache is not None and content is not None:
+            cache.set(model, prompt, content, language, **params)
+        return content
+
+    if not coalesce:
+        return call()
+    return default_single_flight.do(request_key(model, prompt, api_key, language=language, **params), call)
+
+
+async def arun_completion(model: str, prompt: str, language: Optional[str], api_key: Optional[str],
+                          invoke: Callable[[], Awaitable[Optional[str]]], cache: Optional[CompletionCache] = None,
+                          coalesce: bool = True, provider: str = "openai", **params: Any) -> Optional[str]:
+    """
+    Asynchronous variant of run_completion for callers on an event loop.
+
+    Args:
+        model (str): The model name, used for cache and coalescing keys.
+        prompt (str): The caller's prompt before templating.
+        language (Optional[str]): The response language.
+        api_key (Optional[str]): The caller's API key; concurrent calls are only coalesced within one key.
+        invoke (Callable[[], Awaitable[Optional[str]]]): Factory for the coroutine performing the upstream call.
+        cache (Optional[CompletionCache]): Cache consulted before and filled after the call. Defaults to None.
+        coalesce (bool): Whether concurrent identical calls share one upstream request. Defaults to True.
+        provider (str): The provider whose rate limit the upstream call counts against. Defaults to "openai".
+        **params (Any): Sampling parameters that affect the output, such as temperature.
+
+    Returns:
+        Optional[str]: The completion text.
+    """
+    if cache is not None:
+        cached = await cache.aget(model, prompt, language, **params)
+        if cached is not None:
+            return cached
+
+    async def call() -> Optional[str]:
+        await default_rate_limits.aacquire(provider, api_key, prompt, model)
+        started = time.perf_counter()
+        content = await invoke()
+        _note_upstream(started, content)
+        if cache is not None and content is not None:
+            await cache.aset(model, prompt, content, language, **params)
+        return content
+
+    if not coalesce:
+        return await call()
+    return await default_single_flight.ado(request_key(model, prompt, api_key, language=language, **params), call)
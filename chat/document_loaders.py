@@ -0,0 +1,205 @@
+import csv
+import io
+import os
+from typing import BinaryIO, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from langchain_core.documents import Document
+from langchain_text_splitters import TextSplitter
+from pypdf import PdfReader
+
+DocumentSource = Union[bytes, bytearray, str, BinaryIO]
+
+
+def _open(source: DocumentSource) -> BinaryIO:
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    if isinstance(source, str):
+        return open(source, "rb")
+    return source
+
+
+def _name(source: DocumentSource) -> str:
+    if isinstance(source, str):
+        return source
+    return getattr(source, "name", None) or "upload"
+
+
+def iter_pdf(stream: BinaryIO, source: str) -> Iterator[Document]:
+    """Yield one Document per PDF page, extracting text only when the page is reached."""
+    reader = PdfReader(stream)
+    for number, page in enumerate(reader.pages):
+        text = page.extract_text() or ""
+        if text.strip():
+            yield Document(page_content=text, metadata={"source": source, "page": number})
+
+
+def estimate_size(source: DocumentSource, file_extension: str) -> Optional[int]:
+    """
+    Return a cheap measure of how much a document holds, for progress estimates.
+
+    Args:
+        source (DocumentSource): The file path, its bytes, or an open binary file object.
+        file_extension (str): The extension used to pick the parser, e.g. ".pdf".
+
+    Returns:
+        Optional[int]: The page count of a PDF, the byte size of a CSV, or None when it cannot be told up front.
+    """
+    ext = file_extension.lower()
+    if ext not in (".pdf", ".csv"):
+        return None
+    stream = _open(source)
+    start = stream.tell()
+    try:
+        if ext == ".pdf":
+            # Reads the page tree only; no page text is extracted
+            return len(PdfReader(stream).pages)
+        return stream.seek(0, os.SEEK_END) - start
+    except Exception:
+        return None
+    finally:
+        # Leave a caller's file object where it was
+        if stream is not source:
+            stream.close()
+        else:
+            stream.seek(start)
+
+
+# Control characters used while rendering rows; they do not occur in ordinary spreadsheet text
+_FIELD, _RECORD, _ESCAPE = "\x1f", "\x1e", "\x1b"
+
+
+def format_rows(frame: pd.DataFrame) -> List[str]:
+    """
+    Render every row as "value | value | value" in column order, without padding.
+
+    Args:
+        frame (pd.DataFrame): The rows to render.
+
+    Returns:
+        List[str]: One line per row; line breaks and tabs inside cells become spaces and empty cells stay empty.
+    """
+    # One C-level CSV write plus whole-string replaces instead of formatting cell by cell
+    text = frame.to_csv(sep=_FIELD, header=False, index=False, lineterminator=_RECORD,
+                        quoting=csv.QUOTE_NONE, escapechar=_ESCAPE)
+    for old, new in ((_ESCAPE, ""), ("\r", " "), ("\n", " "), ("\t", " "), (_FIELD, " | ")):
+        text = text.replace(old, new)
+    return text.split(_RECORD)[:-1]
+
+
+def iter_row_groups(frame: pd.DataFrame, label: str, metadata: dict, max_chars: int = 1000) -> Iterator[Document]:
+    """
+    Yield the rows of a frame as Documents of whole rows, each headed by the table name, row range and column names.
+
+    Args:
+        frame (pd.DataFrame): The rows; its index gives the zero-based row numbers.
+        label (str): Table name written at the top of each group, e.g. "sales.csv" or "book.xlsx / Q1".
+        metadata (dict): Metadata copied onto every Document.
+        max_chars (int): Target size of a group; a single longer row still forms its own group. Defaults to 1000.
+
+    Returns:
+        Iterator[Document]: Row groups carrying the column names and their first and last row numbers.
+    """
+    if frame.empty or not len(frame.columns):
+        return
+    header = " | ".join(str(column) for column in frame.columns)
+    lines = np.array(format_rows(frame), dtype=object)
+    rows = np.asarray(frame.index) + 1
+    keep = lines != " | " * (len(frame.columns) - 1)
+    lines, rows = lines[keep], rows[keep]
+    ends = np.cumsum(np.fromiter((len(line) + 1 for line in lines), dtype=np.int64, count=len(lines)))
+    budget = max(1, max_chars - len(label) - len(header) - 24)
+    columns = ", ".join(str(column) for column in frame.columns)
+    start = 0
+    while start < len(lines):
+        base = ends[start - 1] if start else 0
+        end = max(start + 1, int(np.searchsorted(ends, base + budget, side="right")))
+        first, last = int(rows[start]), int(rows[end - 1])
+        yield Document(
+            page_content=f"{label}, rows {first}-{last}\n{header}\n" + "\n".join(lines[start:end]),
+            metadata={**metadata, "columns": columns, "row_start": first, "row_end": last},
+        )
+        start = end
+
+
+def iter_csv(stream: BinaryIO, source: str, max_chars: int = 1000, frame_rows: int = 50000) -> Iterator[Document]:
+    """Yield row groups of a CSV file, reading and formatting it frame_rows rows at a time."""
+    for frame in pd.read_csv(stream, chunksize=frame_rows):
+        yield from iter_row_groups(frame, source, {"source": source}, max_chars)
+
+
+def iter_xlsx(stream: BinaryIO, source: str, max_chars: int = 1000, frame_rows: int = 50000) -> Iterator[Document]:
+    """Yield row groups of every sheet of a workbook, reading it row by row and formatting frame_rows rows at a time."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                continue
+            columns = [str(value) if value is not None else f"column_{i}" for i, value in enumerate(header)]
+            label = f"{source} / {sheet.title}"
+            metadata = {"source": source, "sheet": sheet.title}
+            block: List[tuple] = []
+            offset = 0
+            for row in rows:
+                block.append(row)
+                if len(block) >= frame_rows:
+                    yield from iter_row_groups(_sheet_frame(block, columns, offset), label, metadata, max_chars)
+                    offset += len(block)
+                    block = []
+            if block:
+                yield from iter_row_groups(_sheet_frame(block, columns, offset), label, metadata, max_chars)
+    finally:
+        workbook.close()
+
+
+def _sheet_frame(block: List[tuple], columns: List[str], offset: int) -> pd.DataFrame:
+    return pd.DataFrame(block, columns=columns, index=pd.RangeIndex(offset, offset + len(block)))
+
+
+def iter_documents(source: DocumentSource, file_extension: str, max_chars: int = 1000,
+                   frame_rows: int = 50000) -> Iterator[Document]:
+    """
+    Lazily load a document from a path, bytes or a binary file object.
+
+    Args:
+        source (DocumentSource): The file path, its bytes, or an open binary file object.
+        file_extension (str): The extension used to pick the parser, e.g. ".pdf".
+        max_chars (int): Target size of a spreadsheet row group. Defaults to 1000, the ingestion chunk size.
+        frame_rows (int): Spreadsheet rows parsed and formatted at a time. Defaults to 50000.
+
+    Returns:
+        Iterator[Document]: PDF pages or spreadsheet row groups, parsed as they are consumed.
+
+    Raises:
+        ValueError: If the file type is not supported.
+    """
+    ext = file_extension.lower()
+    if ext == ".docx":
+        raise ValueError("Support for .docx not implemented without unstructured.")
+    if ext not in (".pdf", ".csv", ".xlsx"):
+        raise ValueError(f"Unsupported file type: {ext}")
+
+    name = os.path.basename(_name(source))
+    stream = _open(source)
+    try:
+        if ext == ".pdf":
+            yield from iter_pdf(stream, name)
+        elif ext == ".csv":
+            yield from iter_csv(stream, name, max_chars, frame_rows)
+        else:
+            yield from iter_xlsx(stream, name, max_chars, frame_rows)
+    finally:
+        # Only close what was opened here; a caller's file object stays open
+        if stream is not source:
+            stream.close()
+
+
+def iter_chunks(documents: Iterator[Document], splitter: TextSplitter) -> Iterator[Document]:
+    """Split documents into chunks one document at a time, so only the current document is held in memory."""
+    for document in documents:
+        yield from splitter.split_documents([document])
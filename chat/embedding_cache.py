@@ -0,0 +1,186 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .rate_limiter import default_rate_limits, estimate_tokens
+
+_LOOKUP_BATCH = 500
+
+
+def content_hash(text: str) -> str:
+    """Return the hex SHA-256 of a chunk's text, the content address used by the embedding cache."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def embedding_model_name(embeddings: Embeddings) -> str:
+    """Return the model name of an embeddings object, falling back to its class name."""
+    return str(getattr(embeddings, "model", None) or type(embeddings).__name__)
+
+
+class EmbeddingCache:
+    """
+    Persistent content-addressed store of document embeddings.
+    Parameters:
+        - path (Optional[str]): SQLite file holding the vectors; None keeps them in memory only. Defaults to None.
+    Processing Logic:
+        - Vectors are keyed by (embedding model, SHA-256 of the chunk text), so identical chunks from any upload
+          or any user are embedded once per model.
+        - The database is opened on first use, so constructing a cache never touches the disk.
+        - Vectors are stored as float32 blobs and looked up in batches with a single query each.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _connect_locked(self) -> sqlite3.Connection:
+        if self._db is None:
+            if self.path is not None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path or ":memory:", check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, PRIMARY KEY (model, hash))"
+            )
+            self._db.commit()
+        return self._db
+
+    def get_many(self, model: str, hashes: Sequence[str]) -> Dict[str, List[float]]:
+        """
+        Look up cached vectors.
+
+        Args:
+            model (str): The embedding model name.
+            hashes (Sequence[str]): Content hashes of the chunks.
+
+        Returns:
+            Dict[str, List[float]]: The vectors found, by content hash.
+        """
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            db = self._connect_locked()
+            for start in range(0, len(unique), _LOOKUP_BATCH):
+                batch = unique[start:start + _LOOKUP_BATCH]
+                rows = db.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(batch))})",
+                    (model, *batch),
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype="float32").tolist()
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return found
+
+    def set_many(self, model: str, vectors: Dict[str, Sequence[float]]) -> None:
+        """
+        Store vectors.
+
+        Args:
+            model (str): The embedding model name.
+            vectors (Dict[str, Sequence[float]]): Vectors by content hash.
+        """
+        rows = [(model, key, np.asarray(vector, dtype="float32").tobytes()) for key, vector in vectors.items()]
+        with self._lock:
+            db = self._connect_locked()
+            db.executemany("INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)", rows)
+            db.commit()
+
+    def clear(self) -> None:
+        """Remove every stored vector."""
+        with self._lock:
+            self._connect_locked().execute("DELETE FROM embeddings")
+            self._db.commit()
+
+    def close(self) -> None:
+        """Close the database, if it is open."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return counters describing cache usage.
+
+        Returns:
+            Dict[str, int]: Hits and misses counted per unique chunk looked up.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves document vectors from an EmbeddingCache and embeds only unseen chunks.
+    Parameters:
+        - embeddings (Embeddings): The underlying embedding model, e.g. OpenAIEmbeddings.
+        - cache (EmbeddingCache): Where vectors are looked up and stored.
+    Processing Logic:
+        - embed_documents sends only chunks whose (model, text hash) is not cached, each distinct text once,
+          and returns vectors in input order.
+        - Query embeddings are passed straight through, since questions rarely repeat verbatim.
+        - Given a rate_limit, only the chunks actually sent are charged to it, so re-indexing cached content
+          is not throttled.
+        - Chunks served from the cache and their estimated tokens are counted as saved; the counters are safe to
+          update from concurrent embedding batches.
+    """
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = embedding_model_name(embeddings)
+        self.embedded = 0
+        self.cached = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str],
+                        rate_limit: Optional[Tuple[str, Optional[str]]] = None) -> List[List[float]]:
+        """
+        Embed documents, reusing cached vectors.
+
+        Args:
+            texts (List[str]): The chunk texts.
+            rate_limit (Optional[Tuple[str, Optional[str]]]): (provider, api_key) whose rate limit the request
+                for uncached chunks waits for. Defaults to None.
+
+        Returns:
+            List[List[float]]: One vector per text, in input order.
+        """
+        hashes = [content_hash(text) for text in texts]
+        vectors = self.cache.get_many(self.model, hashes)
+        missing = {key: text for key, text in zip(hashes, texts) if key not in vectors}
+        if missing:
+            if rate_limit is not None:
+                default_rate_limits.acquire(rate_limit[0], rate_limit[1], "\n".join(missing.values()), self.model)
+            fresh = dict(zip(missing, self.embeddings.embed_documents(list(missing.values()))))
+            self.cache.set_many(self.model, fresh)
+            vectors.update(fresh)
+        saved = [text for key, text in zip(hashes, texts) if key not in missing]
+        tokens = sum(estimate_tokens(text) for text in saved)
+        with self._lock:
+            self.embedded += len(missing)
+            self.cached += len(saved)
+            self.tokens_saved += tokens
+        return [vectors[key] for key in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query with the underlying model."""
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Asynchronous variant of embed_query."""
+        return await self.embeddings.aembed_query(text)
+
+
+default_embedding_cache = EmbeddingCache(os.path.join("faiss", "embedding_cache.sqlite"))
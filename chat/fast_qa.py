@@ -0,0 +1,121 @@
+import inspect
+from typing import Any, Dict, List, Optional
+
+from langchain.chains import ConversationalRetrievalChain
+from langchain.chains.conversational_retrieval.base import _get_chat_history
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+from .hybrid_retrieval import tokenize
+
+# The answering prompt sees the conversation itself, so follow-ups are resolved without a condensing call
+FAST_QA_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+     "Use the conversation so far and the following pieces of context to answer the user's question. Resolve "
+     "references such as \"it\" or \"that one\" from the conversation.\nIf you don't know the answer, just say that "
+     "you don't know, don't try to make up an answer.\n----------------\nConversation:\n{chat_history}\n"
+     "----------------\n{context}"),
+    ("human", "{question}"),
+])
+
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can could did do does for from had has have how i if in is it its me my of on "
+    "or our please show so tell than that the their them then there these they this those to us was we what when "
+    "where which who whom why will with would you your about also any give list more much many some".split()
+)
+
+
+def rewrite_question(question: str, chat_history: List[Any], max_terms: int = 8) -> str:
+    """
+    Make a follow-up question searchable on its own by appending key terms of the previous question, locally.
+
+    Args:
+        question (str): The new question, e.g. "and what does it cost?".
+        chat_history (List[Any]): The conversation as messages or (question, answer) tuples, oldest first.
+        max_terms (int): Maximum number of terms carried over. Defaults to 8.
+
+    Returns:
+        str: The question followed by up to max_terms terms of the previous question that it does not contain,
+            e.g. "and what does it cost? sku-0004217 warehouse", or the question unchanged without history.
+    """
+    previous = None
+    for turn in reversed(chat_history):
+        if isinstance(turn, HumanMessage):
+            previous = turn.content
+        elif isinstance(turn, tuple):
+            previous = turn[0]
+        elif isinstance(turn, BaseMessage):
+            continue
+        if previous:
+            break
+    if not previous:
+        return question
+    present = set(tokenize(question))
+    carried: List[str] = []
+    for term in tokenize(str(previous)):
+        if term in present or term in carried or term in _STOPWORDS or (len(term) < 3 and not term.isdigit()):
+            continue
+        carried.append(term)
+        if len(carried) == max_terms:
+            break
+    return f"{question} {' '.join(carried)}" if carried else question
+
+
+class SingleCallRetrievalChain(ConversationalRetrievalChain):
+    """
+    ConversationalRetrievalChain that answers follow-up questions with one LLM call instead of two.
+    Processing Logic:
+        - Retrieval runs on the question plus key terms of the previous question (rewrite_question), computed
+          locally, instead of on a standalone question written by the LLM.
+        - The answering prompt receives the conversation, so the model resolves references itself; build the
+          chain with combine_docs_chain_kwargs={"prompt": FAST_QA_PROMPT} or another prompt using chat_history.
+        - The rewritten query is returned as generated_question when return_generated_question is set.
+    """
+    def _prepare(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        get_chat_history = self.get_chat_history or _get_chat_history
+        return {
+            "question": inputs["question"],
+            "search_query": rewrite_question(inputs["question"], inputs["chat_history"]),
+            "chat_history": get_chat_history(inputs["chat_history"]),
+        }
+
+    def _finish(self, prepared: Dict[str, Any], docs: List[Any], answer: Optional[str]) -> Dict[str, Any]:
+        output: Dict[str, Any] = {self.output_key: answer}
+        if self.return_source_documents:
+            output["source_documents"] = docs
+        if self.return_generated_question:
+            output["generated_question"] = prepared["search_query"]
+        return output
+
+    def _call(self, inputs: Dict[str, Any],
+              run_manager: Optional[CallbackManagerForChainRun] = None) -> Dict[str, Any]:
+        _run_manager = run_manager or CallbackManagerForChainRun.get_noop_manager()
+        prepared = self._prepare(inputs)
+        if "run_manager" in inspect.signature(self._get_docs).parameters:
+            docs = self._get_docs(prepared["search_query"], inputs, run_manager=_run_manager)
+        else:
+            docs = self._get_docs(prepared["search_query"], inputs)  # type: ignore[call-arg]
+        if self.response_if_no_docs_found is not None and len(docs) == 0:
+            return self._finish(prepared, docs, self.response_if_no_docs_found)
+        answer = self.combine_docs_chain.run(
+            input_documents=docs, callbacks=_run_manager.get_child(),
+            **{**inputs, "chat_history": prepared["chat_history"]}
+        )
+        return self._finish(prepared, docs, answer)
+
+    async def _acall(self, inputs: Dict[str, Any],
+                     run_manager: Optional[AsyncCallbackManagerForChainRun] = None) -> Dict[str, Any]:
+        _run_manager = run_manager or AsyncCallbackManagerForChainRun.get_noop_manager()
+        prepared = self._prepare(inputs)
+        if "run_manager" in inspect.signature(self._aget_docs).parameters:
+            docs = await self._aget_docs(prepared["search_query"], inputs, run_manager=_run_manager)
+        else:
+            docs = await self._aget_docs(prepared["search_query"], inputs)  # type: ignore[call-arg]
+        if self.response_if_no_docs_found is not None and len(docs) == 0:
+            return self._finish(prepared, docs, self.response_if_no_docs_found)
+        answer = await self.combine_docs_chain.arun(
+            input_documents=docs, callbacks=_run_manager.get_child(),
+            **{**inputs, "chat_history": prepared["chat_history"]}
+        )
+        return self._finish(prepared, docs, answer)
@@ -1,8 +1,18 @@
 import asyncio
 from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
 from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
-from typing import Optional
+from typing import AsyncIterator, Iterator, Optional
+
+from .client_pool import get_client
+from .completion_cache import CompletionCache
+from .completion_runner import arun_completion, run_completion
+from .instrumentation import ainstrument_call, ainstrument_stream, instrument_call, instrument_stream
+from .rate_limiter import default_rate_limits
+
+PROMPT_TEMPLATE = PromptTemplate(
+    template="Please respond strictly in {language} without using other languages: {prompt}",
+    input_variables=["prompt", "language"]
+)
 
 class GPT3_5TurboClient:
     """
@@ -14,6 +24,14 @@ class GPT3_5TurboClient:
         - If streaming is enabled, it sets up a callback handler for streaming output.
         - The language input modifies the prompt to specify the response language.
         - An asynchronous call is made through the ChatOpenAI instance to get the model's response.
+        - The ChatOpenAI instance is shared through the process-wide client registry.
+        - stream_tokens/astream_tokens yield tokens as they arrive; reading is pull-based, so a slow consumer
+          applies backpressure and closing the iterator closes the upstream response.
+        - Non-streaming responses can be served from and stored in an opt-in CompletionCache.
+        - Concurrent identical non-streaming calls are coalesced into one upstream request unless disabled.
+        - Upstream calls wait for the "openai" rate limit of the API key when one is configured.
+        - Calls report queue time, time-to-first-token, latency and token throughput to any registered
+          instrumentation hooks; without hooks the timing code is skipped entirely.
     """
     def __init__(self, api_key: Optional[str] = None):
         """
@@ -24,7 +42,8 @@ class GPT3_5TurboClient:
         """
         self.api_key = api_key
 
-    async def chat_completion(self, prompt: str, stream: bool = False, language: Optional[str] = "English") -> Optional[str]:
+    async def chat_completion(self, prompt: str, stream: bool = False, language: Optional[str] = "English",
+                              cache: Optional[CompletionCache] = None, coalesce: bool = True) -> Optional[str]:
         """
         Generate a chat completion using the GPT-3.5-turbo model asynchronously.
 
@@ -32,32 +51,101 @@ class GPT3_5TurboClient:
             prompt (str): The prompt to send to the model.
             stream (bool): Whether to stream the output. Defaults to False.
             language (Optional[str]): The language for the response. Defaults to "English".
+            cache (Optional[CompletionCache]): Cache consulted for non-streaming calls. Defaults to None.
+            coalesce (bool): Whether concurrent identical non-streaming calls share one request. Defaults to True.
 
         Returns:
             Optional[str]: The model's response if streaming is disabled, otherwise None.
         """
-        prompt_template = PromptTemplate(
-            template="Please respond strictly in {language} without using other languages: {prompt}",
-            input_variables=["prompt", "language"]
-        )
         callbacks = [StreamingStdOutCallbackHandler()] if stream else None
+        llm = get_client("openai", "gpt-3.5-turbo", self.api_key, streaming=stream, loop=asyncio.get_running_loop())
+        result = PROMPT_TEMPLATE | llm
 
-        llm = ChatOpenAI(
-            openai_api_key=self.api_key,
-            model="gpt-3.5-turbo",
-            streaming=stream,
-            callbacks=callbacks
-        )
-
-        result = prompt_template | llm
+        if stream:
+            async def stream_to_stdout() -> None:
+                await default_rate_limits.aacquire("openai", self.api_key, prompt, "gpt-3.5-turbo")
+                await result.ainvoke({"prompt": prompt, "language": language}, config={"callbacks": callbacks})
 
-        # Asynchronous call to invoke the model
-        response = await result.ainvoke({"prompt": prompt, "language": language})
+            return await ainstrument_call("openai", "gpt-3.5-turbo", "chat_completion", prompt, stream_to_stdout)
 
-        if not stream:
+        async def invoke() -> str:
+            # Asynchronous call to invoke the model
+            response = await result.ainvoke({"prompt": prompt, "language": language})
             return response.content.strip()
 
-async def gpt3_5(prompt: str, api_key: Optional[str] = None, stream: bool = False, language: Optional[str] = "English") -> Optional[str]:
+        return await ainstrument_call(
+            "openai", "gpt-3.5-turbo", "chat_completion", prompt,
+            lambda: arun_completion("gpt-3.5-turbo", prompt, language, self.api_key, invoke,
+                                    cache=cache, coalesce=coalesce, temperature=llm.temperature))
+
+    def chat_completion_sync(self, prompt: str, language: Optional[str] = "English",
+                             cache: Optional[CompletionCache] = None, coalesce: bool = True) -> str:
+        """
+        Generate a chat completion using the GPT-3.5-turbo model from synchronous code.
+
+        Args:
+            prompt (str): The prompt to send to the model.
+            language (Optional[str]): The language for the response. Defaults to "English".
+            cache (Optional[CompletionCache]): Cache consulted before calling the model. Defaults to None.
+            coalesce (bool): Whether concurrent identical calls share one request. Defaults to True.
+
+        Returns:
+            str: The model's response.
+        """
+        llm = get_client("openai", "gpt-3.5-turbo", self.api_key)
+        result = PROMPT_TEMPLATE | llm
+
+        def invoke() -> str:
+            return result.invoke({"prompt": prompt, "language": language}).content.strip()
+
+        return instrument_call(
+            "openai", "gpt-3.5-turbo", "chat_completion_sync", prompt,
+            lambda: run_completion("gpt-3.5-turbo", prompt, language, self.api_key, invoke,
+                                   cache=cache, coalesce=coalesce, temperature=llm.temperature))
+
+    def stream_tokens(self, prompt: str, language: Optional[str] = "English") -> Iterator[str]:
+        """
+        Stream a chat completion from the GPT-3.5-turbo model token by token.
+
+        Args:
+            prompt (str): The prompt to send to the model.
+            language (Optional[str]): The language for the response. Defaults to "English".
+
+        Returns:
+            Iterator[str]: An iterator yielding the tokens as they are received.
+        """
+        return instrument_stream("openai", "gpt-3.5-turbo", "stream_tokens", prompt, self._stream_tokens(prompt, language))
+
+    def _stream_tokens(self, prompt: str, language: Optional[str]) -> Iterator[str]:
+        default_rate_limits.acquire("openai", self.api_key, prompt, "gpt-3.5-turbo")
+        llm = get_client("openai", "gpt-3.5-turbo", self.api_key, streaming=True)
+        for chunk in (PROMPT_TEMPLATE | llm).stream({"prompt": prompt, "language": language}):
+            if chunk.content:
+                yield chunk.content
+
+    def astream_tokens(self, prompt: str, language: Optional[str] = "English") -> AsyncIterator[str]:
+        """
+        Asynchronously stream a chat completion from the GPT-3.5-turbo model token by token.
+
+        Args:
+            prompt (str): The prompt to send to the model.
+            language (Optional[str]): The language for the response. Defaults to "English".
+
+        Returns:
+            AsyncIterator[str]: An iterator yielding the tokens as they are received.
+        """
+        return ainstrument_stream("openai", "gpt-3.5-turbo", "astream_tokens", prompt,
+                                  self._astream_tokens(prompt, language))
+
+    async def _astream_tokens(self, prompt: str, language: Optional[str]) -> AsyncIterator[str]:
+        await default_rate_limits.aacquire("openai", self.api_key, prompt, "gpt-3.5-turbo")
+        llm = get_client("openai", "gpt-3.5-turbo", self.api_key, streaming=True, loop=asyncio.get_running_loop())
+        async for chunk in (PROMPT_TEMPLATE | llm).astream({"prompt": prompt, "language": language}):
+            if chunk.content:
+                yield chunk.content
+
+async def gpt3_5(prompt: str, api_key: Optional[str] = None, stream: bool = False, language: Optional[str] = "English",
+                 cache: Optional[CompletionCache] = None, coalesce: bool = True) -> Optional[str]:
     """
     Asynchronous function to generate chat completion with GPT-3.5-turbo.
 
@@ -66,9 +154,11 @@ async def gpt3_5(prompt: str, api_key: Optional[str] = None, stream: bool = Fals
         api_key (Optional[str]): The API key for OpenAI. Defaults to None.
         stream (bool): Whether to stream the output. Defaults to False.
         language (Optional[str]): The language for the response. Defaults to "English".
+        cache (Optional[CompletionCache]): Cache consulted for non-streaming calls. Defaults to None.
+        coalesce (bool): Whether concurrent identical non-streaming calls share one request. Defaults to True.
 
     Returns:
         Optional[str]: The model's response if streaming is disabled, otherwise None.
     """
     client = GPT3_5TurboClient(api_key)
-    return await client.chat_completion(prompt, stream, language)
+    return await client.chat_completion(prompt, stream, language, cache, coalesce)
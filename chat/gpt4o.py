@@ -1,9 +1,23 @@
 import asyncio
 from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain.callbacks import AsyncIteratorCallbackHandler, StreamingStdOutCallbackHandler
 from typing import Optional, AsyncIterator, Union
 
+from .client_pool import get_client
+from .completion_cache import CompletionCache
+from .completion_runner import arun_completion
+from .instrumentation import ainstrument_call, ainstrument_stream
+from .rate_limiter import default_rate_limits
+
+STREAM_PROMPT_TEMPLATE = PromptTemplate(
+    template="Respond to the following prompt in {language}:\n\n{prompt}",
+    input_variables=["prompt", "language"]
+)
+
+PROMPT_TEMPLATE = PromptTemplate(
+    template="Please respond entirely in {language}. Here is the prompt: {prompt}",
+    input_variables=["prompt", "language"]
+)
+
 class GPT4ominiClient:
     """
     Provides asynchronous interaction with GPT-4o-mini for chat completions.
@@ -12,8 +26,14 @@ class GPT4ominiClient:
     Processing Logic:
         - Uses asyncio for managing asynchronous tasks.
         - Employs a PromptTemplate to format input before sending it to the model.
-        - Utilizes a callback handling mechanism to stream response tokens.
+        - Streams response tokens by iterating the chain's astream output.
         - Chains components using the pipe (|) operator to create a processing pipeline.
+        - ChatOpenAI clients are shared through the process-wide client registry.
+        - Non-streaming responses can be served from and stored in an opt-in CompletionCache.
+        - Concurrent identical non-streaming calls are coalesced into one upstream request unless disabled.
+        - Upstream calls wait for the "openai" rate limit of the API key when one is configured.
+        - Calls report queue time, time-to-first-token, latency and token throughput to any registered
+          instrumentation hooks; without hooks the timing code is skipped entirely.
     """
     def __init__(self, api_key: Optional[str] = None):
         """
@@ -23,7 +43,7 @@ class GPT4ominiClient:
         """
         self.api_key = api_key
 
-    async def chat_completion_stream(self, prompt: str, language: str = "English") -> AsyncIterator[str]:
+    def chat_completion_stream(self, prompt: str, language: str = "English") -> AsyncIterator[str]:
         """
         Generate a chat completion using the GPT-4o-mini model with streaming.
         Args:
@@ -32,51 +52,43 @@ class GPT4ominiClient:
         Returns:
             AsyncIterator[str]: An iterator yielding the tokens as they are received.
         """
-        prompt_template = PromptTemplate(
-            template="Respond to the following prompt in {language}:\n\n{prompt}",
-            input_variables=["prompt", "language"]
-        )
-        callback = AsyncIteratorCallbackHandler()
+        return ainstrument_stream("openai", "gpt-4o-mini", "chat_completion_stream", prompt,
+                                  self._chat_completion_stream(prompt, language))
 
-        llm = ChatOpenAI(
-            openai_api_key=self.api_key,
-            model="gpt-4o-mini",
-            streaming=True,
-            callbacks=[callback]
-        )
+    async def _chat_completion_stream(self, prompt: str, language: str) -> AsyncIterator[str]:
+        await default_rate_limits.aacquire("openai", self.api_key, prompt, "gpt-4o-mini")
+        llm = get_client("openai", "gpt-4o-mini", self.api_key, streaming=True, loop=asyncio.get_running_loop())
 
-        chain = prompt_template | llm
+        chain = STREAM_PROMPT_TEMPLATE | llm
         inputs = {"prompt": prompt, "language": language}
-        task = asyncio.create_task(chain.ainvoke(inputs))
-
-        async for token in callback.aiter():
-            yield token
-
-        await task
+        # Pulling from astream lets a slow consumer throttle reads and lets cancellation close the response
+        async for chunk in chain.astream(inputs):
+            if chunk.content:
+                yield chunk.content
 
-    async def chat_completion(self, prompt: str, language: Optional[str] = "English") -> str:
+    async def chat_completion(self, prompt: str, language: Optional[str] = "English",
+                              cache: Optional[CompletionCache] = None, coalesce: bool = True) -> str:
         """
         Generate a chat completion using the GPT-4o-mini model without streaming.
         Args:
             prompt (str): The prompt to send to the model.
             language (Optional[str]): The language for the response. Defaults to "English".
+            cache (Optional[CompletionCache]): Cache consulted before calling the model. Defaults to None.
+            coalesce (bool): Whether concurrent identical calls share one request. Defaults to True.
         Returns:
             str: The model's response.
         """
-        prompt_template = PromptTemplate(
-            template="Please respond entirely in {language}. Here is the prompt: {prompt}",
-            input_variables=["prompt", "language"]
-        )
+        llm = get_client("openai", "gpt-4o-mini", self.api_key, loop=asyncio.get_running_loop())
+        chain = PROMPT_TEMPLATE | llm
 
-        llm = ChatOpenAI(
-            openai_api_key=self.api_key,
-            model="gpt-4o-mini",
-            streaming=False
-        )
+        async def invoke() -> str:
+            response = await chain.ainvoke({"prompt": prompt, "language": language})
+            return response.content.strip()
 
-        chain = prompt_template | llm
-        response = await chain.ainvoke({"prompt": prompt, "language": language})
-        return response.content.strip()
+        return await ainstrument_call(
+            "openai", "gpt-4o-mini", "chat_completion", prompt,
+            lambda: arun_completion("gpt-4o-mini", prompt, language, self.api_key, invoke,
+                                    cache=cache, coalesce=coalesce, temperature=llm.temperature))
 
 async def stream_gpt4omini(prompt: str, api_key: Optional[str] = None, language: Optional[str] = "English") -> AsyncIterator[str]:
     """
@@ -92,15 +104,18 @@ async def stream_gpt4omini(prompt: str, api_key: Optional[str] = None, language:
     async for chunk in client.chat_completion_stream(prompt, language):
         yield chunk
 
-async def non_stream_gpt4omini(prompt: str, api_key: Optional[str] = None, language: Optional[str] = "English") -> str:
+async def non_stream_gpt4omini(prompt: str, api_key: Optional[str] = None, language: Optional[str] = "English",
+                               cache: Optional[CompletionCache] = None, coalesce: bool = True) -> str:
     """
     Asynchronous function to generate non-streaming chat completion with GPT-4o-mini.
     Args:
         prompt (str): The prompt to send to the model.
         api_key (Optional[str]): The API key for OpenAI. Defaults to None.
         language (Optional[str]): The language for the response. Defaults to "English".
+        cache (Optional[CompletionCache]): Cache consulted before calling the model. Defaults to None.
+        coalesce (bool): Whether concurrent identical calls share one request. Defaults to True.
     Returns:
         str: The model's response.
     """
     client = GPT4ominiClient(api_key)
-    return await client.chat_completion(prompt, language)
+    return await client.chat_completion(prompt, language, cache, coalesce)
@@ -1,7 +1,18 @@
 from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
 from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
-from typing import Optional
+from typing import Iterator, Optional
+
+from .client_pool import get_client
+from .completion_cache import CompletionCache
+from .completion_runner import run_completion
+from .instrumentation import instrument_call, instrument_stream
+from .rate_limiter import default_rate_limits
+
+# Modified template to include the language parameter
+PROMPT_TEMPLATE = PromptTemplate(
+    template="Please respond entirely in {language}. Here is the prompt: {prompt}",
+    input_variables=["prompt", "language"]
+)
 
 class GPT4ominiClient:
     """
@@ -12,6 +23,13 @@ class GPT4ominiClient:
         - Templates the prompt to include the request for response in the specified language.
         - Configures callbacks for streaming if enabled.
         - Invokes the chat model with the templated prompt and processes the response.
+        - The underlying ChatOpenAI client is shared through the process-wide client registry.
+        - stream_tokens yields tokens to the caller as they arrive instead of printing them.
+        - Non-streaming responses can be served from and stored in an opt-in CompletionCache.
+        - Concurrent identical non-streaming calls are coalesced into one upstream request unless disabled.
+        - Upstream calls wait for the "openai" rate limit of the API key when one is configured.
+        - Calls report queue time, time-to-first-token, latency and token throughput to any registered
+          instrumentation hooks; without hooks the timing code is skipped entirely.
     """
     def __init__(self, api_key: Optional[str] = None):
         """
@@ -22,7 +40,8 @@ class GPT4ominiClient:
         """
         self.api_key = api_key
 
-    def chat_completion(self, prompt: str, stream: bool = False, language: Optional[str] = "English") -> Optional[str]:
+    def chat_completion(self, prompt: str, stream: bool = False, language: Optional[str] = "English",
+                        cache: Optional[CompletionCache] = None, coalesce: bool = True) -> Optional[str]:
         """
         Generate a chat completion using the GPT-4o-mini model.
 
@@ -30,31 +49,53 @@ class GPT4ominiClient:
             prompt (str): The prompt to send to the model.
             stream (bool): Whether to stream the output. Defaults to False.
             language (Optional[str]): The language for the response. Defaults to "English".
+            cache (Optional[CompletionCache]): Cache consulted for non-streaming calls. Defaults to None.
+            coalesce (bool): Whether concurrent identical non-streaming calls share one request. Defaults to True.
 
         Returns:
             Optional[str]: The model's response if streaming is disabled, otherwise None.
         """
-        # Modified template to include the language parameter
-        prompt_template = PromptTemplate(
-            template="Please respond entirely in {language}. Here is the prompt: {prompt}",
-            input_variables=["prompt", "language"]
-        )
         callbacks = [StreamingStdOutCallbackHandler()] if stream else None
+        llm = get_client("openai", "gpt-4o-mini", self.api_key, streaming=stream)
+        result = PROMPT_TEMPLATE | llm
+
+        if stream:
+            def stream_to_stdout() -> None:
+                default_rate_limits.acquire("openai", self.api_key, prompt, "gpt-4o-mini")
+                result.invoke({"prompt": prompt, "language": language}, config={"callbacks": callbacks})
+
+            return instrument_call("openai", "gpt-4o-mini", "chat_completion", prompt, stream_to_stdout)
 
-        llm = ChatOpenAI(
-            openai_api_key=self.api_key,
-            model="gpt-4o-mini",
-            streaming=stream,
-            callbacks=callbacks
-        )
+        def invoke() -> str:
+            return result.invoke({"prompt": prompt, "language": language}).content.strip()
+
+        return instrument_call(
+            "openai", "gpt-4o-mini", "chat_completion", prompt,
+            lambda: run_completion("gpt-4o-mini", prompt, language, self.api_key, invoke,
+                                   cache=cache, coalesce=coalesce, temperature=llm.temperature))
+
+    def stream_tokens(self, prompt: str, language: Optional[str] = "English") -> Iterator[str]:
+        """
+        Stream a chat completion from the GPT-4o-mini model token by token.
 
-        result = prompt_template | llm
-        response = result.invoke({"prompt": prompt, "language": language})
+        Args:
+            prompt (str): The prompt to send to the model.
+            language (Optional[str]): The language for the response. Defaults to "English".
+
+        Returns:
+            Iterator[str]: An iterator yielding the tokens as they are received.
+        """
+        return instrument_stream("openai", "gpt-4o-mini", "stream_tokens", prompt, self._stream_tokens(prompt, language))
 
-        if not stream:
-            return response.content.strip()
+    def _stream_tokens(self, prompt: str, language: Optional[str]) -> Iterator[str]:
+        default_rate_limits.acquire("openai", self.api_key, prompt, "gpt-4o-mini")
+        llm = get_client("openai", "gpt-4o-mini", self.api_key, streaming=True)
+        for chunk in (PROMPT_TEMPLATE | llm).stream({"prompt": prompt, "language": language}):
+            if chunk.content:
+                yield chunk.content
 
-def gpt4omini(prompt: str, api_key: Optional[str] = None, stream: bool = False, language: Optional[str] = "English") -> Optional[str]:
+def gpt4omini(prompt: str, api_key: Optional[str] = None, stream: bool = False, language: Optional[str] = "English",
+              cache: Optional[CompletionCache] = None, coalesce: bool = True) -> Optional[str]:
     """
     Convenience function to generate chat completion with GPT-4o-mini.
 
@@ -63,9 +104,11 @@ def gpt4omini(prompt: str, api_key: Optional[str] = None, stream: bool = False,
         api_key (Optional[str]): The API key for OpenAI. Defaults to None.
         stream (bool): Whether to stream the output. Defaults to False.
         language (Optional[str]): The language for the response. Defaults to "English".
+        cache (Optional[CompletionCache]): Cache consulted for non-streaming calls. Defaults to None.
+        coalesce (bool): Whether concurrent identical non-streaming calls share one request. Defaults to True.
 
     Returns:
         Optional[str]: The model's response if streaming is disabled, otherwise None.
     """
     client = GPT4ominiClient(api_key)
-    return client.chat_completion(prompt, stream, language)
+    return client.chat_completion(prompt, stream, language, cache, coalesce)
@@ -0,0 +1,331 @@
+import math
+import os
+import re
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+KEYWORD_FILE = "keywords.npz"
+
+# Words, numbers and identifiers such as "SKU-00042", "12.5" or "v2/api"; compound tokens also index their parts
+_TOKEN = re.compile(r"\w+(?:[-./:]\w+)*")
+_PART = re.compile(r"[^\W_]+")
+
+Reranker = Callable[[str, List[Document]], List[float]]
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lower-case search terms.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        List[str]: The terms, with compound identifiers followed by their alphanumeric parts.
+    """
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        terms.append(token)
+        if not token.isalnum():
+            parts = _PART.findall(token)
+            if len(parts) > 1:
+                terms.extend(parts)
+    return terms
+
+
+class KeywordIndex:
+    """
+    BM25 inverted index over the chunks of a FAISS vectorstore, addressed by the same positions as the vectors.
+    Parameters:
+        - terms (List[str]): The vocabulary.
+        - indptr (np.ndarray): Start of each term's postings; term i owns postings[indptr[i]:indptr[i + 1]].
+        - postings (np.ndarray): Chunk positions, ascending within each term.
+        - freqs (np.ndarray): Term frequency of each posting.
+        - lengths (np.ndarray): Number of terms in each chunk.
+        - k1 (float): BM25 term frequency saturation. Defaults to 1.2.
+        - b (float): BM25 length normalization. Defaults to 0.75.
+    Processing Logic:
+        - Postings are stored as flat numpy arrays with their length-normalized weights precomputed, so a query
+          scores each of its terms with one vectorized multiply-add and the index saves and loads as one .npz file.
+        - Terms found in more than half of the chunks are skipped at query time.
+        - New chunks are merged into the arrays with one sort instead of re-tokenizing the existing ones.
+    """
+    def __init__(self, terms: List[str], indptr: np.ndarray, postings: np.ndarray, freqs: np.ndarray,
+                 lengths: np.ndarray, k1: float = 1.2, b: float = 0.75):
+        self.terms = list(terms)
+        self.vocabulary: Dict[str, int] = {term: i for i, term in enumerate(self.terms)}
+        self.indptr = indptr
+        self.postings = postings
+        self.freqs = freqs
+        self.lengths = lengths
+        self.k1 = k1
+        self.b = b
+        self.average_length = float(lengths.mean()) if len(lengths) else 0.0
+        # The length-normalized BM25 weight of every posting, so a query only multiplies by idf and adds
+        term_lengths = lengths[postings]
+        tf = freqs.astype(np.float32)
+        norm = k1 * (1.0 - b + b * term_lengths / max(self.average_length, 1.0))
+        self.weights = (tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+
+    @property
+    def size(self) -> int:
+        """The number of indexed chunks."""
+        return len(self.lengths)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the index."""
+        arrays = self.indptr.nbytes + self.postings.nbytes + self.freqs.nbytes + self.weights.nbytes + self.lengths.nbytes
+        return arrays + sum(len(term) + 100 for term in self.terms)
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "KeywordIndex":
+        """
+        Build an index over texts, numbered from 0 in order.
+
+        Args:
+            texts (Iterable[str]): The chunk texts.
+
+        Returns:
+            KeywordIndex: The index.
+        """
+        empty = np.zeros(0, dtype=np.int64)
+        return cls([], np.zeros(1, dtype=np.int64), empty.astype(np.int32), empty.astype(np.int32),
+                   empty.astype(np.int32)).extend(texts)
+
+    def extend(self, texts: Iterable[str]) -> "KeywordIndex":
+        """
+        Return a new index with texts appended at the next positions.
+
+        Args:
+            texts (Iterable[str]): The new chunk texts, in the order their vectors were added.
+
+        Returns:
+            KeywordIndex: The merged index; this one is left unchanged.
+        """
+        vocabulary = dict(self.vocabulary)
+        terms = list(self.terms)
+        new_terms, new_docs, new_freqs, lengths = [], [], [], []
+        for position, text in enumerate(texts, start=self.size):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, freq in counts.items():
+                index = vocabulary.get(term)
+                if index is None:
+                    index = vocabulary[term] = len(terms)
+                    terms.append(term)
+                new_terms.append(index)
+                new_docs.append(position)
+                new_freqs.append(freq)
+
+        old_terms = np.repeat(np.arange(len(self.terms), dtype=np.int64), np.diff(self.indptr))
+        term_ids = np.concatenate([old_terms, np.asarray(new_terms, dtype=np.int64)])
+        postings = np.concatenate([self.postings, np.asarray(new_docs, dtype=np.int32)])
+        freqs = np.concatenate([self.freqs, np.asarray(new_freqs, dtype=np.int32)])
+        # Existing postings come first and new positions are larger, so a stable sort by term keeps positions ascending
+        order = np.argsort(term_ids, kind="stable")
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(terms)), out=indptr[1:])
+        return KeywordIndex(terms, indptr, postings[order], freqs[order],
+                            np.concatenate([self.lengths, np.asarray(lengths, dtype=np.int32)]), self.k1, self.b)
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rank chunks by BM25 score.
+
+        Args:
+            query (str): The query text.
+            k (int): Maximum number of results.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Positions and scores of the best chunks, best first; only chunks
+                containing at least one query term are returned.
+        """
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            index = self.vocabulary.get(term)
+            if index is None:
+                continue
+            start, end = self.indptr[index], self.indptr[index + 1]
+            if 2 * (end - start) > self.size:
+                # Terms in most chunks, like "the" or "price", barely affect the ranking but cost the most to score
+                continue
+            idf = math.log(1.0 + (self.size - (end - start) + 0.5) / ((end - start) + 0.5))
+            # Each chunk appears once per term, so plain fancy-index addition is safe
+            scores[self.postings[start:end]] += idf * self.weights[start:end]
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return matched, scores[matched]
+
+    def save(self, folder: str) -> None:
+        """Write the index to folder/keywords.npz, replacing any previous file atomically."""
+        path = os.path.join(folder, KEYWORD_FILE)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, terms=np.asarray(self.terms, dtype=str), indptr=self.indptr, postings=self.postings,
+                     freqs=self.freqs, lengths=self.lengths)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, folder: str) -> Optional["KeywordIndex"]:
+        """Read folder/keywords.npz, or return None if it does not exist."""
+        path = os.path.join(folder, KEYWORD_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(data["terms"].tolist(), data["indptr"], data["postings"], data["freqs"], data["lengths"])
+
+
+def _texts(vectorstore: FAISS, start: int = 0) -> Iterable[str]:
+    for position in range(start, vectorstore.index.ntotal):
+        document = vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+        yield getattr(document, "page_content", "")
+
+
+def update_keyword_index(vectorstore: FAISS, folder: Optional[str] = None) -> KeywordIndex:
+    """
+    Bring the keyword index attached to a vectorstore up to date with its vectors, loading it from folder or
+    building it from the docstore as needed, and save it there if it changed.
+
+    Args:
+        vectorstore (FAISS): The vectorstore; the index is attached as vectorstore.keyword_index.
+        folder (Optional[str]): The save_local folder the index is read from and written to. Defaults to None.
+
+    Returns:
+        KeywordIndex: The index, covering every vector of the vectorstore.
+    """
+    keyword_index = getattr(vectorstore, "keyword_index", None)
+    if keyword_index is None and folder is not None:
+        keyword_index = KeywordIndex.load(folder)
+    ntotal = vectorstore.index.ntotal
+    if keyword_index is None or keyword_index.size > ntotal:
+        keyword_index = KeywordIndex.build(_texts(vectorstore))
+    elif keyword_index.size < ntotal:
+        keyword_index = keyword_index.extend(_texts(vectorstore, keyword_index.size))
+    else:
+        vectorstore.keyword_index = keyword_index
+        return keyword_index
+    if folder is not None and os.path.isdir(folder):
+        keyword_index.save(folder)
+    vectorstore.keyword_index = keyword_index
+    return keyword_index
+
+
+class TermOverlapReranker:
+    """
+    Local reranker that promotes candidates containing more of the query's terms, identifiers and numbers.
+    Parameters:
+        - identifier_weight (float): Weight of query terms containing a digit, e.g. SKUs and amounts. Defaults to 2.
+    Processing Logic:
+        - A candidate scores the weighted fraction of distinct query terms it contains; no model or network call
+          is involved, so reranking twenty candidates takes about a millisecond.
+    """
+    def __init__(self, identifier_weight: float = 2.0):
+        self.identifier_weight = identifier_weight
+
+    def __call__(self, query: str, documents: List[Document]) -> List[float]:
+        """
+        Score candidates for a query.
+
+        Args:
+            query (str): The query text.
+            documents (List[Document]): The candidates.
+
+        Returns:
+            List[float]: One score in [0, 1] per candidate.
+        """
+        weights = {term: self.identifier_weight if any(c.isdigit() for c in term) else 1.0
+                   for term in set(tokenize(query))}
+        total = sum(weights.values())
+        if not total:
+            return [0.0] * len(documents)
+        scores = []
+        for document in documents:
+            terms = set(tokenize(document.page_content))
+            scores.append(sum(weight for term, weight in weights.items() if term in terms) / total)
+        return scores
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever that fuses FAISS similarity search with BM25 keyword search by reciprocal rank.
+    Parameters:
+        - vectorstore (FAISS): The vectorstore searched by embedding.
+        - keyword_index (KeywordIndex): BM25 index over the same chunks, by vector position.
+        - k (int): Number of chunks returned. Defaults to 3.
+        - fetch_k (int): Candidates taken from each search before fusing. Defaults to 20.
+        - rrf_k (int): Reciprocal rank fusion constant; a chunk scores 1 / (rrf_k + rank) per list. Defaults to 60.
+        - reranker (Optional[Reranker]): Rescores the fused candidates, e.g. TermOverlapReranker(). Defaults to None.
+        - rerank_weight (float): Share of the final score taken from the reranker. Defaults to 0.5.
+    Processing Logic:
+        - Exact terms such as SKUs, names and numbers are found by BM25 even when their embedding is not close,
+          while paraphrases are still found by the vector search.
+        - Fusion uses ranks only, so the differently scaled BM25 and L2 scores need no calibration.
+        - Apart from embedding the query, retrieval is local and makes no LLM calls.
+    """
+    vectorstore: FAISS
+    keyword_index: KeywordIndex
+    k: int = 3
+    fetch_k: int = 20
+    rrf_k: int = 60
+    reranker: Optional[Reranker] = None
+    rerank_weight: float = 0.5
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def vector_search(self, query: str, embedding: Optional[List[float]] = None) -> np.ndarray:
+        """Return the positions of the fetch_k nearest chunks to the query embedding, computed unless given."""
+        if embedding is None:
+            embedding = self.vectorstore.embedding_function.embed_query(query)
+        embedding = np.asarray([embedding], dtype=np.float32)
+        if getattr(self.vectorstore, "_normalize_L2", False):
+            faiss.normalize_L2(embedding)
+        _, positions = self.vectorstore.index.search(embedding, self.fetch_k)
+        return positions[0][positions[0] >= 0]
+
+    def fuse(self, query: str, vector_positions: np.ndarray) -> List[Tuple[Document, float]]:
+        """
+        Combine vector hits with BM25 hits for a query and return the best chunks.
+
+        Args:
+            query (str): The query text.
+            vector_positions (np.ndarray): Vector search results, best first.
+
+        Returns:
+            List[Tuple[Document, float]]: Up to k chunks with their fused (or reranked) scores, best first.
+        """
+        keyword_positions, _ = self.keyword_index.search(query, self.fetch_k)
+        fused: Dict[int, float] = {}
+        for ranking in (vector_positions, keyword_positions):
+            for rank, position in enumerate(ranking.tolist()):
+                fused[position] = fused.get(position, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        candidates = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+        if self.reranker is None:
+            candidates = candidates[:self.k]
+        documents = [self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[position])
+                     for position, _ in candidates]
+        scores = [score for _, score in candidates]
+        if self.reranker is not None and documents:
+            best = scores[0]
+            reranked = self.reranker(query, documents)
+            scores = [(1 - self.rerank_weight) * score / best + self.rerank_weight * extra
+                      for score, extra in zip(scores, reranked)]
+        ranked = sorted(zip(documents, scores), key=lambda item: item[1], reverse=True)
+        return [(document, score) for document, score in ranked[:self.k] if isinstance(document, Document)]
+
+    def search(self, query: str, embedding: Optional[List[float]] = None) -> List[Tuple[Document, float]]:
+        """Return up to k chunks for a query with their scores, best first, embedding the query unless given."""
+        return self.fuse(query, self.vector_search(query, embedding))
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: Optional[CallbackManagerForRetrieverRun] = None) -> List[Document]:
+        return [document for document, _ in self.search(query)]
@@ -0,0 +1,217 @@
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import faiss
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from .single_flight import SingleFlight
+
+IndexKey = Tuple[str, str]
+
+_INDEX_FILES = ("index.faiss", "index.pkl")
+
+# Rewritten by save_vectorstore after both index files are swapped in
+VERSION_FILE = "index.version"
+
+
+def index_version(folder: str) -> Optional[str]:
+    """
+    Return a version token for a FAISS index saved with save_vectorstore or save_local, or None if there is no
+    index. The token changes whenever the index is rewritten, including by another process; for indexes saved
+    with save_vectorstore it changes only once both index files have been replaced.
+
+    Args:
+        folder (str): The folder the index was saved to.
+
+    Returns:
+        Optional[str]: The version token.
+    """
+    parts = []
+    for name in _INDEX_FILES:
+        try:
+            stat = os.stat(os.path.join(folder, name))
+        except FileNotFoundError:
+            return None
+        parts.append(f"{stat.st_mtime_ns:x}.{stat.st_size:x}")
+    try:
+        with open(os.path.join(folder, VERSION_FILE)) as f:
+            stamp = f.read().strip()
+    except FileNotFoundError:
+        stamp = ""
+    return stamp or "-".join(parts)
+
+
+def estimate_footprint(vectorstore: FAISS) -> int:
+    """
+    Estimate the resident size in bytes of a FAISS vectorstore: its encoded vectors, graph links, ids, document
+    texts and keyword index. Vectors of a memory-mapped index live in the shared page cache and are not counted.
+
+    Args:
+        vectorstore (FAISS): The vectorstore to measure.
+
+    Returns:
+        int: The estimated footprint in bytes.
+    """
+    index = faiss.downcast_index(vectorstore.index)
+    storage = faiss.downcast_index(index.storage) if getattr(index, "storage", None) is not None else index
+    code_size = getattr(storage, "code_size", None) or vectorstore.index.d * 4
+    size = vectorstore.index.ntotal * 8
+    if not getattr(vectorstore, "memory_mapped", False):
+        size += vectorstore.index.ntotal * code_size
+    if hasattr(index, "hnsw"):
+        # Layer 0 holds 2 * M neighbour ids per vector; upper layers add a few percent
+        size += vectorstore.index.ntotal * index.hnsw.nb_neighbors(0) * 4
+    for document in getattr(vectorstore.docstore, "_dict", {}).values():
+        size += len(getattr(document, "page_content", "")) + 200
+    keyword_index = getattr(vectorstore, "keyword_index", None)
+    if keyword_index is not None:
+        size += keyword_index.nbytes
+    return size
+
+
+class IndexCache:
+    """
+    Process-wide cache of loaded FAISS indexes shared by every ChatWithDoc instance.
+    Parameters:
+        - max_bytes (int): Upper bound on the estimated memory held by cached indexes. Defaults to 512 MiB.
+    Processing Logic:
+        - Entries are keyed by (user_id, index version), so a rewritten index is never served from a stale entry.
+        - Concurrent misses for the same key share one load instead of deserializing the index several times.
+        - Indexes are evicted least recently used first whenever the estimated total exceeds max_bytes; the
+          most recently used index is always kept, even if it alone is larger than the bound.
+        - Callers get a shallow copy bound to their own embeddings, so the loaded index and documents are shared
+          while each caller's queries are embedded with its own API key.
+        - Hits, misses, evictions and load times are exposed through stats().
+    """
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[IndexKey, Tuple[FAISS, int]]" = OrderedDict()
+        self._loads = SingleFlight()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.load_count = 0
+        self.load_time = 0.0
+        self.max_load_time = 0.0
+
+    def _bind(self, vectorstore: FAISS, embeddings: Optional[Embeddings]) -> FAISS:
+        if embeddings is None:
+            return vectorstore
+        bound = copy.copy(vectorstore)
+        bound.embedding_function = embeddings
+        return bound
+
+    def get(self, user_id: str, version: str, loader: Callable[[], FAISS],
+            embeddings: Optional[Embeddings] = None) -> FAISS:
+        """
+        Return the index for a user and version, loading it on a miss.
+
+        Args:
+            user_id (str): The index owner.
+            version (str): The index version, usually from index_version.
+            loader (Callable[[], FAISS]): Loads the index from storage on a miss.
+            embeddings (Optional[Embeddings]): Embeddings the returned vectorstore should query with. Defaults to
+                the ones it was loaded with.
+
+        Returns:
+            FAISS: The vectorstore.
+        """
+        key = (user_id, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._bind(entry[0], embeddings)
+            self.misses += 1
+
+        def load() -> FAISS:
+            started = time.perf_counter()
+            vectorstore = loader()
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.load_count += 1
+                self.load_time += elapsed
+                self.max_load_time = max(self.max_load_time, elapsed)
+            self.put(user_id, version, vectorstore)
+            return vectorstore
+
+        return self._bind(self._loads.do(f"{user_id}\0{version}", load), embeddings)
+
+    def put(self, user_id: str, version: str, vectorstore: FAISS) -> None:
+        """
+        Cache an index under a version and drop every other version held for the same user.
+
+        Args:
+            user_id (str): The index owner.
+            version (str): The index version.
+            vectorstore (FAISS): The loaded index.
+        """
+        size = estimate_footprint(vectorstore)
+        with self._lock:
+            self._drop_user_locked(user_id)
+            self._entries[(user_id, version)] = (vectorstore, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, user_id: str) -> int:
+        """
+        Drop every cached version of a user's index.
+
+        Args:
+            user_id (str): The index owner.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        with self._lock:
+            return self._drop_user_locked(user_id)
+
+    def _drop_user_locked(self, user_id: str) -> int:
+        stale = [key for key in self._entries if key[0] == user_id]
+        for key in stale:
+            self.total_bytes -= self._entries.pop(key)[1]
+        self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        """Remove every cached index."""
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return counters describing cache usage.
+
+        Returns:
+            Dict[str, Any]: Entry count, estimated bytes, hits, misses, hit rate, evictions, invalidations and load times.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "loads": self.load_count,
+                "avg_load_time": self.load_time / self.load_count if self.load_count else 0.0,
+                "max_load_time": self.max_load_time,
+            }
+
+
+default_index_cache = IndexCache()
@@ -0,0 +1,144 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from .embedding_cache import CachedEmbeddings, embedding_model_name
+from .rate_limiter import default_rate_limits, estimate_tokens
+from .resilience import RetryPolicy, call_with_retry
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionProgress(NamedTuple):
+    """Chunks indexed so far, the total when it is known, and the resulting rate and estimated seconds left."""
+    done: int
+    total: Optional[int]
+    elapsed: float
+    chunks_per_second: float
+    eta: Optional[float]
+
+
+class EmbeddingPipeline:
+    """
+    Embeds document chunks in batches on a bounded pool of workers and adds them to a FAISS index as they finish.
+    Parameters:
+        - batch_size (int): Maximum chunks per embedding request. Defaults to 128.
+        - max_batch_tokens (int): Maximum estimated tokens per embedding request. Defaults to 100000.
+        - concurrency (int): Maximum embedding requests in flight. Defaults to 4.
+        - provider (str): Rate limit bucket the requests are charged to. Defaults to "openai-embeddings".
+        - retry (Optional[RetryPolicy]): Retry policy for failed batches. Defaults to RetryPolicy().
+        - on_progress (Optional[Callable[[IngestionProgress], None]]): Called after every indexed batch. Defaults to None.
+    Processing Logic:
+        - Chunks are read lazily and cut into batches by count and estimated tokens, so at most 'concurrency'
+          batches are held in memory and a generator of chunks is never materialized.
+        - Every batch waits for the provider's rate limit before it is sent; configure it with
+          configure_rate_limit("openai-embeddings", rpm, tpm, expected_completion_tokens=0). With
+          CachedEmbeddings only the uncached chunks are charged, and a fully cached batch does not wait.
+        - Finished batches are added to the index on the calling thread in completion order, so the index is
+          never written concurrently and grows while later batches are still being embedded.
+        - Progress reports chunks per second and, when the number of chunks is known or estimated, the
+          remaining time.
+    """
+    def __init__(self, batch_size: int = 128, max_batch_tokens: int = 100000, concurrency: int = 4,
+                 provider: str = "openai-embeddings", retry: Optional[RetryPolicy] = None,
+                 on_progress: Optional[Callable[[IngestionProgress], None]] = None):
+        if batch_size < 1 or concurrency < 1:
+            raise ValueError("batch_size and concurrency must be at least 1.")
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.concurrency = concurrency
+        self.provider = provider
+        self.retry = retry or RetryPolicy()
+        self.on_progress = on_progress
+
+    def _batches(self, documents: Iterable[Document]) -> Iterator[List[Document]]:
+        batch: List[Document] = []
+        tokens = 0
+        for document in documents:
+            size = estimate_tokens(document.page_content)
+            if batch and (len(batch) >= self.batch_size or tokens + size > self.max_batch_tokens):
+                yield batch
+                batch, tokens = [], 0
+            batch.append(document)
+            tokens += size
+        if batch:
+            yield batch
+
+    def _embed(self, embeddings: Embeddings, batch: List[Document],
+               api_key: Optional[str]) -> Tuple[List[Document], List[List[float]]]:
+        texts = [document.page_content for document in batch]
+
+        def call() -> List[List[float]]:
+            if isinstance(embeddings, CachedEmbeddings):
+                return embeddings.embed_documents(texts, rate_limit=(self.provider, api_key))
+            default_rate_limits.acquire(self.provider, api_key, "\n".join(texts), embedding_model_name(embeddings))
+            return embeddings.embed_documents(texts)
+
+        return batch, call_with_retry(call, self.retry)
+
+    def run(self, embeddings: Embeddings, documents: Iterable[Document], vectorstore: Optional[FAISS] = None,
+            api_key: Optional[str] = None,
+            total: Union[int, Callable[[], Optional[int]], None] = None) -> Optional[FAISS]:
+        """
+        Embed documents and add them to a vectorstore, creating it from the first batch if needed.
+
+        Args:
+            embeddings (Embeddings): The embedding model; also attached to a newly created vectorstore.
+            documents (Iterable[Document]): The chunks to index, e.g. a list or a generator.
+            vectorstore (Optional[FAISS]): The index to extend. Defaults to None, which creates one.
+            api_key (Optional[str]): Key the rate limit is charged to. Defaults to None.
+            total (Union[int, Callable[[], Optional[int]], None]): Number of chunks, for the ETA, or a callable
+                returning the current estimate of it, asked again at every progress update. Defaults to
+                len(documents) when available.
+
+        Returns:
+            Optional[FAISS]: The updated vectorstore, or None if no documents were given and none was passed in.
+        """
+        if total is None and hasattr(documents, "__len__"):
+            total = len(documents)
+        started = time.perf_counter()
+        done = 0
+
+        def collect(finished: Set[Future]) -> None:
+            nonlocal vectorstore, done
+            for future in finished:
+                batch, vectors = future.result()
+                text_embeddings = [(document.page_content, vector) for document, vector in zip(batch, vectors)]
+                metadatas = [document.metadata for document in batch]
+                if vectorstore is None:
+                    vectorstore = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas)
+                else:
+                    vectorstore.add_embeddings(text_embeddings, metadatas=metadatas)
+                done += len(batch)
+                elapsed = time.perf_counter() - started
+                rate = done / elapsed if elapsed > 0 else 0.0
+                expected = total() if callable(total) else total
+                if expected is not None:
+                    # An estimate can fall behind the chunks already indexed
+                    expected = max(expected, done)
+                eta = (expected - done) / rate if expected is not None and rate > 0 else None
+                progress = IngestionProgress(done, expected, elapsed, rate, eta)
+                logger.debug("Indexed %d/%s chunks (%.1f chunks/s)", done, expected, rate)
+                if self.on_progress is not None:
+                    self.on_progress(progress)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed") as executor:
+            pending: Set[Future] = set()
+            try:
+                for batch in self._batches(documents):
+                    if len(pending) >= self.concurrency:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(finished)
+                    pending.add(executor.submit(self._embed, embeddings, batch, api_key))
+                while pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+            finally:
+                for future in pending:
+                    future.cancel()
+        return vectorstore
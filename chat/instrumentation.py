@@ -0,0 +1,381 @@
+import threading
+import time
+from contextvars import ContextVar
+from typing import (Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence,
+                    Tuple, TypeVar)
+
+T = TypeVar("T")
+
+
+class CallEvent(NamedTuple):
+    """
+    Timing and token counts for one chat call, in seconds and tokens.
+    'queue_time' is time spent waiting for a rate limit, 'time_to_first_token' equals 'latency' for
+    non-streaming calls, and 'tokens_per_second' is output tokens over the time after the queue.
+    Token counts come from provider usage when reported and are tiktoken estimates otherwise.
+    """
+    provider: str
+    model: str
+    method: str
+    queue_time: float
+    time_to_first_token: Optional[float]
+    latency: float
+    tokens_in: int
+    tokens_out: int
+    tokens_per_second: float
+    error: Optional[str] = None
+
+
+_hooks: List[Callable[[CallEvent], None]] = []
+_active: ContextVar[Optional["_CallRecord"]] = ContextVar("chat_instrumentation_call", default=None)
+
+
+def add_hook(hook: Callable[[CallEvent], None]) -> None:
+    """
+    Register a callback that receives a CallEvent after every instrumented chat call.
+
+    Args:
+        hook (Callable[[CallEvent], None]): The callback; it runs on the calling thread and should be fast.
+    """
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[CallEvent], None]) -> None:
+    """Unregister a callback added with add_hook."""
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def note_queue_time(seconds: float) -> None:
+    """Add rate-limit wait time to the call being instrumented in this context, if any."""
+    record = _active.get()
+    if record is not None:
+        record.queue_time += seconds
+
+
+def note_usage(prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+    """Record provider-reported token usage for the call being instrumented in this context, if any."""
+    record = _active.get()
+    if record is not None:
+        record.usage = (prompt_tokens, completion_tokens)
+
+
+class _CallRecord:
+    def __init__(self, provider: str, model: str, method: str, prompt: str):
+        self.provider = provider
+        self.model = model
+        self.method = method
+        self.prompt = prompt
+        self.started = time.perf_counter()
+        self.queue_time = 0.0
+        self.first_token: Optional[float] = None
+        self.usage: Tuple[Optional[int], Optional[int]] = (None, None)
+
+    def emit(self, output: Optional[str], error: Optional[BaseException] = None) -> None:
+        # Imported here because the rate limiter reports queue time to this module
+        from .rate_limiter import estimate_tokens
+        latency = time.perf_counter() - self.started
+        prompt_tokens, completion_tokens = self.usage
+        tokens_in = prompt_tokens if prompt_tokens is not None else estimate_tokens(self.prompt, self.model)
+        tokens_out = completion_tokens if completion_tokens is not None else (
+            estimate_tokens(output, self.model) if output else 0)
+        active = latency - self.queue_time
+        event = CallEvent(
+            self.provider, self.model, self.method, self.queue_time,
+            self.first_token - self.started if self.first_token is not None else (None if error else latency),
+            latency, tokens_in, tokens_out, tokens_out / active if active > 0 else 0.0,
+            None if error is None else type(error).__name__,
+        )
+        for hook in list(_hooks):
+            hook(event)
+
+
+def instrument_call(provider: str, model: str, method: str, prompt: str, fn: Callable[[], T]) -> T:
+    """
+    Run a non-streaming call, reporting a CallEvent to the registered hooks.
+
+    Args:
+        provider (str): The provider name.
+        model (str): The model name.
+        method (str): The client method, used as a label.
+        prompt (str): The prompt, used to estimate input tokens.
+        fn (Callable[[], T]): The call; its string result is used to estimate output tokens.
+
+    Returns:
+        T: The result of fn.
+    """
+    if not _hooks:
+        return fn()
+    record = _CallRecord(provider, model, method, prompt)
+    token = _active.set(record)
+    try:
+        result = fn()
+    except BaseException as e:
+        record.emit(None, e)
+        raise
+    finally:
+        _active.reset(token)
+    record.emit(result if isinstance(result, str) else None)
+    return result
+
+
+async def ainstrument_call(provider: str, model: str, method: str, prompt: str, fn: Callable[[], Awaitable[T]]) -> T:
+    """Asynchronous variant of instrument_call; fn is a factory for the coroutine to await."""
+    if not _hooks:
+        return await fn()
+    record = _CallRecord(provider, model, method, prompt)
+    token = _active.set(record)
+    try:
+        result = await fn()
+    except BaseException as e:
+        record.emit(None, e)
+        raise
+    finally:
+        _active.reset(token)
+    record.emit(result if isinstance(result, str) else None)
+    return result
+
+
+def instrument_stream(provider: str, model: str, method: str, prompt: str, tokens: Iterator[str]) -> Iterator[str]:
+    """
+    Wrap a token stream, reporting time-to-first-token and throughput to the registered hooks.
+
+    Args:
+        provider (str): The provider name.
+        model (str): The model name.
+        method (str): The client method, used as a label.
+        prompt (str): The prompt, used to estimate input tokens.
+        tokens (Iterator[str]): The stream to wrap; it is returned unchanged when no hooks are registered.
+
+    Returns:
+        Iterator[str]: The tokens of the wrapped stream.
+    """
+    if not _hooks:
+        return tokens
+    return _instrumented_stream(_CallRecord(provider, model, method, prompt), tokens)
+
+
+def _instrumented_stream(record: _CallRecord, tokens: Iterator[str]) -> Iterator[str]:
+    parts = []
+    error: Optional[BaseException] = None
+    try:
+        while True:
+            # The rate-limit wait happens on the first pull, so the record is only active around it
+            token = _active.set(record) if record.first_token is None else None
+            try:
+                part = next(tokens)
+            except StopIteration:
+                return
+            finally:
+                if token is not None:
+                    _active.reset(token)
+            if record.first_token is None:
+                record.first_token = time.perf_counter()
+            parts.append(part)
+            yield part
+    except BaseException as e:
+        error = None if isinstance(e, GeneratorExit) else e
+        raise
+    finally:
+        close = getattr(tokens, "close", None)
+        if close is not None:
+            close()
+        record.emit("".join(parts), error)
+
+
+def ainstrument_stream(provider: str, model: str, method: str, prompt: str, tokens: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Asynchronous variant of instrument_stream."""
+    if not _hooks:
+        return tokens
+    return _ainstrumented_stream(_CallRecord(provider, model, method, prompt), tokens)
+
+
+async def _ainstrumented_stream(record: _CallRecord, tokens: AsyncIterator[str]) -> AsyncIterator[str]:
+    parts = []
+    error: Optional[BaseException] = None
+    try:
+        while True:
+            token = _active.set(record) if record.first_token is None else None
+            try:
+                part = await tokens.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                if token is not None:
+                    _active.reset(token)
+            if record.first_token is None:
+                record.first_token = time.perf_counter()
+            parts.append(part)
+            yield part
+    except BaseException as e:
+        error = None if isinstance(e, GeneratorExit) else e
+        raise
+    finally:
+        aclose = getattr(tokens, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        record.emit("".join(parts), error)
+
+
+LATENCY_BUCKETS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+THROUGHPUT_BUCKETS: Tuple[float, ...] = (1.0, 5.0, 10.0, 25.0, 50.0, 100.0, 200.0, 500.0)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus style.
+    Parameters:
+        - buckets (Sequence[float]): Upper bounds of the buckets in increasing order; +Inf is implied.
+    """
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Add one observation."""
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[position] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile as the upper bound of the bucket it falls in; None when empty."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for position, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[position] if position < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+class InMemoryMetrics:
+    """
+    Metrics sink that aggregates CallEvents into histograms and counters per provider, model and method.
+    Processing Logic:
+        - Queue time, time-to-first-token and latency go into latency histograms; tokens/sec into a throughput histogram.
+        - Calls, errors and input/output tokens are counted.
+        - snapshot() returns plain numbers for dashboards and to_prometheus() renders the text exposition format.
+    """
+    _HISTOGRAMS = (
+        ("queue_time", "chat_queue_seconds", "Time spent waiting for a rate limit.", LATENCY_BUCKETS),
+        ("time_to_first_token", "chat_time_to_first_token_seconds", "Time until the first token arrived.", LATENCY_BUCKETS),
+        ("latency", "chat_latency_seconds", "Total call latency.", LATENCY_BUCKETS),
+        ("tokens_per_second", "chat_tokens_per_second", "Output tokens per second after queueing.", THROUGHPUT_BUCKETS),
+    )
+    _COUNTERS = (
+        ("calls", "chat_calls_total", "Chat calls made."),
+        ("errors", "chat_errors_total", "Chat calls that raised an error."),
+        ("tokens_in", "chat_tokens_in_total", "Prompt tokens sent."),
+        ("tokens_out", "chat_tokens_out_total", "Completion tokens received."),
+    )
+
+    def __init__(self):
+        self._series: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event: CallEvent) -> None:
+        labels = (event.provider, event.model, event.method)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {
+                    **{field: Histogram(buckets) for field, _, _, buckets in self._HISTOGRAMS},
+                    **{field: 0 for field, _, _ in self._COUNTERS},
+                }
+            for field, _, _, _ in self._HISTOGRAMS:
+                value = getattr(event, field)
+                if value is not None:
+                    series[field].observe(value)
+            series["calls"] += 1
+            series["errors"] += event.error is not None
+            series["tokens_in"] += event.tokens_in
+            series["tokens_out"] += event.tokens_out
+
+    def reset(self) -> None:
+        """Forget every recorded series."""
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Return the aggregated metrics.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Keyed by "provider/model/method"; counters plus count, mean, p50 and p95 per histogram.
+        """
+        with self._lock:
+            snapshot = {}
+            for labels, series in self._series.items():
+                entry: Dict[str, Any] = {field: series[field] for field, _, _ in self._COUNTERS}
+                for field, _, _, _ in self._HISTOGRAMS:
+                    histogram = series[field]
+                    entry[field] = {
+                        "count": histogram.count,
+                        "mean": histogram.sum / histogram.count if histogram.count else None,
+                        "p50": histogram.quantile(0.5),
+                        "p95": histogram.quantile(0.95),
+                    }
+                snapshot["/".join(labels)] = entry
+            return snapshot
+
+    def to_prometheus(self) -> str:
+        """
+        Render the metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition text, ending with a newline.
+        """
+        lines: List[str] = []
+        with self._lock:
+            series = sorted(self._series.items())
+            for field, name, help_text, buckets in self._HISTOGRAMS:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for labels, values in series:
+                    label_text = _label_text(labels)
+                    histogram = values[field]
+                    cumulative = 0
+                    for bound, count in zip(list(buckets) + ["+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                    lines.append(f"{name}_sum{{{label_text}}} {histogram.sum}")
+                    lines.append(f"{name}_count{{{label_text}}} {histogram.count}")
+            for field, name, help_text in self._COUNTERS:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for labels, values in series:
+                    lines.append(f"{name}{{{_label_text(labels)}}} {values[field]}")
+        return "\n".join(lines) + "\n"
+
+
+def _label_text(labels: Tuple[str, str, str]) -> str:
+    escaped = [value.replace("\\", "\\\\").replace('"', '\\"') for value in labels]
+    return 'provider="{}",model="{}",method="{}"'.format(*escaped)
+
+
+def enable_instrumentation(sink: Optional[Callable[[CallEvent], None]] = None) -> Callable[[CallEvent], None]:
+    """
+    Start instrumenting chat calls.
+
+    Args:
+        sink (Optional[Callable[[CallEvent], None]]): Callback or metrics sink; a new InMemoryMetrics when None.
+
+    Returns:
+        Callable[[CallEvent], None]: The registered sink.
+    """
+    sink = sink if sink is not None else InMemoryMetrics()
+    add_hook(sink)
+    return sink
+
+
+def disable_instrumentation() -> None:
+    """Remove every hook, returning chat calls to the uninstrumented fast path."""
+    _hooks.clear()
@@ -1,6 +1,30 @@
+import asyncio
 import os
-from together import Together
-from typing import Optional, List
+from typing import AsyncIterator, Dict, Iterator, NamedTuple, Optional, List
+
+from .client_pool import get_client
+from .completion_cache import CompletionCache
+from .completion_runner import arun_completion, run_completion
+from .instrumentation import (ainstrument_call, ainstrument_stream, instrument_call, instrument_stream,
+                              note_usage)
+from .rate_limiter import default_rate_limits
+
+
+class Llama3Result(NamedTuple):
+    """A Llama-3 completion together with the token usage reported by Together."""
+    content: Optional[str]
+    usage: Dict[str, int]
+
+
+def _usage_dict(usage) -> Dict[str, int]:
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "completion_tokens": usage.completion_tokens or 0,
+        "total_tokens": usage.total_tokens or 0,
+    }
+
 
 class Llama3Client:
     """
@@ -12,6 +36,15 @@ class Llama3Client:
         - Adjusts the prompt to include the requested language if it's other than English.
         - Handles streaming and non-streaming modes based on the stream parameter.
         - Collects streaming responses into a single string if streaming is enabled.
+        - stream_tokens/astream_tokens yield tokens as they arrive instead of printing them; astream_tokens
+          delegates to AsyncLlama3Client so it never ties up a thread.
+        - Non-streaming responses can be served from and stored in an opt-in CompletionCache.
+        - Concurrent identical non-streaming calls are coalesced into one upstream request unless disabled.
+        - The Together client is shared through the process-wide client registry.
+        - Errors are raised to the caller rather than printed, so callers can retry or fall back to another model.
+        - Calls report queue time, time-to-first-token, latency and token throughput to any registered
+          instrumentation hooks; without hooks the timing code is skipped entirely.
+        - Upstream calls wait for the "together" rate limit of the API key when one is configured.
     """
     def __init__(self, api_key: Optional[str] = None):
         """
@@ -23,9 +56,63 @@ class Llama3Client:
         self.api_key = api_key or os.environ.get("TOGETHER_API_KEY")
         if not self.api_key:
             raise ValueError("API key is required for Together API.")
-        self.client = Together(api_key=self.api_key)
+        self.client = get_client("together", "meta-llama/Llama-3-70b-chat-hf", self.api_key)
+
+    @staticmethod
+    def _localize(prompt: str, language: Optional[str]) -> str:
+        # Adjust the prompt for the specified language if needed
+        # (Assuming Llama-3 supports language parameter or prompt adjustment)
+        if language and language != "English":
+            return f"Please respond in {language}: {prompt}"
+        return prompt
+
+    def stream_tokens(self, prompt: str, language: Optional[str] = "English") -> Iterator[str]:
+        """
+        Stream a response from the Llama-3 model token by token.
+
+        Args:
+            prompt (str): The prompt to send to the model.
+            language (Optional[str]): The language for the response. Defaults to "English".
+
+        Returns:
+            Iterator[str]: An iterator yielding the tokens as they are received.
+        """
+        return instrument_stream("together", "meta-llama/Llama-3-70b-chat-hf", "stream_tokens", prompt,
+                                 self._stream_tokens(prompt, language))
+
+    def _stream_tokens(self, prompt: str, language: Optional[str]) -> Iterator[str]:
+        default_rate_limits.acquire("together", self.api_key, prompt, "meta-llama/Llama-3-70b-chat-hf")
+        stream_response = self.client.chat.completions.create(
+            model="meta-llama/Llama-3-70b-chat-hf",
+            messages=[{"role": "user", "content": self._localize(prompt, language)}],
+            stream=True
+        )
+        try:
+            for chunk in stream_response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Release the connection if the consumer stops early
+            close = getattr(stream_response, "close", None)
+            if close is not None:
+                close()
+
+    async def astream_tokens(self, prompt: str, language: Optional[str] = "English") -> AsyncIterator[str]:
+        """
+        Asynchronously stream a response from the Llama-3 model token by token.
+
+        Args:
+            prompt (str): The prompt to send to the model.
+            language (Optional[str]): The language for the response. Defaults to "English".
 
-    def get_response(self, prompt: str, stream: bool = False, language: Optional[str] = "English") -> Optional[str]:
+        Returns:
+            AsyncIterator[str]: An iterator yielding the tokens as they are received.
+        """
+        async for token in AsyncLlama3Client(self.api_key).chat_completion_stream(prompt, language):
+            yield token
+
+    def get_response(self, prompt: str, stream: bool = False, language: Optional[str] = "English",
+                     cache: Optional[CompletionCache] = None, coalesce: bool = True) -> Optional[str]:
         """
         Generate a response using the Llama-3 model with optional language support.
 
@@ -33,49 +120,138 @@ class Llama3Client:
             prompt (str): The prompt to send to the model.
             stream (bool): Whether to stream the output. Defaults to False.
             language (Optional[str]): The language for the response. Defaults to "English".
+            cache (Optional[CompletionCache]): Cache consulted for non-streaming calls. Defaults to None.
+            coalesce (bool): Whether concurrent identical non-streaming calls share one request. Defaults to True.
 
         Returns:
             Optional[str]: The model's response if streaming is disabled, otherwise the collected stream.
         """
-        # Adjust the prompt for the specified language if needed
-        # (Assuming Llama-3 supports language parameter or prompt adjustment)
-        if language and language != "English":
-            prompt = f"Please respond in {language}: {prompt}"
-
         if stream:
-            # Streaming mode
-            try:
-                stream_response = self.client.chat.completions.create(
-                    model="meta-llama/Llama-3-70b-chat-hf",
-                    messages=[{"role": "user", "content": prompt}],
-                    stream=True
-                )
-
-                # Collect the stream response chunks
-                collected_response = []
-                for chunk in stream_response:
-                    content = chunk.choices[0].delta.content or ""
-                    print(content, end="", flush=True)
-                    collected_response.append(content)
-
-                # Return the full collected response
-                return ''.join(collected_response)
-            except Exception as e:
-                print(f"Error occurred during streaming: {e}")
-                return None
+            # Streaming mode: collect the stream response chunks and return the full response
+            return ''.join(self.stream_tokens(prompt, language))
         else:
             # Non-streaming mode
-            try:
+            def invoke() -> Optional[str]:
                 response = self.client.chat.completions.create(
                     model="meta-llama/Llama-3-70b-chat-hf",
-                    messages=[{"role": "user", "content": prompt}]
+                    messages=[{"role": "user", "content": self._localize(prompt, language)}]
                 )
+                if response.usage is not None:
+                    note_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
                 return response.choices[0].message.content
-            except Exception as e:
-                print(f"Error occurred during non-streaming response: {e}")
-                return None
 
-def llama3(prompt: str, api_key: Optional[str] = None, stream: bool = False, language: Optional[str] = "English") -> Optional[str]:
+            return instrument_call(
+                "together", "meta-llama/Llama-3-70b-chat-hf", "get_response", prompt,
+                lambda: run_completion("meta-llama/Llama-3-70b-chat-hf", prompt, language, self.api_key, invoke,
+                                       cache=cache, coalesce=coalesce, provider="together"))
+
+class AsyncLlama3Client:
+    """
+    Asynchronous client for the Llama-3 model built on Together's async client.
+    Parameters:
+        - api_key (Optional[str]): The API key used to authenticate with the Together API.
+    Processing Logic:
+        - Throws an error if an API key is not provided either directly or through environment variables.
+        - One AsyncTogether client per event loop is shared through the process-wide client registry.
+        - Streams tokens through an async iterator, so llama3 can join asyncio fan-outs without a thread per request.
+        - Token usage from the last completed call is kept in 'usage'; complete() also returns it alongside the text.
+        - Errors are raised to the caller rather than printed.
+        - Upstream calls wait for the "together" rate limit of the API key when one is configured.
+        - Calls are reported to any registered instrumentation hooks, using Together's token usage when available.
+    """
+    def __init__(self, api_key: Optional[str] = None):
+        """
+        Initialize the AsyncLlama3Client with an optional API key.
+
+        Args:
+            api_key (Optional[str]): The API key for Together API. Defaults to environment variable 'TOGETHER_API_KEY'.
+        """
+        self.api_key = api_key or os.environ.get("TOGETHER_API_KEY")
+        if not self.api_key:
+            raise ValueError("API key is required for Together API.")
+        self.usage: Dict[str, int] = {}
+
+    def _client(self):
+        return get_client("together-async", "meta-llama/Llama-3-70b-chat-hf", self.api_key,
+                          loop=asyncio.get_running_loop())
+
+    async def complete(self, prompt: str, language: Optional[str] = "English") -> Llama3Result:
+        """
+        Generate a response and return it with its token usage.
+
+        Args:
+            prompt (str): The prompt to send to the model.
+            language (Optional[str]): The language for the response. Defaults to "English".
+
+        Returns:
+            Llama3Result: The model's response and the usage reported for the call.
+        """
+        response = await self._client().chat.completions.create(
+            model="meta-llama/Llama-3-70b-chat-hf",
+            messages=[{"role": "user", "content": Llama3Client._localize(prompt, language)}]
+        )
+        self.usage = _usage_dict(response.usage)
+        if self.usage:
+            note_usage(self.usage["prompt_tokens"], self.usage["completion_tokens"])
+        return Llama3Result(response.choices[0].message.content, self.usage)
+
+    async def chat_completion(self, prompt: str, language: Optional[str] = "English",
+                              cache: Optional[CompletionCache] = None, coalesce: bool = True) -> Optional[str]:
+        """
+        Generate a response without streaming.
+
+        Args:
+            prompt (str): The prompt to send to the model.
+            language (Optional[str]): The language for the response. Defaults to "English".
+            cache (Optional[CompletionCache]): Cache consulted before calling the model. Defaults to None.
+            coalesce (bool): Whether concurrent identical calls share one request. Defaults to True.
+
+        Returns:
+            Optional[str]: The model's response.
+        """
+        async def invoke() -> Optional[str]:
+            return (await self.complete(prompt, language)).content
+
+        return await ainstrument_call(
+            "together", "meta-llama/Llama-3-70b-chat-hf", "chat_completion", prompt,
+            lambda: arun_completion("meta-llama/Llama-3-70b-chat-hf", prompt, language, self.api_key, invoke,
+                                    cache=cache, coalesce=coalesce, provider="together"))
+
+    def chat_completion_stream(self, prompt: str, language: Optional[str] = "English") -> AsyncIterator[str]:
+        """
+        Stream a response token by token; 'usage' is filled in once the stream finishes.
+
+        Args:
+            prompt (str): The prompt to send to the model.
+            language (Optional[str]): The language for the response. Defaults to "English".
+
+        Returns:
+            AsyncIterator[str]: An iterator yielding the tokens as they are received.
+        """
+        return ainstrument_stream("together", "meta-llama/Llama-3-70b-chat-hf", "chat_completion_stream", prompt,
+                                  self._chat_completion_stream(prompt, language))
+
+    async def _chat_completion_stream(self, prompt: str, language: Optional[str]) -> AsyncIterator[str]:
+        await default_rate_limits.aacquire("together", self.api_key, prompt, "meta-llama/Llama-3-70b-chat-hf")
+        stream_response = await self._client().chat.completions.create(
+            model="meta-llama/Llama-3-70b-chat-hf",
+            messages=[{"role": "user", "content": Llama3Client._localize(prompt, language)}],
+            stream=True
+        )
+        try:
+            async for chunk in stream_response:
+                if getattr(chunk, "usage", None) is not None:
+                    self.usage = _usage_dict(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Release the connection if the consumer stops early or is cancelled
+            close = getattr(stream_response, "close", None)
+            if close is not None:
+                await close()
+
+def llama3(prompt: str, api_key: Optional[str] = None, stream: bool = False, language: Optional[str] = "English",
+           cache: Optional[CompletionCache] = None, coalesce: bool = True) -> Optional[str]:
     """
     Convenience function to generate a response using the Llama-3 model with optional language support.
 
@@ -84,9 +260,45 @@ def llama3(prompt: str, api_key: Optional[str] = None, stream: bool = False, lan
         api_key (Optional[str]): The API key for Together API. Defaults to None.
         stream (bool): Whether to stream the output. Defaults to False.
         language (Optional[str]): The language for the response. Defaults to "English".
+        cache (Optional[CompletionCache]): Cache consulted for non-streaming calls. Defaults to None.
+        coalesce (bool): Whether concurrent identical non-streaming calls share one request. Defaults to True.
 
     Returns:
         Optional[str]: The model's response if streaming is disabled, or the collected stream if enabled.
     """
     client = Llama3Client(api_key)
-    return client.get_response(prompt, stream, language)
+    return client.get_response(prompt, stream, language, cache, coalesce)
+
+async def stream_llama3(prompt: str, api_key: Optional[str] = None, language: Optional[str] = "English") -> AsyncIterator[str]:
+    """
+    Asynchronous function to stream a response from the Llama-3 model.
+
+    Args:
+        prompt (str): The prompt to send to the model.
+        api_key (Optional[str]): The API key for Together API. Defaults to None.
+        language (Optional[str]): The language for the response. Defaults to "English".
+
+    Returns:
+        AsyncIterator[str]: An iterator yielding the tokens as they are received.
+    """
+    client = AsyncLlama3Client(api_key)
+    async for token in client.chat_completion_stream(prompt, language):
+        yield token
+
+async def non_stream_llama3(prompt: str, api_key: Optional[str] = None, language: Optional[str] = "English",
+                            cache: Optional[CompletionCache] = None, coalesce: bool = True) -> Optional[str]:
+    """
+    Asynchronous function to generate a non-streaming response from the Llama-3 model.
+
+    Args:
+        prompt (str): The prompt to send to the model.
+        api_key (Optional[str]): The API key for Together API. Defaults to None.
+        language (Optional[str]): The language for the response. Defaults to "English".
+        cache (Optional[CompletionCache]): Cache consulted before calling the model. Defaults to None.
+        coalesce (bool): Whether concurrent identical calls share one request. Defaults to True.
+
+    Returns:
+        Optional[str]: The model's response.
+    """
+    client = AsyncLlama3Client(api_key)
+    return await client.chat_completion(prompt, language, cache, coalesce)
@@ -0,0 +1,329 @@
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+from .rate_limiter import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class StoredMessage(NamedTuple):
+    """A stored message with its position in the log and its token count, measured once when appended."""
+    id: int
+    message: BaseMessage
+    tokens: int
+
+
+def legacy_memory_path(user_id: str) -> str:
+    """Return the pickle file earlier versions rewrote after every question."""
+    return f"{user_id}_memory.pkl"
+
+
+_INSERT = "INSERT INTO messages (user_id, message, created_at, tokens) VALUES (?, ?, ?, ?)"
+
+
+class ConversationStore:
+    """
+    Append-only SQLite store of conversation messages for every user.
+    Parameters:
+        - path (Optional[str]): SQLite file holding the messages; None keeps them in memory only. Defaults to None.
+        - window (Optional[int]): Most recent messages a history loads; None loads them all. Defaults to 50.
+        - busy_timeout (float): Seconds a writer waits for another process's lock before failing. Defaults to 30.
+    Processing Logic:
+        - A turn is one INSERT transaction of its messages, so saving costs the same however long the history is.
+        - Writers in the same process share one connection behind a lock; writers in other processes are
+          serialized by SQLite's own locking in WAL mode, so concurrent requests for a user never corrupt it.
+        - Histories read only the most recent 'window' messages through the (user_id, id) index, on demand.
+        - Token counts are measured once per message when it is appended, and each user can keep a rolling
+          summary of the log up to a given message for RollingSummaryMemory.
+        - A user's legacy <user_id>_memory.pkl is imported the first time their history is opened and renamed
+          to <user_id>_memory.pkl.migrated.
+        - The database is opened on first use, so constructing a store never touches the disk.
+    """
+    def __init__(self, path: Optional[str] = None, window: Optional[int] = 50, busy_timeout: float = 30.0):
+        if window is not None and window < 1:
+            raise ValueError("window must be at least 1 or None.")
+        self.path = path
+        self.window = window
+        self.busy_timeout = busy_timeout
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.appends = 0
+        self.loads = 0
+        self.migrations = 0
+
+    def _connect_locked(self) -> sqlite3.Connection:
+        if self._db is None:
+            if self.path is not None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+            # Autocommit mode; every write below opens its own explicit transaction
+            self._db = sqlite3.connect(self.path or ":memory:", timeout=self.busy_timeout,
+                                       check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, "
+                "message TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS messages_user ON messages (user_id, id)")
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(messages)")}
+            if "tokens" not in columns:
+                # Messages logged before token counts were stored read as 0 here and are measured when loaded
+                self._db.execute("ALTER TABLE messages ADD COLUMN tokens INTEGER NOT NULL DEFAULT 0")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS summaries (user_id TEXT PRIMARY KEY, summary TEXT NOT NULL, "
+                "through_id INTEGER NOT NULL)"
+            )
+        return self._db
+
+    @staticmethod
+    def _rows(user_id: str, messages: Sequence[BaseMessage]) -> List[tuple]:
+        now = time.time()
+        return [(user_id, json.dumps(message_to_dict(message)), now, estimate_tokens(str(message.content)))
+                for message in messages]
+
+    def append(self, user_id: str, messages: Sequence[BaseMessage]) -> None:
+        """
+        Append messages to a user's conversation in one transaction.
+
+        Args:
+            user_id (str): The conversation owner.
+            messages (Sequence[BaseMessage]): The messages, oldest first.
+        """
+        rows = self._rows(user_id, messages)
+        if not rows:
+            return
+        with self._lock:
+            db = self._connect_locked()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.executemany(_INSERT, rows)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            self.appends += 1
+
+    def recent(self, user_id: str, limit: Optional[int] = None) -> List[BaseMessage]:
+        """
+        Return a user's most recent messages.
+
+        Args:
+            user_id (str): The conversation owner.
+            limit (Optional[int]): Maximum number of messages. Defaults to the store's window.
+
+        Returns:
+            List[BaseMessage]: The messages, oldest first.
+        """
+        return [row.message for row in self.recent_rows(user_id, limit)]
+
+    def recent_rows(self, user_id: str, limit: Optional[int] = None, after_id: int = 0) -> List[StoredMessage]:
+        """
+        Return a user's most recent messages with their ids and token counts.
+
+        Args:
+            user_id (str): The conversation owner.
+            limit (Optional[int]): Maximum number of messages. Defaults to the store's window; pass -1 for all.
+            after_id (int): Only return messages logged after this id. Defaults to 0.
+
+        Returns:
+            List[StoredMessage]: The messages, oldest first.
+        """
+        limit = self.window if limit is None else limit
+        with self._lock:
+            db = self._connect_locked()
+            rows = db.execute(
+                "SELECT id, message, tokens FROM messages WHERE user_id = ? AND id > ? ORDER BY id DESC LIMIT ?",
+                (user_id, after_id, -1 if limit is None else limit),
+            ).fetchall()
+            self.loads += 1
+        rows.reverse()
+        messages = messages_from_dict([json.loads(row[1]) for row in rows])
+        return [StoredMessage(row[0], message, row[2] or estimate_tokens(str(message.content)))
+                for row, message in zip(rows, messages)]
+
+    def history_tokens(self, user_id: str) -> int:
+        """Return the total tokens of a user's whole conversation, as a full-history prompt would carry."""
+        with self._lock:
+            return self._connect_locked().execute(
+                "SELECT COALESCE(SUM(tokens), 0) FROM messages WHERE user_id = ?", (user_id,)
+            ).fetchone()[0]
+
+    def summary(self, user_id: str) -> Tuple[str, int]:
+        """
+        Return a user's rolling summary and the id of the last message it covers.
+
+        Args:
+            user_id (str): The conversation owner.
+
+        Returns:
+            Tuple[str, int]: The summary and message id, or ("", 0) if nothing has been summarized.
+        """
+        with self._lock:
+            row = self._connect_locked().execute(
+                "SELECT summary, through_id FROM summaries WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return (row[0], row[1]) if row else ("", 0)
+
+    def set_summary(self, user_id: str, summary: str, through_id: int, expected_through_id: int) -> bool:
+        """
+        Replace a user's rolling summary if it still covers expected_through_id, so a slower concurrent
+        summarizer cannot overwrite a newer summary.
+
+        Args:
+            user_id (str): The conversation owner.
+            summary (str): The new summary.
+            through_id (int): Id of the last message the new summary covers.
+            expected_through_id (int): Id the current summary must cover, as returned by summary().
+
+        Returns:
+            bool: Whether the summary was stored.
+        """
+        with self._lock:
+            db = self._connect_locked()
+            if expected_through_id:
+                cursor = db.execute(
+                    "UPDATE summaries SET summary = ?, through_id = ? WHERE user_id = ? AND through_id = ?",
+                    (summary, through_id, user_id, expected_through_id),
+                )
+            else:
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO summaries (user_id, summary, through_id) VALUES (?, ?, ?)",
+                    (user_id, summary, through_id),
+                )
+            return cursor.rowcount == 1
+
+    def count(self, user_id: str) -> int:
+        """Return the number of messages stored for a user."""
+        with self._lock:
+            return self._connect_locked().execute(
+                "SELECT COUNT(*) FROM messages WHERE user_id = ?", (user_id,)
+            ).fetchone()[0]
+
+    def clear(self, user_id: str) -> None:
+        """Delete a user's conversation and summary."""
+        with self._lock:
+            db = self._connect_locked()
+            db.execute("DELETE FROM messages WHERE user_id = ?", (user_id,))
+            db.execute("DELETE FROM summaries WHERE user_id = ?", (user_id,))
+
+    def migrate_pickle(self, user_id: str, pickle_path: Optional[str] = None) -> int:
+        """
+        Import a pickled ConversationBufferMemory into the store and rename the pickle so it is not read again.
+        A user who already has stored messages keeps them and the pickle is only renamed.
+
+        Args:
+            user_id (str): The conversation owner.
+            pickle_path (Optional[str]): The pickle file. Defaults to legacy_memory_path(user_id).
+
+        Returns:
+            int: The number of messages imported.
+        """
+        pickle_path = pickle_path or legacy_memory_path(user_id)
+        if not os.path.exists(pickle_path):
+            return 0
+        with open(pickle_path, "rb") as f:
+            memory = pickle.load(f)
+        chat_memory = getattr(memory, "chat_memory", memory)
+        messages = list(getattr(chat_memory, "messages", []))
+        rows = self._rows(user_id, messages)
+        imported = 0
+        with self._lock:
+            db = self._connect_locked()
+            # The emptiness check and the import share one write transaction, so concurrent openers import once
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                exists = db.execute("SELECT 1 FROM messages WHERE user_id = ? LIMIT 1", (user_id,)).fetchone()
+                if not exists and rows:
+                    db.executemany(_INSERT, rows)
+                    imported = len(rows)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            if imported:
+                self.migrations += 1
+        try:
+            os.replace(pickle_path, pickle_path + ".migrated")
+        except FileNotFoundError:
+            pass
+        logger.info("Migrated %d messages for %s from %s", imported, user_id, pickle_path)
+        return imported
+
+    def history(self, user_id: str, migrate: bool = True) -> "StoredChatMessageHistory":
+        """
+        Return a chat message history backed by this store, importing the user's legacy pickle first.
+
+        Args:
+            user_id (str): The conversation owner.
+            migrate (bool): Whether to import <user_id>_memory.pkl if it exists. Defaults to True.
+
+        Returns:
+            StoredChatMessageHistory: The history, for ConversationBufferMemory(chat_memory=...).
+        """
+        if migrate:
+            self.migrate_pickle(user_id)
+        return StoredChatMessageHistory(self, user_id)
+
+    def close(self) -> None:
+        """Close the database, if it is open."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return counters describing store usage.
+
+        Returns:
+            Dict[str, int]: Turns appended, window loads and migrated pickle files.
+        """
+        with self._lock:
+            return {"appends": self.appends, "loads": self.loads, "migrations": self.migrations}
+
+
+class StoredChatMessageHistory(BaseChatMessageHistory):
+    """
+    Chat message history of one user in a ConversationStore.
+    Parameters:
+        - store (ConversationStore): Where the messages live.
+        - user_id (str): The conversation owner.
+    Processing Logic:
+        - messages reads the store's recent window each time it is accessed, so nothing is loaded until a chain
+          asks for the history and later turns from other processes are seen.
+        - add_messages appends a whole turn in one transaction.
+    """
+    def __init__(self, store: ConversationStore, user_id: str):
+        self.store = store
+        self.user_id = user_id
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        """The most recent messages, oldest first."""
+        return self.store.recent(self.user_id)
+
+    def add_message(self, message: BaseMessage) -> None:
+        """Append one message."""
+        self.store.append(self.user_id, [message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """Append several messages in one transaction."""
+        self.store.append(self.user_id, messages)
+
+    def clear(self) -> None:
+        """Delete the user's conversation."""
+        self.store.clear(self.user_id)
+
+
+default_memory_store = ConversationStore("chat_memory.sqlite")
@@ -0,0 +1,200 @@
+import logging
+import os
+import threading
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .rate_limiter import estimate_tokens
+from .resilience import ResilienceMetrics, default_resilience_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ModelProfile(NamedTuple):
+    """
+    Static routing information for one model. Costs are USD per million tokens; latencies are seconds.
+    'prior_latency' is the latency before generation, used until enough calls have been observed, and output
+    tokens add 1 / 'tokens_per_second' seconds each on top of it.
+    """
+    model: str
+    input_cost: float
+    output_cost: float
+    context_window: int
+    prior_latency: float
+    tokens_per_second: float
+    provider: str = "openai"
+
+
+# Published list prices and typical latencies at the time of writing; pass profiles to override them
+DEFAULT_PROFILES: Tuple[ModelProfile, ...] = (
+    ModelProfile("gpt-4o-mini", 0.15, 0.60, 128000, 0.9, 80.0),
+    ModelProfile("gpt-3.5-turbo", 0.50, 1.50, 16385, 0.7, 90.0),
+    ModelProfile("llama3", 0.88, 0.88, 8192, 1.0, 60.0, provider="together"),
+)
+
+
+class RoutingDecision(NamedTuple):
+    """Why a prompt was routed where it was: the chosen model, the inputs, and the score of every eligible model."""
+    model: str
+    prompt_tokens: int
+    output_tokens: int
+    scores: Dict[str, float]
+    expected_latency: float
+    expected_cost: float
+
+
+class ModelRouter:
+    """
+    Chooses a model for each prompt by trading off expected latency against expected cost.
+    Parameters:
+        - profiles (Sequence[ModelProfile]): The candidate models. Defaults to DEFAULT_PROFILES.
+        - cost_weight (float): Seconds of latency one US dollar is worth in the score. Defaults to 1000.
+        - latency_percentile (float): Observed latency percentile used as the base latency, e.g. 0.5 or 0.95. Defaults to 0.5.
+        - min_samples (int): Observed calls required before the rolling percentile replaces the prior. Defaults to 10.
+        - expected_output_tokens (int): Output length assumed when the caller does not give one. Defaults to 256.
+        - metrics (Optional[ResilienceMetrics]): Where per-model base latencies are kept. Defaults to the shared instance.
+        - history (int): Number of recent decisions kept for inspection. Defaults to 256.
+    Processing Logic:
+        - Models whose context window cannot hold the prompt plus the requested output are skipped.
+        - Expected latency is the model's base latency, plus the requested output tokens divided by the model's
+          generation speed. The base latency is the rolling p50 (or p95) of observed upstream requests with their
+          estimated generation time removed (see observe), or the prior until min_samples were observed.
+        - Only requests actually sent upstream are observed, so cache hits, coalesced calls and rate-limit waits
+          do not pull the estimate away from the prior it replaces.
+        - Expected cost is prompt and output tokens priced at the model's per-token rates.
+        - score = expected latency + cost_weight * expected cost; lower is better, and the remaining eligible
+          models are returned in score order so callers can use them as fallbacks.
+        - Every decision is logged at DEBUG level on the 'chat.model_router' logger and kept in a bounded history.
+    """
+    def __init__(self, profiles: Sequence[ModelProfile] = DEFAULT_PROFILES, cost_weight: float = 1000.0,
+                 latency_percentile: float = 0.5, min_samples: int = 10, expected_output_tokens: int = 256,
+                 metrics: Optional[ResilienceMetrics] = None, history: int = 256):
+        self.profiles = {profile.model: profile for profile in profiles}
+        self.cost_weight = cost_weight
+        self.latency_percentile = latency_percentile
+        self.min_samples = min_samples
+        self.expected_output_tokens = expected_output_tokens
+        self.metrics = metrics or default_resilience_metrics
+        self._decisions: Deque[RoutingDecision] = deque(maxlen=history)
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _base_latency(self, profile: ModelProfile) -> float:
+        observed = self.metrics.base_latency(profile.model).percentile(self.latency_percentile, self.min_samples)
+        return profile.prior_latency if observed is None else observed
+
+    def observe(self, model: str, seconds: float, output: Optional[str]) -> None:
+        """
+        Record an upstream request as a base latency sample: its duration minus the estimated generation time.
+
+        Args:
+            model (str): The routed model name; requests to models without a profile are ignored.
+            seconds (float): Duration of the upstream request, excluding any rate-limit wait.
+            output (Optional[str]): The completion, used to estimate the generation time.
+        """
+        profile = self.profiles.get(model)
+        if profile is None:
+            return
+        generation = estimate_tokens(output) / profile.tokens_per_second if output else 0.0
+        self.metrics.base_latency(model).record(max(0.0, seconds - generation))
+
+    def rank(self, prompt: str, output_tokens: Optional[int] = None,
+             models: Optional[Sequence[str]] = None) -> Tuple[List[str], RoutingDecision]:
+        """
+        Score every eligible model for a prompt and record the decision.
+
+        Args:
+            prompt (str): The prompt to route.
+            output_tokens (Optional[int]): Requested output length in tokens. Defaults to expected_output_tokens.
+            models (Optional[Sequence[str]]): Restrict routing to these models, e.g. those with an API key. Defaults to all.
+
+        Returns:
+            Tuple[List[str], RoutingDecision]: Eligible models from best to worst, and the decision for the best.
+        """
+        output_tokens = self.expected_output_tokens if output_tokens is None else output_tokens
+        prompt_tokens = estimate_tokens(prompt)
+        candidates = [self.profiles[model] for model in (self.profiles if models is None else models) if model in self.profiles]
+        fitting = [profile for profile in candidates if prompt_tokens + output_tokens <= profile.context_window]
+        if not fitting:
+            # Nothing fits; the largest context window is the best chance of success
+            fitting = sorted(candidates, key=lambda profile: profile.context_window, reverse=True)[:1]
+        if not fitting:
+            raise ValueError("No routable models are configured.")
+
+        estimates = {}
+        for profile in fitting:
+            latency = self._base_latency(profile) + output_tokens / profile.tokens_per_second
+            cost = (prompt_tokens * profile.input_cost + output_tokens * profile.output_cost) / 1_000_000
+            estimates[profile.model] = (latency + self.cost_weight * cost, latency, cost)
+        ranked = sorted(estimates, key=lambda model: estimates[model][0])
+        best = ranked[0]
+        decision = RoutingDecision(best, prompt_tokens, output_tokens,
+                                   {model: estimate[0] for model, estimate in estimates.items()},
+                                   estimates[best][1], estimates[best][2])
+        with self._lock:
+            self._decisions.append(decision)
+            self._counts[best] += 1
+        logger.debug("Routed %d-token prompt (%d output tokens) to %s; scores=%s",
+                     prompt_tokens, output_tokens, best, decision.scores)
+        return ranked, decision
+
+    def route(self, prompt: str, output_tokens: Optional[int] = None, models: Optional[Sequence[str]] = None) -> str:
+        """
+        Return the best model for a prompt.
+
+        Args:
+            prompt (str): The prompt to route.
+            output_tokens (Optional[int]): Requested output length in tokens. Defaults to expected_output_tokens.
+            models (Optional[Sequence[str]]): Restrict routing to these models. Defaults to all.
+
+        Returns:
+            str: The chosen model name.
+        """
+        return self.rank(prompt, output_tokens, models)[0][0]
+
+    def decisions(self) -> List[RoutingDecision]:
+        """Return the most recent routing decisions, oldest first."""
+        with self._lock:
+            return list(self._decisions)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return how often each model was chosen and the averages of the recent decisions.
+
+        Returns:
+            Dict[str, Any]: Per-model route counts plus the mean expected latency and cost of the recent decisions.
+        """
+        with self._lock:
+            decisions = list(self._decisions)
+            counts = dict(self._counts)
+        return {
+            "routes": counts,
+            "avg_expected_latency": sum(d.expected_latency for d in decisions) / len(decisions) if decisions else 0.0,
+            "avg_expected_cost": sum(d.expected_cost for d in decisions) / len(decisions) if decisions else 0.0,
+        }
+
+    def available_models(self, api_key: Optional[str], api_keys: Optional[Dict[str, str]] = None) -> List[Tuple[str, str]]:
+        """
+        Pair every routable model with the API key it would be called with.
+
+        Args:
+            api_key (Optional[str]): The caller's key, used for OpenAI models; OPENAI_API_KEY is used when it is None.
+            api_keys (Optional[Dict[str, str]]): Per-provider keys, e.g. {"together": ...}; Together falls back to TOGETHER_API_KEY. Defaults to None.
+
+        Returns:
+            List[Tuple[str, str]]: (model, api_key) pairs for models that have a key.
+        """
+        api_keys = api_keys or {}
+        available = []
+        for profile in self.profiles.values():
+            key = api_keys.get(profile.provider)
+            if key is None and profile.provider == "together":
+                key = os.environ.get("TOGETHER_API_KEY")
+            elif key is None:
+                key = api_key or os.environ.get("OPENAI_API_KEY")
+            if key:
+                available.append((profile.model, key))
+        return available
+
+
+default_router = ModelRouter()
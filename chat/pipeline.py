@@ -0,0 +1,273 @@
+import asyncio
+import re
+import time
+from typing import Any, AsyncIterator, List, NamedTuple, Optional, Sequence
+
+from .completion_cache import CompletionCache
+from .resilience import RetryPolicy
+from .text_to_text import TextToTextProcessor
+
+_END = object()
+
+_BOUNDARIES = {
+    "sentence": re.compile(r"(?<=[.!?。！？])\s+"),
+    "paragraph": re.compile(r"\n\s*\n"),
+}
+
+
+class Stage(NamedTuple):
+    """
+    One step of a Chain.
+    'template' receives the upstream text as {input}; any other braces, e.g. JSON examples, are kept literally.
+    'split' controls the hand-off:
+    "none" waits for the whole upstream output and streams one call, while "sentence" or
+    "paragraph" starts a call for each unit as soon as the upstream has produced it.
+    """
+    model: str
+    template: str = "{input}"
+    api_key: Optional[str] = None
+    split: str = "none"
+    language: Optional[str] = "English"
+
+    def render(self, text: str) -> str:
+        """Return the stage prompt for an upstream text."""
+        return self.template.replace("{input}", text)
+
+
+class StageTiming(NamedTuple):
+    """Seconds since the chain started at which a stage received input, produced output and finished."""
+    stage: int
+    model: str
+    started: float
+    first_output: Optional[float]
+    finished: float
+    calls: int
+
+
+class ChainResult(NamedTuple):
+    """The final stage's text, every stage's full output, and per-stage timings."""
+    output: str
+    outputs: List[str]
+    timings: List[StageTiming]
+
+
+class _Failure(NamedTuple):
+    error: BaseException
+
+
+class _Segmenter:
+    """Accumulates streamed text and releases complete sentences or paragraphs."""
+    def __init__(self, split: str):
+        self.boundary = _BOUNDARIES[split]
+        self.buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        self.buffer += text
+        parts = self.boundary.split(self.buffer)
+        self.buffer = parts.pop()
+        return [part for part in parts if part.strip()]
+
+    def flush(self) -> List[str]:
+        rest, self.buffer = self.buffer, ""
+        return [rest] if rest.strip() else []
+
+
+class Chain:
+    """
+    Declarative multi-stage text pipeline in which each stage's output is templated into the next.
+    Parameters:
+        - stages (Sequence[Stage]): The stages in order; the first receives the chain input as {input}.
+        - api_key (Optional[str]): Key used by stages that do not set their own. Defaults to None.
+        - cache (Optional[CompletionCache]): Cache shared by the stages' non-streaming calls. Defaults to None.
+        - retry (Optional[RetryPolicy]): Retry policy applied to every call. Defaults to None.
+        - concurrency (int): Maximum calls in flight per split stage. Defaults to 4.
+    Processing Logic:
+        - Every stage runs as its own task connected to the next by a queue, so stages overlap instead of
+          running strictly one after another.
+        - An unsplit stage waits for its whole input and streams its tokens downstream as they arrive.
+        - A split stage cuts the upstream text into sentences or paragraphs as it streams in, starts a call per
+          unit immediately (up to 'concurrency' at a time) and emits the results in input order.
+        - The first error in any stage cancels the remaining stages and is raised to the caller.
+        - Each stage reports when it received its first input, produced its first output and finished.
+    """
+    def __init__(self, stages: Sequence[Stage], api_key: Optional[str] = None, cache: Optional[CompletionCache] = None,
+                 retry: Optional[RetryPolicy] = None, concurrency: int = 4):
+        if not stages:
+            raise ValueError("A chain needs at least one stage.")
+        for stage in stages:
+            if stage.split != "none" and stage.split not in _BOUNDARIES:
+                raise ValueError(f"Unsupported split: {stage.split}")
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1.")
+        self.stages = list(stages)
+        self.api_key = api_key
+        self.cache = cache
+        self.retry = retry
+        self.concurrency = concurrency
+
+    def _processor(self, stage: Stage) -> TextToTextProcessor:
+        return TextToTextProcessor(stage.model, stage.api_key or self.api_key, self.cache, self.retry)
+
+    async def _run_stage(self, index: int, stage: Stage, inbox: asyncio.Queue, outbox: asyncio.Queue,
+                         started_at: float, timings: List[Optional[StageTiming]], outputs: List[str]) -> None:
+        processor = self._processor(stage)
+        started: Optional[float] = None
+        first_output: Optional[float] = None
+        calls = 0
+        produced: List[str] = []
+
+        async def emit(text: str) -> None:
+            nonlocal first_output
+            if first_output is None:
+                first_output = time.perf_counter() - started_at
+            produced.append(text)
+            await outbox.put(text)
+
+        if stage.split == "none":
+            pieces = []
+            while True:
+                piece = await inbox.get()
+                if piece is _END:
+                    break
+                if started is None:
+                    started = time.perf_counter() - started_at
+                pieces.append(piece)
+            calls = 1
+            async for token in processor.astream(stage.render("".join(pieces)), stage.language):
+                await emit(token)
+        else:
+            segmenter = _Segmenter(stage.split)
+            semaphore = asyncio.Semaphore(self.concurrency)
+            pending: asyncio.Queue = asyncio.Queue()
+
+            async def call(segment: str) -> str:
+                async with semaphore:
+                    return await processor.aprocess(stage.render(segment), stage.language)
+
+            async def drain() -> None:
+                # Results are emitted in input order even though the calls run concurrently
+                separator = ""
+                while True:
+                    task = await pending.get()
+                    if task is _END:
+                        return
+                    await emit(separator + (await task or ""))
+                    separator = "\n\n" if stage.split == "paragraph" else " "
+
+            drainer = asyncio.ensure_future(drain())
+            tasks = []
+            try:
+                while True:
+                    piece = await inbox.get()
+                    segments = segmenter.flush() if piece is _END else segmenter.feed(piece)
+                    if piece is not _END and started is None:
+                        started = time.perf_counter() - started_at
+                    for segment in segments:
+                        calls += 1
+                        task = asyncio.ensure_future(call(segment.strip()))
+                        tasks.append(task)
+                        await pending.put(task)
+                    if piece is _END:
+                        break
+                await pending.put(_END)
+                await drainer
+            finally:
+                drainer.cancel()
+                for task in tasks:
+                    task.cancel()
+
+        finished = time.perf_counter() - started_at
+        timings[index] = StageTiming(index, stage.model, finished if started is None else started,
+                                     first_output, finished, calls)
+        outputs[index] = "".join(produced)
+        await outbox.put(_END)
+
+    async def _pipeline(self, text: str, timings: List[Optional[StageTiming]], outputs: List[str]) -> AsyncIterator[str]:
+        started_at = time.perf_counter()
+        queues = [asyncio.Queue() for _ in range(len(self.stages) + 1)]
+        await queues[0].put(text)
+        await queues[0].put(_END)
+        tasks = [
+            asyncio.ensure_future(self._run_stage(index, stage, queues[index], queues[index + 1],
+                                                  started_at, timings, outputs))
+            for index, stage in enumerate(self.stages)
+        ]
+        final = queues[-1]
+
+        def report_failure(task: asyncio.Task) -> None:
+            # A failed stage never sends _END, so surface its error on the final queue instead
+            if not task.cancelled() and task.exception() is not None:
+                final.put_nowait(_Failure(task.exception()))
+
+        for task in tasks:
+            task.add_done_callback(report_failure)
+        try:
+            while True:
+                piece = await final.get()
+                if piece is _END:
+                    return
+                if isinstance(piece, _Failure):
+                    raise piece.error
+                yield piece
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def astream(self, text: str) -> AsyncIterator[str]:
+        """
+        Run the chain and yield the final stage's output as it is produced.
+
+        Args:
+            text (str): The chain input, templated into the first stage.
+
+        Returns:
+            AsyncIterator[str]: Text pieces of the final stage's output.
+        """
+        timings: List[Optional[StageTiming]] = [None] * len(self.stages)
+        outputs = [""] * len(self.stages)
+        async for piece in self._pipeline(text, timings, outputs):
+            yield piece
+
+    async def arun(self, text: str) -> ChainResult:
+        """
+        Run the chain to completion.
+
+        Args:
+            text (str): The chain input, templated into the first stage.
+
+        Returns:
+            ChainResult: The final output, each stage's output and per-stage timings.
+        """
+        timings: List[Optional[StageTiming]] = [None] * len(self.stages)
+        outputs = [""] * len(self.stages)
+        pieces = [piece async for piece in self._pipeline(text, timings, outputs)]
+        return ChainResult("".join(pieces), outputs, timings)
+
+    def run(self, text: str) -> ChainResult:
+        """
+        Run the chain to completion from synchronous code.
+
+        Args:
+            text (str): The chain input, templated into the first stage.
+
+        Returns:
+            ChainResult: The final output, each stage's output and per-stage timings.
+        """
+        return asyncio.run(self.arun(text))
+
+
+def chain(stages: Sequence[Stage], api_key: Optional[str] = None, cache: Optional[CompletionCache] = None,
+          **kwargs: Any) -> Chain:
+    """
+    Convenience function to build a Chain.
+
+    Args:
+        stages (Sequence[Stage]): The stages in order.
+        api_key (Optional[str]): Key used by stages that do not set their own. Defaults to None.
+        cache (Optional[CompletionCache]): Cache shared by the stages' non-streaming calls. Defaults to None.
+        **kwargs (Any): Further Chain options such as retry or concurrency.
+
+    Returns:
+        Chain: The configured chain.
+    """
+    return Chain(stages, api_key, cache, **kwargs)
@@ -0,0 +1,297 @@
+import asyncio
+import hashlib
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+import tiktoken
+
+from .instrumentation import note_queue_time
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Non-OpenAI models (e.g. Llama-3) get a close-enough estimate from the GPT-4 tokenizer
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # tiktoken downloads its vocabularies on first use; metering must not fail the call when that is impossible
+        return None
+
+
+def estimate_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """
+    Estimate the number of tokens in a prompt with tiktoken, or roughly four characters per token
+    when the tokenizer cannot be loaded.
+
+    Args:
+        text (str): The prompt text.
+        model (str): The model whose tokenizer should be used. Defaults to "gpt-3.5-turbo".
+
+    Returns:
+        int: The estimated token count.
+    """
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class RateLimiter:
+    """
+    Meters requests-per-minute and tokens-per-minute for one provider and API key.
+    Parameters:
+        - requests_per_minute (Optional[float]): Request quota; None leaves requests unmetered.
+        - tokens_per_minute (Optional[float]): Token quota; None leaves tokens unmetered.
+    Processing Logic:
+        - Each quota is a token bucket that starts full and refills continuously at quota / 60 per second.
+        - A caller reserves its request and tokens immediately, letting the bucket go negative, and then sleeps
+          until the deficit has refilled. Later callers see a deeper deficit, so calls are released in arrival
+          order at the quota ceiling instead of failing or retrying.
+        - The same reservation serves threads (time.sleep) and asyncio (asyncio.sleep); a cancelled async
+          waiter gives its reservation back.
+        - Queue depth, total and maximum wait time are tracked for observability.
+    """
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute or 0)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.queued = 0
+        self.queue_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill_locked(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute:
+            self._requests = min(float(self.requests_per_minute), self._requests + elapsed * self.requests_per_minute / 60.0)
+        if self.tokens_per_minute:
+            self._tokens = min(float(self.tokens_per_minute), self._tokens + elapsed * self.tokens_per_minute / 60.0)
+
+    def _reserve(self, tokens: int) -> Tuple[float, int]:
+        with self._lock:
+            self._refill_locked(time.monotonic())
+            delay = 0.0
+            if self.requests_per_minute:
+                self._requests -= 1
+                delay = max(delay, -self._requests * 60.0 / self.requests_per_minute)
+            if self.tokens_per_minute:
+                # A single call larger than the whole quota would otherwise never be released
+                tokens = min(tokens, int(self.tokens_per_minute))
+                self._tokens -= tokens
+                delay = max(delay, -self._tokens * 60.0 / self.tokens_per_minute)
+            else:
+                tokens = 0
+            self.calls += 1
+            if delay > 0:
+                self.queued += 1
+                self.queue_depth += 1
+            return delay, tokens
+
+    def _release(self, delay: float) -> None:
+        with self._lock:
+            self.queue_depth -= 1
+            self.total_wait += delay
+            self.max_wait = max(self.max_wait, delay)
+
+    def _refund(self, tokens: int) -> None:
+        with self._lock:
+            self.queue_depth -= 1
+            if self.requests_per_minute:
+                self._requests += 1
+            if self.tokens_per_minute:
+                self._tokens += tokens
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Block until the call fits within both quotas.
+
+        Args:
+            tokens (int): Estimated tokens the call will consume. Defaults to 0.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        delay, _ = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+            self._release(delay)
+            note_queue_time(delay)
+        return delay
+
+    async def aacquire(self, tokens: int = 0) -> float:
+        """
+        Wait without blocking the event loop until the call fits within both quotas.
+
+        Args:
+            tokens (int): Estimated tokens the call will consume. Defaults to 0.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        delay, reserved = self._reserve(tokens)
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self._refund(reserved)
+                raise
+            self._release(delay)
+            note_queue_time(delay)
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return counters describing the limiter's queue.
+
+        Returns:
+            Dict[str, Any]: Calls, calls that had to wait, current queue depth, and total/average/max wait seconds.
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "queued": self.queued,
+                "queue_depth": self.queue_depth,
+                "total_wait": self.total_wait,
+                "avg_wait": self.total_wait / self.queued if self.queued else 0.0,
+                "max_wait": self.max_wait,
+            }
+
+
+class RateLimits:
+    """
+    Registry of per-provider quotas and the per-API-key limiters that enforce them.
+    Processing Logic:
+        - Providers start unmetered; configure() sets the quota applied to every API key of that provider.
+        - Each (provider, api_key) pair gets its own RateLimiter, because quotas are enforced per key upstream.
+        - Prompt tokens are only counted with tiktoken when a token quota is configured, so unmetered
+          providers pay nothing beyond a dictionary lookup.
+        - Stats identify keys by their last four characters only.
+    """
+    def __init__(self):
+        self._quotas: Dict[str, Tuple[Optional[float], Optional[float], int]] = {}
+        self._limiters: Dict[Tuple[str, Optional[str]], RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, provider: str, requests_per_minute: Optional[float] = None,
+                  tokens_per_minute: Optional[float] = None, expected_completion_tokens: int = 256) -> None:
+        """
+        Set or replace the quota for a provider.
+
+        Args:
+            provider (str): The provider name, e.g. "openai" or "together".
+            requests_per_minute (Optional[float]): Request quota per API key. Defaults to None.
+            tokens_per_minute (Optional[float]): Token quota per API key. Defaults to None.
+            expected_completion_tokens (int): Completion tokens charged per call on top of the prompt estimate. Defaults to 256.
+        """
+        with self._lock:
+            self._quotas[provider] = (requests_per_minute, tokens_per_minute, expected_completion_tokens)
+            for key in [key for key in self._limiters if key[0] == provider]:
+                del self._limiters[key]
+
+    def reset(self) -> None:
+        """Remove every quota and limiter."""
+        with self._lock:
+            self._quotas.clear()
+            self._limiters.clear()
+
+    def _limiter(self, provider: str, api_key: Optional[str]) -> Optional[Tuple[RateLimiter, int]]:
+        quota = self._quotas.get(provider)
+        if quota is None:
+            return None
+        requests_per_minute, tokens_per_minute, expected_completion_tokens = quota
+        with self._lock:
+            limiter = self._limiters.get((provider, api_key))
+            if limiter is None:
+                limiter = self._limiters[(provider, api_key)] = RateLimiter(requests_per_minute, tokens_per_minute)
+        return limiter, expected_completion_tokens
+
+    @staticmethod
+    def _cost(limiter: RateLimiter, expected_completion_tokens: int, text: str, model: str) -> int:
+        if not limiter.tokens_per_minute:
+            return 0
+        return estimate_tokens(text, model) + expected_completion_tokens
+
+    def acquire(self, provider: str, api_key: Optional[str], text: str = "", model: str = "gpt-3.5-turbo") -> float:
+        """
+        Block until a call to the provider fits within the key's quota.
+
+        Args:
+            provider (str): The provider name.
+            api_key (Optional[str]): The API key the call is billed to.
+            text (str): The prompt text, used to estimate tokens. Defaults to "".
+            model (str): The model whose tokenizer estimates the prompt. Defaults to "gpt-3.5-turbo".
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        entry = self._limiter(provider, api_key)
+        if entry is None:
+            return 0.0
+        limiter, expected_completion_tokens = entry
+        return limiter.acquire(self._cost(limiter, expected_completion_tokens, text, model))
+
+    async def aacquire(self, provider: str, api_key: Optional[str], text: str = "", model: str = "gpt-3.5-turbo") -> float:
+        """
+        Asynchronous variant of acquire that waits without blocking the event loop.
+
+        Args:
+            provider (str): The provider name.
+            api_key (Optional[str]): The API key the call is billed to.
+            text (str): The prompt text, used to estimate tokens. Defaults to "".
+            model (str): The model whose tokenizer estimates the prompt. Defaults to "gpt-3.5-turbo".
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        entry = self._limiter(provider, api_key)
+        if entry is None:
+            return 0.0
+        limiter, expected_completion_tokens = entry
+        return await limiter.aacquire(self._cost(limiter, expected_completion_tokens, text, model))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Return queue statistics for every active limiter.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Stats keyed by "provider:<short hash of the API key>", each with a "key"
+                label showing only the key's last four characters.
+        """
+        with self._lock:
+            limiters = list(self._limiters.items())
+        return {
+            f"{provider}:{_key_id(api_key)}": {**limiter.stats(), "key": f"...{(api_key or '')[-4:]}"}
+            for (provider, api_key), limiter in limiters
+        }
+
+
+def _key_id(api_key: Optional[str]) -> str:
+    # Unique per key without exposing it; keys sharing their last four characters stay apart
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+
+
+default_rate_limits = RateLimits()
+
+
+def configure_rate_limit(provider: str, requests_per_minute: Optional[float] = None,
+                         tokens_per_minute: Optional[float] = None, expected_completion_tokens: int = 256) -> None:
+    """
+    Convenience function to set a provider's quota on the process-wide registry.
+
+    Args:
+        provider (str): The provider name, e.g. "openai" or "together".
+        requests_per_minute (Optional[float]): Request quota per API key. Defaults to None.
+        tokens_per_minute (Optional[float]): Token quota per API key. Defaults to None.
+        expected_completion_tokens (int): Completion tokens charged per call on top of the prompt estimate. Defaults to 256.
+    """
+    default_rate_limits.configure(provider, requests_per_minute, tokens_per_minute, expected_completion_tokens)
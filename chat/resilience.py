@@ -0,0 +1,311 @@
+import asyncio
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, Type, TypeVar
+
+T = TypeVar("T")
+
+# Client errors that will fail the same way on every attempt; 408/409/429 are transient
+_PERMANENT_STATUS = {400, 401, 403, 404, 405, 413, 422}
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+class RetryPolicy:
+    """
+    Describes how failed upstream calls are retried.
+    Parameters:
+        - max_attempts (int): Total attempts per model, including the first. Defaults to 3.
+        - base_delay (float): Backoff ceiling in seconds before the first retry. Defaults to 0.5.
+        - max_delay (float): Upper bound on the backoff ceiling in seconds. Defaults to 8.0.
+        - retry_on (Tuple[Type[BaseException], ...]): Exception types worth retrying. Defaults to (Exception,).
+    Processing Logic:
+        - Backoff uses "full jitter": the sleep before retry n is uniform in [0, min(max_delay, base_delay * 2**n)],
+          which spreads out clients that failed together instead of retrying in lockstep.
+        - ValueError and HTTP client errors such as 400/401/404 are never retried, because repeating the
+          request cannot change the outcome.
+    """
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 retry_on: Tuple[Type[BaseException], ...] = (Exception,)):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1.")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+
+    def should_retry(self, error: BaseException, attempt: int) -> bool:
+        """
+        Decide whether another attempt should follow a failure.
+
+        Args:
+            error (BaseException): The exception raised by the failed attempt.
+            attempt (int): The number of attempts made so far.
+
+        Returns:
+            bool: True if the call should be retried.
+        """
+        if attempt >= self.max_attempts or not isinstance(error, self.retry_on) or isinstance(error, ValueError):
+            return False
+        return _status_code(error) not in _PERMANENT_STATUS
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Return the jittered delay before the next attempt.
+
+        Args:
+            attempt (int): The number of attempts made so far.
+
+        Returns:
+            float: Seconds to sleep.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+
+class LatencyTracker:
+    """
+    Rolling window of recent call latencies for one model.
+    Parameters:
+        - window (int): Number of most recent samples kept. Defaults to 256.
+    """
+    def __init__(self, window: int = 256):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """Add one latency sample in seconds."""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float, min_samples: int = 1) -> Optional[float]:
+        """
+        Return a latency percentile over the window.
+
+        Args:
+            q (float): The percentile as a fraction, e.g. 0.95.
+            min_samples (int): Samples required before an estimate is returned. Defaults to 1.
+
+        Returns:
+            Optional[float]: The percentile in seconds, or None if there are too few samples.
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class ResilienceMetrics:
+    """
+    Counts which path served each request: first try, retry, hedge or fallback model.
+    Processing Logic:
+        - Counters are kept per model for attempts, successes, failures, retries, hedges fired, hedges that won,
+          and whether the model served the request as the primary or as a fallback.
+        - Successful call latencies feed a per-model LatencyTracker, which supplies the p95 hedging delay.
+        - base_latency trackers hold the latency of upstream requests without generation time, as recorded by
+          ModelRouter.observe; they exclude cache hits, coalesced calls and rate-limit waits.
+    """
+    def __init__(self, window: int = 256):
+        self._window = window
+        self._counts: Counter = Counter()
+        self._latencies: Dict[str, LatencyTracker] = {}
+        self._base_latencies: Dict[str, LatencyTracker] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, event: str, count: int = 1) -> None:
+        """Increment the counter for one model and event."""
+        with self._lock:
+            self._counts[(model, event)] += count
+
+    def latency(self, model: str) -> LatencyTracker:
+        """Return the latency tracker for a model, creating it on first use."""
+        with self._lock:
+            tracker = self._latencies.get(model)
+            if tracker is None:
+                tracker = self._latencies[model] = LatencyTracker(self._window)
+            return tracker
+
+    def base_latency(self, model: str) -> LatencyTracker:
+        """Return the tracker of upstream latency before generation for a model, creating it on first use."""
+        with self._lock:
+            tracker = self._base_latencies.get(model)
+            if tracker is None:
+                tracker = self._base_latencies[model] = LatencyTracker(self._window)
+            return tracker
+
+    def reset(self) -> None:
+        """Forget every counter and latency sample."""
+        with self._lock:
+            self._counts.clear()
+            self._latencies.clear()
+            self._base_latencies.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Return the counters grouped by model.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Event counts plus p50/p95 latency in seconds for every model seen.
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            trackers = dict(self._latencies)
+        stats: Dict[str, Dict[str, Any]] = {}
+        for (model, event), count in counts.items():
+            stats.setdefault(model, {})[event] = count
+        for model, tracker in trackers.items():
+            stats.setdefault(model, {}).update(p50=tracker.percentile(0.5), p95=tracker.percentile(0.95))
+        return stats
+
+
+default_resilience_metrics = ResilienceMetrics()
+
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+        return _hedge_executor
+
+
+def hedged_call(primary: Callable[[], T], hedge: Callable[[], T], delay: float,
+                on_hedge: Optional[Callable[[], None]] = None) -> Tuple[T, bool]:
+    """
+    Run primary, and if it has not finished after delay seconds also run hedge; return the first success.
+
+    Args:
+        primary (Callable[[], T]): The original request.
+        hedge (Callable[[], T]): The duplicate request sent once the delay has passed.
+        delay (float): Seconds to wait for the primary before hedging.
+        on_hedge (Optional[Callable[[], None]]): Called when the hedge request is sent. Defaults to None.
+
+    Returns:
+        Tuple[T, bool]: The result and whether it came from the hedge request.
+    """
+    first = _executor().submit(primary)
+    done, _ = wait([first], timeout=delay)
+    if done:
+        return first.result(), False
+    if on_hedge is not None:
+        on_hedge()
+    second = _executor().submit(hedge)
+    pending = {first, second}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                # Threads cannot be interrupted; the slower request finishes in the background and is discarded
+                return future.result(), future is second
+            error = error or future.exception()
+    raise error
+
+
+async def ahedged_call(primary: Callable[[], Awaitable[T]], hedge: Callable[[], Awaitable[T]], delay: float,
+                       on_hedge: Optional[Callable[[], None]] = None) -> Tuple[T, bool]:
+    """
+    Asynchronous variant of hedged_call; the slower request is cancelled once a winner is known.
+
+    Args:
+        primary (Callable[[], Awaitable[T]]): Factory for the original request.
+        hedge (Callable[[], Awaitable[T]]): Factory for the duplicate request sent once the delay has passed.
+        delay (float): Seconds to wait for the primary before hedging.
+        on_hedge (Optional[Callable[[], None]]): Called when the hedge request is sent. Defaults to None.
+
+    Returns:
+        Tuple[T, bool]: The result and whether it came from the hedge request.
+    """
+    first = asyncio.ensure_future(primary())
+    try:
+        return await asyncio.wait_for(asyncio.shield(first), delay), False
+    except asyncio.TimeoutError:
+        pass
+    except BaseException:
+        first.cancel()
+        raise
+    if on_hedge is not None:
+        on_hedge()
+    second = asyncio.ensure_future(hedge())
+    pending = {first, second}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), task is second
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in (first, second):
+            task.cancel()
+
+
+def call_with_retry(fn: Callable[[], T], policy: RetryPolicy,
+                    on_retry: Optional[Callable[[BaseException], None]] = None) -> T:
+    """
+    Call fn, retrying failures according to the policy with jittered exponential backoff.
+
+    Args:
+        fn (Callable[[], T]): The call to make.
+        policy (RetryPolicy): How many attempts to make and which errors to retry.
+        on_retry (Optional[Callable[[BaseException], None]]): Called with the error before each retry. Defaults to None.
+
+    Returns:
+        T: The result of the first successful attempt.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return fn()
+        except Exception as e:
+            if not policy.should_retry(e, attempt):
+                raise
+            if on_retry is not None:
+                on_retry(e)
+            time.sleep(policy.backoff(attempt))
+
+
+async def acall_with_retry(fn: Callable[[], Awaitable[T]], policy: RetryPolicy,
+                           on_retry: Optional[Callable[[BaseException], None]] = None) -> T:
+    """
+    Asynchronous variant of call_with_retry.
+
+    Args:
+        fn (Callable[[], Awaitable[T]]): Factory for the coroutine to await.
+        policy (RetryPolicy): How many attempts to make and which errors to retry.
+        on_retry (Optional[Callable[[BaseException], None]]): Called with the error before each retry. Defaults to None.
+
+    Returns:
+        T: The result of the first successful attempt.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return await fn()
+        except Exception as e:
+            if not policy.should_retry(e, attempt):
+                raise
+            if on_retry is not None:
+                on_retry(e)
+            await asyncio.sleep(policy.backoff(attempt))
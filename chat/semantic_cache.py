@@ -0,0 +1,236 @@
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .completion_cache import CompletionCache, normalize_prompt
+
+
+class _Namespace:
+    """FAISS inner-product index plus the completions stored for one model/language/params combination."""
+    def __init__(self, dimension: int):
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        self.entries: Dict[int, Tuple[str, Optional[float]]] = {}
+        self.order: Deque[int] = deque()
+        self.next_id = 0
+
+
+class SemanticCache(CompletionCache):
+    """
+    Completion cache that also serves near-duplicate prompts using embedding similarity.
+    Parameters:
+        - embeddings (Embeddings): The embedding model used to vectorize prompts, e.g. OpenAIEmbeddings.
+        - threshold (float): Minimum cosine similarity for a semantic hit. Defaults to 0.95.
+        - max_semantic_entries (int): Maximum vectors kept per model/language namespace. Defaults to 10000.
+        - max_entries (int): Size of the exact-match in-memory tier. Defaults to 1024.
+        - ttl (Optional[float]): Seconds an entry stays valid; None keeps entries forever. Defaults to 3600.
+        - path (Optional[str]): SQLite path for the exact-match on-disk tier. Defaults to None.
+    Processing Logic:
+        - Lookups try the exact-match tiers first and only embed the prompt on an exact miss.
+        - Prompts are lowercased and whitespace-normalized before embedding, and vectors are L2-normalized so
+          the FAISS inner product is the cosine similarity.
+        - Each (model, language, sampling params) combination gets its own flat FAISS index, so a near-duplicate
+          prompt never returns a completion produced for a different model or language.
+        - When a namespace is full its oldest tenth is evicted with a single index compaction, and expired
+          entries are purged together, so a full cache does not rewrite the index on every set().
+        - The time between a miss and the matching set() is tracked as upstream latency; each semantic hit
+          adds that average minus the lookup time to the latency-saved counter.
+    """
+    def __init__(self, embeddings: Embeddings, threshold: float = 0.95, max_semantic_entries: int = 10000,
+                 max_entries: int = 1024, ttl: Optional[float] = 3600.0, path: Optional[str] = None):
+        super().__init__(max_entries=max_entries, ttl=ttl, path=path)
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_semantic_entries = max_semantic_entries
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._pending: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._semantic_lock = threading.Lock()
+        self.semantic_hits = 0
+        self.semantic_misses = 0
+        self.upstream_latency = 0.0
+        self.upstream_samples = 0
+        self.latency_saved = 0.0
+
+    @staticmethod
+    def _namespace_key(model: str, language: Optional[str], params: Dict[str, Any]) -> str:
+        return json.dumps([model, language, sorted(params.items())], default=str)
+
+    @staticmethod
+    def _semantic_text(prompt: str) -> str:
+        return normalize_prompt(prompt).lower()
+
+    @staticmethod
+    def _normalize_vector(vector) -> np.ndarray:
+        array = np.asarray(vector, dtype="float32").reshape(1, -1)
+        faiss.normalize_L2(array)
+        return array
+
+    def _cached_vector(self, text: str) -> Optional[np.ndarray]:
+        with self._semantic_lock:
+            vector = self._vectors.get(text)
+            if vector is not None:
+                self._vectors.move_to_end(text)
+            return vector
+
+    def _remember_vector(self, text: str, vector: np.ndarray) -> None:
+        # A miss is usually followed by set() for the same prompt, so keep recent vectors to avoid re-embedding
+        with self._semantic_lock:
+            self._vectors[text] = vector
+            self._vectors.move_to_end(text)
+            while len(self._vectors) > 256:
+                self._vectors.popitem(last=False)
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = self._cached_vector(text)
+        if vector is None:
+            vector = self._normalize_vector(self.embeddings.embed_query(text))
+            self._remember_vector(text, vector)
+        return vector
+
+    async def _aembed(self, text: str) -> np.ndarray:
+        vector = self._cached_vector(text)
+        if vector is None:
+            vector = self._normalize_vector(await self.embeddings.aembed_query(text))
+            self._remember_vector(text, vector)
+        return vector
+
+    def _search(self, namespace_key: str, text: str, vector: np.ndarray, started: float) -> Optional[str]:
+        now = time.time()
+        with self._semantic_lock:
+            namespace = self._namespaces.get(namespace_key)
+            if namespace is not None and namespace.index.ntotal:
+                scores, ids = namespace.index.search(vector, 1)
+                entry_id = int(ids[0][0])
+                if entry_id != -1 and scores[0][0] >= self.threshold:
+                    value, expires_at = namespace.entries[entry_id]
+                    if expires_at is None or expires_at > now:
+                        self.semantic_hits += 1
+                        self.latency_saved += max(0.0, self.upstream_latency - (time.perf_counter() - started))
+                        return value
+                    # Purge everything that has expired in one pass rather than compacting per entry
+                    expired = [key for key, (_, expires) in namespace.entries.items()
+                               if expires is not None and expires <= now]
+                    self._remove_locked(namespace, expired)
+            self.semantic_misses += 1
+            self._pending[(namespace_key, text)] = time.perf_counter()
+            while len(self._pending) > 1024:
+                self._pending.popitem(last=False)
+            return None
+
+    def _add(self, namespace_key: str, text: str, vector: np.ndarray, value: str) -> None:
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        with self._semantic_lock:
+            missed_at = self._pending.pop((namespace_key, text), None)
+            if missed_at is not None:
+                # Running mean of how long an upstream call took after a miss
+                self.upstream_samples += 1
+                self.upstream_latency += (time.perf_counter() - missed_at - self.upstream_latency) / self.upstream_samples
+
+            namespace = self._namespaces.get(namespace_key)
+            if namespace is None:
+                namespace = self._namespaces[namespace_key] = _Namespace(vector.shape[1])
+            entry_id = namespace.next_id
+            namespace.next_id += 1
+            namespace.index.add_with_ids(vector, np.array([entry_id], dtype="int64"))
+            namespace.entries[entry_id] = (value, expires_at)
+            namespace.order.append(entry_id)
+            if len(namespace.entries) > self.max_semantic_entries:
+                # remove_ids compacts the whole flat index, so a full namespace sheds its oldest tenth at once
+                excess = len(namespace.entries) - self.max_semantic_entries
+                count = min(len(namespace.order), max(excess, self.max_semantic_entries // 10))
+                self._remove_locked(namespace, list(itertools.islice(namespace.order, count)))
+
+    @staticmethod
+    def _remove_locked(namespace: _Namespace, entry_ids: List[int]) -> None:
+        if not entry_ids:
+            return
+        namespace.index.remove_ids(np.array(entry_ids, dtype="int64"))
+        removed = set(entry_ids)
+        for entry_id in removed:
+            namespace.entries.pop(entry_id, None)
+        namespace.order = deque(entry_id for entry_id in namespace.order if entry_id not in removed)
+
+    def get(self, model: str, prompt: str, language: Optional[str] = None, **params: Any) -> Optional[str]:
+        """
+        Look up a completion by exact match, then by the most similar previous prompt.
+
+        Args:
+            model (str): The model name.
+            prompt (str): The prompt text.
+            language (Optional[str]): The response language. Defaults to None.
+            **params (Any): Sampling parameters that were part of the request.
+
+        Returns:
+            Optional[str]: The cached completion, or None on a miss.
+        """
+        started = time.perf_counter()
+        value = super().get(model, prompt, language, **params)
+        if value is not None:
+            return value
+        text = self._semantic_text(prompt)
+        return self._search(self._namespace_key(model, language, params), text, self._embed(text), started)
+
+    async def aget(self, model: str, prompt: str, language: Optional[str] = None, **params: Any) -> Optional[str]:
+        """Asynchronous variant of get that embeds the prompt without blocking the event loop."""
+        started = time.perf_counter()
+        value = super().get(model, prompt, language, **params)
+        if value is not None:
+            return value
+        text = self._semantic_text(prompt)
+        return self._search(self._namespace_key(model, language, params), text, await self._aembed(text), started)
+
+    def set(self, model: str, prompt: str, value: str, language: Optional[str] = None, **params: Any) -> None:
+        """
+        Store a completion in the exact-match tiers and the semantic index.
+
+        Args:
+            model (str): The model name.
+            prompt (str): The prompt text.
+            value (str): The completion to store.
+            language (Optional[str]): The response language. Defaults to None.
+            **params (Any): Sampling parameters that were part of the request.
+        """
+        super().set(model, prompt, value, language, **params)
+        text = self._semantic_text(prompt)
+        self._add(self._namespace_key(model, language, params), text, self._embed(text), value)
+
+    async def aset(self, model: str, prompt: str, value: str, language: Optional[str] = None, **params: Any) -> None:
+        """Asynchronous variant of set that embeds the prompt without blocking the event loop."""
+        super().set(model, prompt, value, language, **params)
+        text = self._semantic_text(prompt)
+        self._add(self._namespace_key(model, language, params), text, await self._aembed(text), value)
+
+    def clear(self) -> None:
+        """Remove every entry from the exact-match tiers and the semantic index."""
+        super().clear()
+        with self._semantic_lock:
+            self._namespaces.clear()
+            self._vectors.clear()
+            self._pending.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return counters describing cache usage, including semantic hits and the latency they saved.
+
+        Returns:
+            Dict[str, Any]: Exact-tier counters plus semantic hits/misses, overall hit rate and seconds saved.
+        """
+        stats = super().stats()
+        with self._semantic_lock:
+            lookups = stats["hits"] + self.semantic_hits + self.semantic_misses
+            stats.update({
+                "semantic_hits": self.semantic_hits,
+                "semantic_misses": self.semantic_misses,
+                "semantic_entries": sum(len(namespace.entries) for namespace in self._namespaces.values()),
+                "hit_rate": (stats["hits"] + self.semantic_hits) / lookups if lookups else 0.0,
+                "avg_upstream_latency": self.upstream_latency,
+                "latency_saved": self.latency_saved,
+            })
+        return stats
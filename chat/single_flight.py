@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import json
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def request_key(model: str, prompt: str, api_key: Optional[str] = None, **params: Any) -> str:
+    """
+    Build the coalescing key for an upstream request.
+
+    Args:
+        model (str): The model or entry point name.
+        prompt (str): The prompt or query text.
+        api_key (Optional[str]): The caller's API key, hashed so different tenants never share a call. Defaults to None.
+        **params (Any): Any other inputs that change the result, such as language.
+
+    Returns:
+        str: A hex digest identifying the request.
+    """
+    payload = json.dumps([model, prompt, api_key, sorted(params.items())], ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical requests so they share one upstream call.
+    Processing Logic:
+        - The first caller for a key becomes the leader and runs the call; callers arriving while it is
+          in flight wait for it and receive the same result or exception.
+        - The key is forgotten as soon as the call finishes, so later requests always make a fresh call.
+        - On asyncio the shared call runs as its own task and every caller awaits it through a shield,
+          so cancelling one caller never cancels the call the others are waiting on.
+        - Async calls are tracked per event loop because tasks cannot be awaited across loops.
+    """
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._tasks: Dict[Tuple[int, str], "asyncio.Task"] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        """
+        Run fn once for all concurrent callers with the same key.
+
+        Args:
+            key (str): The request key, usually built with request_key.
+            fn (Callable[[], T]): The upstream call.
+
+        Returns:
+            T: The result of the shared call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Await fn once for all concurrent callers on this event loop with the same key.
+
+        Args:
+            key (str): The request key, usually built with request_key.
+            fn (Callable[[], Awaitable[T]]): Factory for the upstream coroutine.
+
+        Returns:
+            T: The result of the shared call.
+        """
+        task_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = self._tasks[task_key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda _: self._forget(task_key))
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, task_key: Tuple[int, str]) -> None:
+        with self._lock:
+            self._tasks.pop(task_key, None)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return counters describing coalescing.
+
+        Returns:
+            Dict[str, int]: Upstream calls made (leaders), callers that shared one (coalesced) and calls in flight.
+        """
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls) + len(self._tasks),
+            }
+
+
+default_single_flight = SingleFlight()
@@ -0,0 +1,212 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, get_buffer_string
+
+from .client_pool import get_client
+from .memory_store import ConversationStore, StoredMessage
+from .rate_limiter import default_rate_limits, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+Summarizer = Callable[[str, List[BaseMessage]], str]
+
+SUMMARY_PROMPT = (
+    "Progressively summarize the conversation, adding the new lines to the previous summary. Keep names, "
+    "numbers and facts the user may refer back to. Reply with the new summary only, in at most {max_words} words."
+    "\n\nPrevious summary:\n{summary}\n\nNew lines:\n{lines}\n\nNew summary:"
+)
+
+# Summaries are folded off the request path; a few workers are enough since each user folds at most once at a time
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary")
+_pending: Dict[Tuple[int, str], Future] = {}
+_pending_lock = threading.Lock()
+
+
+def _forget(key: Tuple[int, str], future: Future) -> None:
+    with _pending_lock:
+        if _pending.get(key) is future:
+            del _pending[key]
+
+
+class MemoryReport(NamedTuple):
+    """
+    Prompt tokens of one turn's chat history: what the whole stored conversation would cost, what the summary
+    plus verbatim window actually costs, and the difference.
+    """
+    history_tokens: int
+    prompt_tokens: int
+    saved_tokens: int
+    summary_tokens: int
+    verbatim_messages: int
+
+
+def openai_summarizer(api_key: Optional[str] = None, model: str = "gpt-4o-mini", max_words: int = 150) -> Summarizer:
+    """
+    Build a summarizer that folds messages into a running summary with an OpenAI chat model.
+
+    Args:
+        api_key (Optional[str]): The OpenAI API key. Defaults to None.
+        model (str): The model writing the summary. Defaults to "gpt-4o-mini".
+        max_words (int): Length the summary is asked to stay within. Defaults to 150.
+
+    Returns:
+        Summarizer: Called with the previous summary and the messages to fold in; returns the new summary.
+    """
+    def summarize(summary: str, messages: List[BaseMessage]) -> str:
+        prompt = SUMMARY_PROMPT.format(max_words=max_words, summary=summary or "(none)",
+                                       lines=get_buffer_string(messages))
+        default_rate_limits.acquire("openai", api_key, prompt, model)
+        return get_client("openai", model, api_key).invoke(prompt).content.strip()
+
+    return summarize
+
+
+def select_window(rows: List[StoredMessage], max_tokens: int, turns: int) -> int:
+    """
+    Count how many of the newest messages fit the verbatim window.
+
+    Args:
+        rows (List[StoredMessage]): Candidate messages, oldest first.
+        max_tokens (int): Token budget of the window.
+        turns (int): Maximum number of turns, counted by human messages.
+
+    Returns:
+        int: The number of trailing messages to keep; the window always starts at a human message.
+    """
+    used = humans = 0
+    start = len(rows)
+    for i in range(len(rows) - 1, -1, -1):
+        row = rows[i]
+        is_human = isinstance(row.message, HumanMessage)
+        if used + row.tokens > max_tokens or (is_human and humans >= turns):
+            break
+        used += row.tokens
+        humans += is_human
+        if is_human:
+            start = i
+    return len(rows) - start
+
+
+class RollingSummaryMemory(BaseChatMemory):
+    """
+    Conversation memory that sends the last turns verbatim within a token budget and everything older as a
+    running summary maintained in the background.
+    Parameters:
+        - store (ConversationStore): Where the messages and the summary are kept.
+        - user_id (str): The conversation owner.
+        - summarize (Summarizer): Folds messages into the summary, e.g. openai_summarizer(api_key).
+        - max_tokens (int): Budget for the summary plus the verbatim turns, measured with tiktoken. Defaults to 1000.
+        - turns (int): Maximum number of verbatim turns. Defaults to 4.
+    Processing Logic:
+        - The history passed to the chain is the summary as a system message followed by the newest whole turns
+          that fit what is left of the budget, so prompt size stays flat however long the conversation grows.
+        - After each saved turn, messages that no longer fit the window are folded into the summary on a
+          background thread; the answer is never delayed by summarization. Until a fold finishes, turns that
+          dropped out of the window are missing from the prompt rather than exceeding the budget.
+        - Summaries are stored with the id of the last message they cover and only replaced if unchanged, so
+          concurrent requests for a user neither lose nor repeat turns.
+        - Every load records a MemoryReport in last_report comparing the prompt with the full stored history.
+    """
+    store: ConversationStore
+    user_id: str
+    summarize: Summarizer
+    max_tokens: int = 1000
+    turns: int = 4
+    memory_key: str = "chat_history"
+    return_messages: bool = True
+    last_report: Optional[MemoryReport] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def memory_variables(self) -> List[str]:
+        """The single variable this memory provides."""
+        return [self.memory_key]
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Return the summary and verbatim window, and record the token savings in last_report.
+
+        Args:
+            inputs (Dict[str, Any]): The chain inputs; unused.
+
+        Returns:
+            Dict[str, Any]: The chat history under memory_key, as messages or as a string.
+        """
+        summary, through_id = self.store.summary(self.user_id)
+        summary_tokens = estimate_tokens(summary) if summary else 0
+        rows = self.store.recent_rows(self.user_id, after_id=through_id)
+        rows = rows[len(rows) - select_window(rows, max(0, self.max_tokens - summary_tokens), self.turns):]
+        messages: List[BaseMessage] = [row.message for row in rows]
+        if summary:
+            messages.insert(0, SystemMessage(content=f"Summary of the earlier conversation: {summary}"))
+
+        prompt_tokens = summary_tokens + sum(row.tokens for row in rows)
+        history_tokens = self.store.history_tokens(self.user_id)
+        self.last_report = MemoryReport(
+            history_tokens=history_tokens,
+            prompt_tokens=prompt_tokens,
+            saved_tokens=max(0, history_tokens - prompt_tokens),
+            summary_tokens=summary_tokens,
+            verbatim_messages=len(rows),
+        )
+        logger.info("Chat history for %s: %s", self.user_id, self.last_report)
+        return {self.memory_key: messages if self.return_messages else get_buffer_string(messages)}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        """Append the turn to the store and fold older turns into the summary in the background."""
+        super().save_context(inputs, outputs)
+        self.schedule_fold()
+
+    def schedule_fold(self) -> Future:
+        """
+        Start folding messages outside the window into the summary, unless a fold for this user is running.
+
+        Returns:
+            Future: The running fold, which completes with the number of summarizer calls made.
+        """
+        key = (id(self.store), self.user_id)
+        with _pending_lock:
+            future = _pending.get(key)
+            if future is None or future.done():
+                future = _pending[key] = _executor.submit(self._fold)
+                future.add_done_callback(lambda done: _forget(key, done))
+        return future
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Block until this user's pending fold, if any, has finished."""
+        with _pending_lock:
+            future = _pending.get((id(self.store), self.user_id))
+        if future is not None:
+            future.result(timeout)
+
+    def _fold(self) -> int:
+        calls = 0
+        try:
+            while True:
+                summary, through_id = self.store.summary(self.user_id)
+                summary_tokens = estimate_tokens(summary) if summary else 0
+                rows = self.store.recent_rows(self.user_id, limit=-1, after_id=through_id)
+                outside = rows[:len(rows) - select_window(rows, max(0, self.max_tokens - summary_tokens), self.turns)]
+                if not outside:
+                    return calls
+                # Fold a long backlog, e.g. a migrated history, a bounded slice at a time
+                piece, tokens = [], 0
+                for row in outside:
+                    if piece and tokens + row.tokens > 2 * self.max_tokens:
+                        break
+                    piece.append(row)
+                    tokens += row.tokens
+                new_summary = self.summarize(summary, [row.message for row in piece])
+                calls += 1
+                if not self.store.set_summary(self.user_id, new_summary, piece[-1].id, through_id):
+                    return calls
+        except Exception:
+            # The turns stay in the log, so the next saved turn retries the fold
+            logger.exception("Summarizing the conversation of %s failed", self.user_id)
+            return calls
@@ -1,23 +1,157 @@
-from typing import Optional, Union, Generator
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import AsyncIterator, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union, Generator
 
-from .gpt3_5 import gpt3_5
-from .gpt4omini import gpt4omini
-from .llama3 import llama3
+from .completion_cache import CompletionCache
+from .completion_runner import collect_upstream_calls
+from .gpt3_5 import GPT3_5TurboClient, gpt3_5
+from .gpt4o import non_stream_gpt4omini, stream_gpt4omini
+from .gpt4omini import GPT4ominiClient, gpt4omini
+from .llama3 import Llama3Client, llama3, non_stream_llama3, stream_llama3
+from .model_router import ModelRouter, default_router
+from .resilience import (NO_RETRY, ResilienceMetrics, RetryPolicy, acall_with_retry, ahedged_call,
+                         call_with_retry, default_resilience_metrics, hedged_call)
+
+
+class BatchItem(NamedTuple):
+    """Outcome of one prompt in a batch: its input position, the response, or the error it raised."""
+    index: int
+    prompt: str
+    response: Optional[str] = None
+    error: Optional[BaseException] = None
 
 class TextToTextProcessor:
     """
     A class handling text-to-text processing using various machine learning models.
     Parameters:
-        - model (str): The identifier for the text processing model to be used.
+        - model (str): The identifier for the text processing model to be used, or "auto" to route each prompt.
         - api_key (str): The API key required for accessing the model.
+        - cache (Optional[CompletionCache]): Opt-in cache for non-streaming responses. Defaults to None.
+        - retry (Optional[RetryPolicy]): Retry policy applied to each model; None makes a single attempt. Defaults to None.
+        - hedge (bool): Whether slow non-streaming calls are hedged with a duplicate request. Defaults to False.
+        - hedge_delay (Optional[float]): Seconds before hedging; None uses the model's rolling p95 latency. Defaults to None.
+        - fallbacks (Optional[Sequence[Tuple[str, str]]]): Ordered (model, api_key) pairs tried when the model fails. Defaults to None.
+        - metrics (Optional[ResilienceMetrics]): Where retry, hedge and fallback counts are recorded. Defaults to the shared instance.
+        - router (Optional[ModelRouter]): Router used when model is "auto". Defaults to the shared instance.
+        - api_keys (Optional[Dict[str, str]]): Per-provider keys for "auto", e.g. {"together": ...}. Defaults to None.
+        - output_tokens (Optional[int]): Expected response length used for routing. Defaults to the router's estimate.
     Processing Logic:
         - If the 'stream' parameter is True, the responses are expected to be streamed and thus are handled by the '_handle_streaming_response' method.
+        - The 'stream' and 'astream' methods yield tokens from any supported model as they arrive.
         - The 'process' method dynamically calls different model processing functions based on the 'model' attribute.
         - The 'concat' method allows for chaining the output of one model as the input to another model.
+        - The 'pipeline' method builds a Chain in which each stage's output is templated into the next stage
+          and split stages start on each sentence or paragraph as soon as it is available.
+        - The '*_many' methods fan a batch of prompts out with a concurrency limit, collecting per-item errors
+          instead of failing the whole batch.
+        - Every model in the chain (the model, then each fallback) gets the retry policy with jittered exponential
+          backoff; the next fallback is only tried once a model has exhausted its attempts.
+        - Hedging waits for the p95 delay (after 20 samples, or hedge_delay) and then sends a second, uncoalesced
+          request, keeping whichever finishes first.
+        - Streams retry and fall back only until the first token is delivered; later errors are raised.
+        - With model "auto", every prompt is ranked by the router on token count, output length, rolling latency and
+          cost; the best model is called and the other eligible models serve as its fallbacks.
     """
-    def __init__(self, model: str, api_key: str):
+    def __init__(self, model: str, api_key: str, cache: Optional[CompletionCache] = None,
+                 retry: Optional[RetryPolicy] = None, hedge: bool = False, hedge_delay: Optional[float] = None,
+                 fallbacks: Optional[Sequence[Tuple[str, str]]] = None, metrics: Optional[ResilienceMetrics] = None,
+                 router: Optional[ModelRouter] = None, api_keys: Optional[Dict[str, str]] = None,
+                 output_tokens: Optional[int] = None):
         self.model = model
         self.api_key = api_key
+        self.cache = cache
+        self.retry = retry or NO_RETRY
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.fallbacks = list(fallbacks or [])
+        self.metrics = metrics or default_resilience_metrics
+        self.router = router or default_router
+        self.api_keys = api_keys
+        self.output_tokens = output_tokens
+
+    def _chain(self, prompt: str) -> List[Tuple[str, str]]:
+        if self.model != "auto":
+            return [(self.model, self.api_key)] + self.fallbacks
+        available = dict(self.router.available_models(self.api_key, self.api_keys))
+        if not available:
+            raise ValueError("No API key is available for any routable model.")
+        ranked, _ = self.router.rank(prompt, self.output_tokens, list(available))
+        chain = [(model, available[model]) for model in ranked]
+        return chain + [pair for pair in self.fallbacks if pair not in chain]
+
+    def _served(self, model: str, position: int) -> None:
+        self.metrics.record(model, "served" if position == 0 else "fallback_served")
+
+    def _hedge_after(self, model: str) -> Optional[float]:
+        if not self.hedge:
+            return None
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        return self.metrics.latency(model).percentile(0.95, min_samples=20)
+
+    def _complete(self, model: str, api_key: str, prompt: str, language: Optional[str], coalesce: bool = True) -> Optional[str]:
+        if model == "gpt-3.5-turbo":
+            return GPT3_5TurboClient(api_key).chat_completion_sync(prompt, language, cache=self.cache, coalesce=coalesce)
+        elif model == "gpt-4o-mini":
+            return gpt4omini(prompt, api_key=api_key, language=language, cache=self.cache, coalesce=coalesce)
+        elif model == "llama3":
+            return llama3(prompt, api_key=api_key, language=language, cache=self.cache, coalesce=coalesce)
+        raise ValueError(f"Unsupported model: {model}")
+
+    async def _acomplete(self, model: str, api_key: str, prompt: str, language: Optional[str], coalesce: bool = True) -> Optional[str]:
+        if model == "gpt-3.5-turbo":
+            return await gpt3_5(prompt, api_key=api_key, language=language, cache=self.cache, coalesce=coalesce)
+        elif model == "gpt-4o-mini":
+            return await non_stream_gpt4omini(prompt, api_key=api_key, language=language, cache=self.cache, coalesce=coalesce)
+        elif model == "llama3":
+            return await non_stream_llama3(prompt, api_key=api_key, language=language, cache=self.cache, coalesce=coalesce)
+        raise ValueError(f"Unsupported model: {model}")
+
+    def _observe(self, model: str, calls: List[Tuple[float, Optional[str]]]) -> None:
+        # Routing learns only from requests that reached the provider
+        for seconds, output in calls:
+            self.router.observe(model, seconds, output)
+
+    def _attempt(self, model: str, api_key: str, prompt: str, language: Optional[str]) -> Optional[str]:
+        self.metrics.record(model, "attempts")
+        started = time.perf_counter()
+        delay = self._hedge_after(model)
+        with collect_upstream_calls() as calls:
+            if delay is None:
+                response = self._complete(model, api_key, prompt, language)
+            else:
+                # Hedged requests run on pool threads; each gets a copy of this context to report upstream calls
+                primary, hedge = contextvars.copy_context(), contextvars.copy_context()
+                response, hedge_won = hedged_call(
+                    lambda: primary.run(self._complete, model, api_key, prompt, language),
+                    # The hedge must not coalesce, or it would simply join the slow request it is meant to race
+                    lambda: hedge.run(self._complete, model, api_key, prompt, language, coalesce=False),
+                    delay, on_hedge=lambda: self.metrics.record(model, "hedges"))
+                if hedge_won:
+                    self.metrics.record(model, "hedge_wins")
+        self.metrics.latency(model).record(time.perf_counter() - started)
+        self._observe(model, calls)
+        return response
+
+    async def _aattempt(self, model: str, api_key: str, prompt: str, language: Optional[str]) -> Optional[str]:
+        self.metrics.record(model, "attempts")
+        started = time.perf_counter()
+        delay = self._hedge_after(model)
+        with collect_upstream_calls() as calls:
+            if delay is None:
+                response = await self._acomplete(model, api_key, prompt, language)
+            else:
+                response, hedge_won = await ahedged_call(
+                    lambda: self._acomplete(model, api_key, prompt, language),
+                    lambda: self._acomplete(model, api_key, prompt, language, coalesce=False),
+                    delay, on_hedge=lambda: self.metrics.record(model, "hedges"))
+                if hedge_won:
+                    self.metrics.record(model, "hedge_wins")
+        self.metrics.latency(model).record(time.perf_counter() - started)
+        self._observe(model, calls)
+        return response
 
     def _handle_streaming_response(self, stream_response: Generator[str, None, None]) -> str:
         """
@@ -29,7 +163,7 @@ class TextToTextProcessor:
         Returns:
             str: The complete concatenated response.
         """
-        return ''.joiniter(stream_response)
+        return ''.join(stream_response)
 
     def process(self, prompt: str, stream: bool = False, language: Optional[str] = "English") -> Union[str, None]:
         """
@@ -43,23 +177,245 @@ class TextToTextProcessor:
         Returns:
             Union[str, None]: The processed response as a string. If stream is True, the full response after streaming.
         """
-        if self.model == "gpt-3.5-turbo":
-            response = gpt3_5(prompt, api_key=self.api_key, stream=stream, language=language)
-        elif self.model == "gpt-4o-mini":
-            response = gpt4omini(prompt, api_key=self.api_key, stream=stream, language=language)
-        elif self.model == "llama3":
-            response = llama3(prompt, api_key=self.api_key, stream=stream, language=language)
-        else:
-            raise ValueError(f"Unsupported model: {self.model}")
-
         # Handle streaming if enabled
-        if stream and isinstance(response, Generator):
-            return self._handle_streaming_response(response)
-        return response
+        if stream:
+            return self._handle_streaming_response(self.stream(prompt, language))
+
+        error: Optional[Exception] = None
+        for position, (model, api_key) in enumerate(self._chain(prompt)):
+            try:
+                response = call_with_retry(lambda: self._attempt(model, api_key, prompt, language), self.retry,
+                                           on_retry=lambda e: self.metrics.record(model, "retries"))
+            except Exception as e:
+                self.metrics.record(model, "failures")
+                error = e
+                continue
+            self._served(model, position)
+            return response
+        raise error
+
+    def stream(self, prompt: str, language: Optional[str] = "English") -> Generator[str, None, None]:
+        """
+        Stream the response to the input prompt token by token.
+
+        Tokens are read from the provider only as the caller consumes them, and closing the
+        generator closes the upstream response.
+
+        Args:
+            prompt (str): The prompt to be processed by the model.
+            language (Optional[str]): The language for the response. Defaults to "English".
+
+        Returns:
+            Generator[str, None, None]: A generator yielding tokens as they are received.
+        """
+        error: Optional[Exception] = None
+        for position, (model, api_key) in enumerate(self._chain(prompt)):
+            attempt = 0
+            while True:
+                attempt += 1
+                self.metrics.record(model, "attempts")
+                delivered = False
+                tokens = self._token_stream(model, api_key, prompt, language)
+                try:
+                    for token in tokens:
+                        delivered = True
+                        yield token
+                except Exception as e:
+                    if delivered:
+                        raise
+                    error = e
+                else:
+                    self._served(model, position)
+                    return
+                finally:
+                    tokens.close()
+                if not self.retry.should_retry(error, attempt):
+                    self.metrics.record(model, "failures")
+                    break
+                self.metrics.record(model, "retries")
+                time.sleep(self.retry.backoff(attempt))
+        raise error
+
+    def _token_stream(self, model: str, api_key: str, prompt: str, language: Optional[str]) -> Iterator[str]:
+        if model == "gpt-3.5-turbo":
+            return GPT3_5TurboClient(api_key).stream_tokens(prompt, language)
+        elif model == "gpt-4o-mini":
+            return GPT4ominiClient(api_key).stream_tokens(prompt, language)
+        elif model == "llama3":
+            return Llama3Client(api_key).stream_tokens(prompt, language)
+        raise ValueError(f"Unsupported model: {model}")
+
+    def _atoken_stream(self, model: str, api_key: str, prompt: str, language: Optional[str]) -> AsyncIterator[str]:
+        if model == "gpt-3.5-turbo":
+            return GPT3_5TurboClient(api_key).astream_tokens(prompt, language)
+        elif model == "gpt-4o-mini":
+            return stream_gpt4omini(prompt, api_key=api_key, language=language)
+        elif model == "llama3":
+            return stream_llama3(prompt, api_key=api_key, language=language)
+        raise ValueError(f"Unsupported model: {model}")
+
+    async def astream(self, prompt: str, language: Optional[str] = "English") -> AsyncIterator[str]:
+        """
+        Asynchronously stream the response to the input prompt token by token.
+
+        Tokens are read from the provider only as the caller consumes them, and cancelling the
+        consuming task or closing the iterator closes the upstream response.
+
+        Args:
+            prompt (str): The prompt to be processed by the model.
+            language (Optional[str]): The language for the response. Defaults to "English".
+
+        Returns:
+            AsyncIterator[str]: An iterator yielding tokens as they are received.
+        """
+        error: Optional[Exception] = None
+        for position, (model, api_key) in enumerate(self._chain(prompt)):
+            attempt = 0
+            while True:
+                attempt += 1
+                self.metrics.record(model, "attempts")
+                delivered = False
+                tokens = self._atoken_stream(model, api_key, prompt, language)
+                try:
+                    async for token in tokens:
+                        delivered = True
+                        yield token
+                except Exception as e:
+                    if delivered:
+                        raise
+                    error = e
+                else:
+                    self._served(model, position)
+                    return
+                finally:
+                    await tokens.aclose()
+                if not self.retry.should_retry(error, attempt):
+                    self.metrics.record(model, "failures")
+                    break
+                self.metrics.record(model, "retries")
+                await asyncio.sleep(self.retry.backoff(attempt))
+        raise error
+
+    async def aprocess(self, prompt: str, language: Optional[str] = "English") -> Optional[str]:
+        """
+        Asynchronously process the input prompt using the specified model.
+
+        Args:
+            prompt (str): The prompt to be processed by the model.
+            language (Optional[str]): The language for the response. Defaults to "English".
+
+        Returns:
+            Optional[str]: The processed response as a string.
+        """
+        error: Optional[Exception] = None
+        for position, (model, api_key) in enumerate(self._chain(prompt)):
+            try:
+                response = await acall_with_retry(lambda: self._aattempt(model, api_key, prompt, language), self.retry,
+                                                  on_retry=lambda e: self.metrics.record(model, "retries"))
+            except Exception as e:
+                self.metrics.record(model, "failures")
+                error = e
+                continue
+            self._served(model, position)
+            return response
+        raise error
+
+    def iter_many(self, prompts: Sequence[str], concurrency: int = 8, language: Optional[str] = "English") -> Iterator[BatchItem]:
+        """
+        Process a batch of prompts concurrently, yielding each result as soon as it finishes.
+
+        Args:
+            prompts (Sequence[str]): The prompts to be processed.
+            concurrency (int): Maximum number of requests in flight at once. Defaults to 8.
+            language (Optional[str]): The language for the responses. Defaults to "English".
+
+        Returns:
+            Iterator[BatchItem]: Results in completion order; failed prompts carry their exception in 'error'.
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1.")
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            future_to_index = {
+                executor.submit(self.process, prompt, False, language): index
+                for index, prompt in enumerate(prompts)
+            }
+            for future in as_completed(future_to_index):
+                index = future_to_index[future]
+                try:
+                    yield BatchItem(index, prompts[index], response=future.result())
+                except Exception as e:
+                    yield BatchItem(index, prompts[index], error=e)
+        finally:
+            # If the consumer stops iterating early, drop the prompts not yet sent instead of waiting for them
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def process_many(self, prompts: Sequence[str], concurrency: int = 8, language: Optional[str] = "English") -> List[BatchItem]:
+        """
+        Process a batch of prompts concurrently and return the results in input order.
+
+        Args:
+            prompts (Sequence[str]): The prompts to be processed.
+            concurrency (int): Maximum number of requests in flight at once. Defaults to 8.
+            language (Optional[str]): The language for the responses. Defaults to "English".
+
+        Returns:
+            List[BatchItem]: One result per prompt, in the same order as the input.
+        """
+        return sorted(self.iter_many(prompts, concurrency, language), key=lambda item: item.index)
+
+    async def aiter_many(self, prompts: Sequence[str], concurrency: int = 8, language: Optional[str] = "English") -> AsyncIterator[BatchItem]:
+        """
+        Asynchronously process a batch of prompts, yielding each result as soon as it finishes.
+
+        Args:
+            prompts (Sequence[str]): The prompts to be processed.
+            concurrency (int): Maximum number of requests in flight at once. Defaults to 8.
+            language (Optional[str]): The language for the responses. Defaults to "English".
+
+        Returns:
+            AsyncIterator[BatchItem]: Results in completion order; failed prompts carry their exception in 'error'.
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1.")
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(index: int, prompt: str) -> BatchItem:
+            async with semaphore:
+                try:
+                    return BatchItem(index, prompt, response=await self.aprocess(prompt, language))
+                except Exception as e:
+                    return BatchItem(index, prompt, error=e)
+
+        tasks = [asyncio.ensure_future(run(index, prompt)) for index, prompt in enumerate(prompts)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Cancel outstanding work if the consumer stops iterating early
+            for task in tasks:
+                task.cancel()
+
+    async def aprocess_many(self, prompts: Sequence[str], concurrency: int = 8, language: Optional[str] = "English") -> List[BatchItem]:
+        """
+        Asynchronously process a batch of prompts and return the results in input order.
+
+        Args:
+            prompts (Sequence[str]): The prompts to be processed.
+            concurrency (int): Maximum number of requests in flight at once. Defaults to 8.
+            language (Optional[str]): The language for the responses. Defaults to "English".
+
+        Returns:
+            List[BatchItem]: One result per prompt, in the same order as the input.
+        """
+        results = [item async for item in self.aiter_many(prompts, concurrency, language)]
+        return sorted(results, key=lambda item: item.index)
 
     def concat(self, next_model: str, next_api_key: str, next_prompt: str, stream: bool = False, language: Optional[str] = "English") -> Union[str, None]:
         """
         Concatenate another model's response with the current context and generate a response.
+
+        The next prompt is sent as given; use pipeline() to feed this model's output into the next model.
         
         Args:
             next_model (str): The next model to use.
@@ -72,19 +428,45 @@ class TextToTextProcessor:
             Union[str, None]: The processed response from the next model.
         """
         # Create a new processor for the next model
-        next_processor = TextToTextProcessor(next_model, next_api_key)
+        next_processor = TextToTextProcessor(next_model, next_api_key, self.cache, self.retry, self.hedge,
+                                             self.hedge_delay, metrics=self.metrics, router=self.router,
+                                             api_keys=self.api_keys, output_tokens=self.output_tokens)
         # Process the next prompt with the new model
         return next_processor.process(next_prompt, stream, language)
 
-def text_to_text(model: str, api_key: str) -> TextToTextProcessor:
+    def pipeline(self, *stages: "Stage", concurrency: int = 4) -> "Chain":
+        """
+        Build a Chain whose first stage sends the chain input to this processor's model.
+
+        Args:
+            *stages (Stage): The following stages; each receives the previous stage's output as {input}.
+            concurrency (int): Maximum calls in flight per split stage. Defaults to 4.
+
+        Returns:
+            Chain: A chain that can be run with run(), arun() or astream().
+        """
+        from .pipeline import Chain, Stage
+        return Chain([Stage(self.model, api_key=self.api_key), *stages], self.api_key, self.cache, self.retry,
+                     concurrency)
+
+def text_to_text(model: str, api_key: str, cache: Optional[CompletionCache] = None, retry: Optional[RetryPolicy] = None,
+                 hedge: bool = False, hedge_delay: Optional[float] = None,
+                 fallbacks: Optional[Sequence[Tuple[str, str]]] = None,
+                 api_keys: Optional[Dict[str, str]] = None) -> TextToTextProcessor:
     """
     Factory function to initialize a TextToTextProcessor.
     
     Args:
-        model (str): The model to be used (e.g., "gpt-3.5-turbo", "llama3").
+        model (str): The model to be used (e.g., "gpt-3.5-turbo", "llama3"), or "auto" to route each prompt.
         api_key (str): The API key for the chosen model.
+        cache (Optional[CompletionCache]): Opt-in cache for non-streaming responses. Defaults to None.
+        retry (Optional[RetryPolicy]): Retry policy applied to each model. Defaults to None.
+        hedge (bool): Whether slow non-streaming calls are hedged with a duplicate request. Defaults to False.
+        hedge_delay (Optional[float]): Seconds before hedging; None uses the rolling p95 latency. Defaults to None.
+        fallbacks (Optional[Sequence[Tuple[str, str]]]): Ordered (model, api_key) pairs tried on failure. Defaults to None.
+        api_keys (Optional[Dict[str, str]]): Per-provider keys used by "auto", e.g. {"together": ...}. Defaults to None.
     
     Returns:
         TextToTextProcessor: An initialized processor for the given model.
     """
-    return TextToTextProcessor(model, api_key)
+    return TextToTextProcessor(model, api_key, cache, retry, hedge, hedge_delay, fallbacks, api_keys=api_keys)
@@ -0,0 +1,208 @@
+import logging
+import math
+import os
+import pickle
+import tempfile
+import time
+import uuid
+from typing import Callable, Optional
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from .index_cache import VERSION_FILE
+
+logger = logging.getLogger(__name__)
+
+INDEX_KINDS = ("flat", "ivf", "ivf_fp16", "ivf_pq", "hnsw", "hnsw_fp16")
+
+# 8-bit PQ trains 256 centroids per sub-vector and needs about 39 points per centroid
+_PQ_TRAINING_VECTORS = 256 * 39
+
+
+class IndexConfig:
+    """
+    How user indexes are stored and searched.
+    Parameters:
+        - kind (str): One of INDEX_KINDS. "flat" is exact search over float32 vectors; "ivf" searches the nprobe
+          nearest of nlist clusters; "hnsw" walks a proximity graph; the "_fp16" and "_pq" variants store vectors
+          as float16 (half the size) or as pq_bytes-byte product-quantized codes. Defaults to "flat".
+        - min_vectors (int): Size at which a flat index is converted to 'kind'; smaller indexes stay exact, since
+          scanning them is already fast and IVF and PQ need that many vectors to train; "ivf_pq" waits for at
+          least 9984. Defaults to 10000.
+        - nlist (Optional[int]): IVF clusters. Defaults to about 4 * sqrt(vectors) at conversion time.
+        - nprobe (int): IVF clusters searched per query. Defaults to 16.
+        - hnsw_m (int): HNSW neighbours per node. Defaults to 32.
+        - ef_search (int): HNSW candidate list size per query. Defaults to 64.
+        - pq_bytes (Optional[int]): Bytes per PQ code. Defaults to a divisor of the dimension near dimension / 16.
+        - mmap (bool): Memory-map saved indexes when loading them for search. Defaults to True.
+    Processing Logic:
+        - Ingestion keeps adding to the index it loads; once a flat index reaches min_vectors it is rebuilt as
+          'kind' on save, keeping vector positions so the document mapping stays valid. Later uploads are added
+          to the trained index directly.
+        - Memory-mapped indexes are read-only and their vector data stays in the page cache, shared between
+          processes and evicted under pressure instead of being copied into each process.
+    """
+    def __init__(self, kind: str = "flat", min_vectors: int = 10000, nlist: Optional[int] = None, nprobe: int = 16,
+                 hnsw_m: int = 32, ef_search: int = 64, pq_bytes: Optional[int] = None, mmap: bool = True):
+        if kind not in INDEX_KINDS:
+            raise ValueError(f"Unknown index kind {kind}; choose from {', '.join(INDEX_KINDS)}")
+        self.kind = kind
+        self.min_vectors = min_vectors
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+        self.pq_bytes = pq_bytes
+        self.mmap = mmap
+
+    def factory_string(self, dimension: int, vectors: int) -> str:
+        """
+        Return the faiss.index_factory description of this kind for an index of the given size.
+
+        Args:
+            dimension (int): Vector dimension.
+            vectors (int): Number of vectors the index is built from.
+
+        Returns:
+            str: The factory string, e.g. "IVF512,SQfp16".
+        """
+        # IVF needs about 39 training vectors per cluster
+        nlist = self.nlist or min(65536, max(16, int(4 * math.sqrt(vectors))))
+        nlist = max(1, min(nlist, vectors // 39))
+        if self.kind == "ivf":
+            return f"IVF{nlist},Flat"
+        if self.kind == "ivf_fp16":
+            return f"IVF{nlist},SQfp16"
+        if self.kind == "ivf_pq":
+            return f"IVF{nlist},PQ{self._pq_bytes(dimension)}"
+        if self.kind == "hnsw":
+            return f"HNSW{self.hnsw_m}"
+        if self.kind == "hnsw_fp16":
+            return f"HNSW{self.hnsw_m},SQfp16"
+        return "Flat"
+
+    def _pq_bytes(self, dimension: int) -> int:
+        target = self.pq_bytes or max(1, dimension // 16)
+        return max(m for m in range(1, target + 1) if dimension % m == 0)
+
+
+def convert_index(index: faiss.Index, config: IndexConfig) -> faiss.Index:
+    """
+    Rebuild a flat index as the configured kind once it holds enough vectors.
+
+    Args:
+        index (faiss.Index): The index, usually the IndexFlatL2 built by ingestion.
+        config (IndexConfig): The target kind and its parameters.
+
+    Returns:
+        faiss.Index: A new index with the same vectors in the same positions, or the given index when it is
+            already converted, too small, or the kind is "flat".
+    """
+    if config.kind == "flat" or index.ntotal < config.min_vectors or not isinstance(index, faiss.IndexFlat):
+        return index
+    if config.kind == "ivf_pq" and index.ntotal < _PQ_TRAINING_VECTORS:
+        return index
+    started = time.perf_counter()
+    vectors = index.reconstruct_n(0, index.ntotal)
+    spec = config.factory_string(index.d, index.ntotal)
+    converted = faiss.index_factory(index.d, spec, index.metric_type)
+    if not converted.is_trained:
+        # A random sample of 256 points per cluster trains as well as the full set, much faster
+        ivf = faiss.extract_index_ivf(converted)
+        sample = min(len(vectors), max(256 * ivf.nlist, 10000))
+        rows = np.random.default_rng(0).choice(len(vectors), sample, replace=False) if sample < len(vectors) else None
+        converted.train(vectors if rows is None else vectors[np.sort(rows)])
+    converted.add(vectors)
+    logger.info("Converted %d vectors to %s in %.1fs", index.ntotal, spec, time.perf_counter() - started)
+    return converted
+
+
+def tune_index(index: faiss.Index, config: IndexConfig) -> faiss.Index:
+    """Apply the configured search-time parameters (nprobe, ef_search) to an index, in place."""
+    downcast = faiss.downcast_index(index)
+    if isinstance(downcast, faiss.IndexIVF):
+        downcast.nprobe = config.nprobe
+    if hasattr(downcast, "hnsw"):
+        downcast.hnsw.efSearch = config.ef_search
+    return index
+
+
+def _replace_file(folder: str, name: str, write: Callable[[str], None]) -> None:
+    # Write next to the target and rename over it: mapped readers keep the old inode instead of seeing the file
+    # truncated under them, which would crash them with SIGBUS
+    handle, temporary = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=folder)
+    os.close(handle)
+    try:
+        write(temporary)
+        os.replace(temporary, os.path.join(folder, name))
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def save_vectorstore(vectorstore: FAISS, folder: str, config: IndexConfig) -> FAISS:
+    """
+    Convert a vectorstore's index if it has grown past config.min_vectors, then save it in the save_local layout.
+
+    Args:
+        vectorstore (FAISS): The vectorstore; its index is replaced when converted.
+        folder (str): The folder to save to, readable with load_vectorstore or FAISS.load_local.
+        config (IndexConfig): The index kind and parameters.
+
+    Returns:
+        FAISS: The same vectorstore, tuned for searching.
+    """
+    vectorstore.index = tune_index(convert_index(vectorstore.index, config), config)
+    os.makedirs(folder, exist_ok=True)
+
+    def write_documents(path: str) -> None:
+        with open(path, "wb") as f:
+            pickle.dump((vectorstore.docstore, vectorstore.index_to_docstore_id), f)
+
+    # Files are swapped, never rewritten in place, and the version stamp changes only after both are swapped
+    _replace_file(folder, "index.pkl", write_documents)
+    _replace_file(folder, "index.faiss", lambda path: faiss.write_index(vectorstore.index, path))
+
+    def write_version(path: str) -> None:
+        with open(path, "w") as f:
+            f.write(uuid.uuid4().hex)
+
+    _replace_file(folder, VERSION_FILE, write_version)
+    return vectorstore
+
+
+def load_vectorstore(folder: str, embeddings: Embeddings, config: IndexConfig,
+                     mmap: Optional[bool] = None) -> FAISS:
+    """
+    Load a vectorstore saved with save_vectorstore or save_local, memory-mapping its index for read-only search.
+
+    Args:
+        folder (str): The folder the vectorstore was saved to.
+        embeddings (Embeddings): Embeddings the vectorstore queries with.
+        config (IndexConfig): Supplies the search parameters and the mmap default.
+        mmap (Optional[bool]): Overrides config.mmap. A mapped index cannot be added to.
+
+    Returns:
+        FAISS: The vectorstore; memory_mapped is set on it when its index is mapped.
+    """
+    mapped = config.mmap if mmap is None else mmap
+    # Reads the whole file through one mapping, so vector codes and inverted lists are used in place
+    flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if mapped else 0
+    for attempt in range(3):
+        with open(os.path.join(folder, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        index = faiss.read_index(os.path.join(folder, "index.faiss"), flags)
+        # A save between the two reads pairs old documents with a newer index; read again
+        if index.ntotal == len(index_to_docstore_id):
+            break
+        logger.info("Index in %s changed while loading, retrying", folder)
+    vectorstore = FAISS(embeddings, tune_index(index, config), docstore, index_to_docstore_id)
+    vectorstore.memory_mapped = mapped
+    return vectorstore
+
+
+default_index_config = IndexConfig()
@@ -7,21 +7,28 @@ import pkg_resources
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Tuple, Optional
 
+from chat.completion_cache import CompletionCache, LangChainCompletionCache
+from chat.rate_limiter import default_rate_limits
+from chat.single_flight import default_single_flight, request_key
+
 class LiveWebToolkit:
     """
     Centralizes various web-related tasks like query refinement, web searching, summarization, and content fetching.
     Parameters:
         - api_key (str): The API key required to authenticate requests to the external live services.
         - prompts_file (Optional[str]): The path to a YAML file containing predefined prompts. Default is None.
+        - cache (Optional[CompletionCache]): Opt-in cache for the language model calls. Default is None.
     Processing Logic:
         - Initializes a ChatOpenAI instance using the provided API key and a specific model for processing.
         - Loads prompts from a YAML file, which is used for constructing inputs for the large language model.
         - All web content extraction functions handle potential request failures and return appropriate outputs.
         - Utilizes concurrent requests to optimize content fetching performance when dealing with multiple URLs.
+        - Every language model call waits for the "openai" rate limit of the API key when one is configured.
     """
-    def __init__(self, api_key: str, prompts_file: Optional[str] = None):
+    def __init__(self, api_key: str, prompts_file: Optional[str] = None, cache: Optional[CompletionCache] = None):
         self.api_key = api_key
-        self.llm = ChatOpenAI(openai_api_key=api_key, model="gpt-3.5-turbo")
+        llm_cache = LangChainCompletionCache(cache) if cache is not None else None
+        self.llm = ChatOpenAI(openai_api_key=api_key, model="gpt-3.5-turbo", cache=llm_cache)
         self.prompts = self.load_prompts(prompts_file)
 
     def load_prompts(self, prompts_file: Optional[str]) -> dict:
@@ -34,6 +41,7 @@ class LiveWebToolkit:
         template = self.prompts['refine_search_query']
         prompt = PromptTemplate(template=template, input_variables=["query"])
         result = prompt | self.llm
+        default_rate_limits.acquire("openai", self.api_key, template + query, "gpt-3.5-turbo")
         return result.invoke({"query": query}).content.strip()
 
     def perform_google_search(self, query: str, num_results: int = 10) -> List[Tuple[str, str, str]]:
@@ -126,6 +134,7 @@ class LiveWebToolkit:
         content_chunks = [contents[i:i + max_chunk_length] for i in range(0, len(contents), max_chunk_length)]
 
         for chunk in content_chunks:
+            default_rate_limits.acquire("openai", self.api_key, template + chunk, "gpt-3.5-turbo")
             result = llm_chain.invoke({"content": chunk, "query": query}).content.strip()
             processed_summaries.append(result)
 
@@ -179,6 +188,14 @@ class LiveWebToolkit:
                     continue
         return fetched_content
 
-def web_summary(api_key: str, initial_query: str, num_results: int, prompts_file: Optional[str] = None) -> str:
-    toolkit = LiveWebToolkit(api_key, prompts_file)
-    return toolkit.execute_toolkit(initial_query, num_results)
+def web_summary(api_key: str, initial_query: str, num_results: int, prompts_file: Optional[str] = None,
+                cache: Optional[CompletionCache] = None, coalesce: bool = True) -> str:
+    def run() -> str:
+        toolkit = LiveWebToolkit(api_key, prompts_file, cache)
+        return toolkit.execute_toolkit(initial_query, num_results)
+
+    if not coalesce:
+        return run()
+    # Concurrent callers asking for the same summary share one search-and-summarize run
+    key = request_key("web_summary", initial_query, api_key, num_results=num_results, prompts_file=prompts_file)
+    return default_single_flight.do(key, run)
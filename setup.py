@@ -23,6 +23,7 @@ setup(
         "tiktoken",     
         "pypdf",          
         "pandas",
+        "openpyxl",
         "langchain-community",
         "langchain_community",
         "faiss-cpu",